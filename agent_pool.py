@@ -0,0 +1,103 @@
+# agent_pool.py
+
+"""
+Process-wide pool of long-lived agent instances.
+
+Agents that hold HTTP sessions, DB connections, loaded indexes or LLM clients are
+expensive to build, so they are created once per process and shared by every
+Streamlit session and rerun. Agents may implement optional lifecycle hooks:
+
+- warm_up(): called once right after construction
+- health_check() -> bool: polled by AgentPool.health(); unhealthy agents are rebuilt
+  by AgentPool.ensure_healthy()
+- close(): called when the agent is dropped or the pool is closed
+"""
+
+import atexit
+import threading
+from typing import Any, Callable, Dict, Optional
+
+
+def _call_hook(agent: Any, hook: str, default: Any = None) -> Any:
+    fn = getattr(agent, hook, None)
+    return fn() if callable(fn) else default
+
+
+class AgentPool:
+    def __init__(self):
+        self._agents: Dict[str, Any] = {}
+        self._factories: Dict[str, Callable[[], Any]] = {}
+        self._lock = threading.RLock()
+
+    def get(self, name: str, factory: Callable[[], Any]) -> Any:
+        """The pooled instance for name, built (and warmed up) by factory on first use."""
+        agent = self._agents.get(name)
+        if agent is not None:
+            return agent
+        with self._lock:
+            agent = self._agents.get(name)
+            if agent is None:
+                agent = factory()
+                _call_hook(agent, "warm_up")
+                self._factories[name] = factory
+                self._agents[name] = agent
+            return agent
+
+    def health(self) -> Dict[str, bool]:
+        with self._lock:
+            agents = dict(self._agents)
+        status: Dict[str, bool] = {}
+        for name, agent in agents.items():
+            try:
+                status[name] = bool(_call_hook(agent, "health_check", True))
+            except Exception:
+                status[name] = False
+        return status
+
+    def ensure_healthy(self) -> Dict[str, bool]:
+        """Rebuild every agent whose health check fails; returns the health before repair."""
+        status = self.health()
+        for name, ok in status.items():
+            if not ok:
+                self.replace(name)
+        return status
+
+    def replace(self, name: str) -> Optional[Any]:
+        with self._lock:
+            old = self._agents.pop(name, None)
+            factory = self._factories.get(name)
+        if old is not None:
+            try:
+                _call_hook(old, "close")
+            except Exception:
+                pass
+        return self.get(name, factory) if factory is not None else None
+
+    def close(self) -> None:
+        with self._lock:
+            agents, self._agents = self._agents, {}
+        for agent in agents.values():
+            try:
+                _call_hook(agent, "close")
+            except Exception:
+                pass
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._agents
+
+    def __len__(self) -> int:
+        return len(self._agents)
+
+
+_default_pool: Optional[AgentPool] = None
+_default_pool_lock = threading.Lock()
+
+
+def get_default_pool() -> AgentPool:
+    global _default_pool
+    if _default_pool is None:
+        with _default_pool_lock:
+            if _default_pool is None:
+                _default_pool = AgentPool()
+                atexit.register(_default_pool.close)
+    return _default_pool
@@ -0,0 +1,194 @@
+"""
+Minimal native PDF writer used by ReportGeneratorAgent.
+Emits real text objects in the standard Helvetica fonts (no embedding, no external deps),
+paginates across as many A4 pages as needed and draws simple ruled tables.
+"""
+
+import zlib
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from agents.text_wrap import TextWrapper
+
+
+A4 = (595.0, 842.0)  # points
+
+REGULAR = "F1"
+BOLD = "F2"
+BASE_FONTS = {REGULAR: "Helvetica", BOLD: "Helvetica-Bold"}
+
+# Advance widths (1/1000 em) of the standard 14 fonts for ASCII 32..126 (Adobe AFM).
+_HELVETICA_ASCII = [
+    278, 278, 355, 556, 556, 889, 667, 191, 333, 333, 389, 584, 278, 333, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 278, 278, 584, 584, 584, 556,
+    1015, 667, 667, 722, 722, 667, 611, 778, 722, 278, 500, 667, 556, 833, 722, 778,
+    667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 278, 278, 278, 469, 556,
+    333, 556, 556, 500, 556, 556, 278, 556, 556, 222, 222, 500, 222, 833, 556, 556,
+    556, 556, 333, 500, 278, 556, 500, 722, 500, 500, 500, 334, 260, 334, 584,
+]
+_HELVETICA_BOLD_ASCII = [
+    278, 333, 474, 556, 556, 889, 722, 238, 333, 333, 389, 584, 278, 333, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 333, 333, 584, 584, 584, 611,
+    975, 722, 722, 722, 722, 667, 611, 778, 722, 278, 556, 722, 611, 833, 722, 778,
+    667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 333, 278, 333, 584, 556,
+    333, 556, 611, 556, 611, 556, 333, 611, 611, 278, 278, 556, 278, 889, 611, 611,
+    611, 611, 389, 556, 333, 611, 556, 778, 556, 556, 500, 389, 280, 389, 584,
+]
+# Common WinAnsi punctuation outside ASCII; other Latin-1 glyphs fall back to DEFAULT_WIDTH.
+_WINANSI_EXTRA = {"–": 556, "—": 1000, "•": 350, "…": 1000, "‘": 222, "’": 222, "“": 333, "”": 333, "·": 278}
+DEFAULT_WIDTH = 556
+
+GLYPH_WIDTHS: Dict[str, Dict[str, int]] = {}
+for _font, _ascii in ((REGULAR, _HELVETICA_ASCII), (BOLD, _HELVETICA_BOLD_ASCII)):
+    GLYPH_WIDTHS[_font] = {chr(32 + i): w for i, w in enumerate(_ascii)}
+    GLYPH_WIDTHS[_font].update(_WINANSI_EXTRA)
+
+
+def text_width(text: str, font: str, size: float) -> float:
+    widths = GLYPH_WIDTHS[font]
+    return sum(widths.get(ch, DEFAULT_WIDTH) for ch in text) * size / 1000.0
+
+
+_WRAPPERS: Dict[Tuple[str, float], TextWrapper] = {}
+
+
+def wrap_text(text: str, font: str, size: float, max_width: float) -> List[str]:
+    wrapper = _WRAPPERS.get((font, size))
+    if wrapper is None:
+        wrapper = _WRAPPERS[(font, size)] = TextWrapper(lambda s: text_width(s, font, size))
+    return wrapper.wrap(text, max_width)
+
+
+def _pdf_string(text: str) -> str:
+    # WinAnsi bytes carried in a latin-1 str so content streams can be joined as text.
+    raw = text.encode("cp1252", errors="replace").decode("latin-1")
+    return "(" + raw.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)") + ")"
+
+
+def _num(value: float) -> str:
+    return f"{value:.2f}".rstrip("0").rstrip(".")
+
+
+class PDFDocument:
+    """
+    Flow-layout PDF builder: content is appended top to bottom and new pages are
+    started automatically, so nothing is ever truncated.
+    """
+
+    def __init__(self, page_size: Tuple[float, float] = A4, margin: float = 50.0, compress: bool = True):
+        self.page_w, self.page_h = page_size
+        self.margin = margin
+        self.compress = compress
+        self.pages: List[List[str]] = []
+        self.y = 0.0
+        self.new_page()
+
+    @property
+    def content_width(self) -> float:
+        return self.page_w - 2 * self.margin
+
+    def new_page(self) -> None:
+        self.pages.append(["0.5 w"])
+        self.y = self.page_h - self.margin
+
+    def _ensure_space(self, height: float) -> None:
+        # Keep room for the footer at the bottom of every page.
+        if self.y - height < self.margin + 12:
+            self.new_page()
+
+    def _text_op(self, x: float, y: float, text: str, font: str, size: float) -> None:
+        self.pages[-1].append(f"BT /{font} {_num(size)} Tf {_num(x)} {_num(y)} Td {_pdf_string(text)} Tj ET")
+
+    def spacer(self, height: float) -> None:
+        self.y -= height
+
+    def paragraph(self, text: str, font: str = REGULAR, size: float = 10.0, leading: Optional[float] = None, indent: float = 0.0) -> None:
+        leading = leading or size * 1.4
+        for line in wrap_text(text, font, size, self.content_width - indent):
+            self._ensure_space(leading)
+            self.y -= leading
+            self._text_op(self.margin + indent, self.y + (leading - size) / 2, line, font, size)
+
+    def table(self, columns: Sequence[str], rows: Sequence[Sequence[Any]], size: float = 8.5) -> None:
+        """Ruled table; cells wrap inside their column and the header repeats on each new page."""
+        if not columns:
+            return
+        leading = size * 1.35
+        pad = 3.0
+        # Share the width out by the longest content of each column, with a floor.
+        natural = [
+            max([text_width(str(c), BOLD, size)] + [text_width(str(r[i]), REGULAR, size) for r in rows]) + 2 * pad
+            for i, c in enumerate(columns)
+        ]
+        total = sum(natural)
+        floor = self.content_width / (len(columns) * 3)
+        if total <= self.content_width:
+            widths = natural
+        else:
+            widths = [max(floor, w * self.content_width / total) for w in natural]
+            scale = self.content_width / sum(widths)
+            widths = [w * scale for w in widths]
+
+        def draw_row(cells: Sequence[Any], font: str) -> None:
+            wrapped = [wrap_text(str(cell), font, size, w - 2 * pad) for cell, w in zip(cells, widths)]
+            height = max(len(w) for w in wrapped) * leading + 2 * pad
+            if self.y - height < self.margin + 12:
+                self.new_page()
+                if font == REGULAR:
+                    draw_row(columns, BOLD)
+            top = self.y
+            x = self.margin
+            for lines, w in zip(wrapped, widths):
+                self.pages[-1].append(f"{_num(x)} {_num(top - height)} {_num(w)} {_num(height)} re S")
+                ty = top - pad
+                for line in lines:
+                    ty -= leading
+                    self._text_op(x + pad, ty + (leading - size) / 2, line, font, size)
+                x += w
+            self.y = top - height
+
+        draw_row(columns, BOLD)
+        for row in rows:
+            draw_row(row, REGULAR)
+
+    def to_bytes(self) -> bytes:
+        n_pages = len(self.pages)
+        # Object numbers: 1 catalog, 2 page tree, 3-4 fonts, then (page, content) pairs.
+        objects: Dict[int, bytes] = {1: b"<< /Type /Catalog /Pages 2 0 R >>"}
+        for num, font in ((3, REGULAR), (4, BOLD)):
+            objects[num] = (
+                f"<< /Type /Font /Subtype /Type1 /BaseFont /{BASE_FONTS[font]} /Encoding /WinAnsiEncoding >>"
+            ).encode("ascii")
+        kids = []
+        for index, ops in enumerate(self.pages):
+            page_obj, content_obj = 5 + 2 * index, 6 + 2 * index
+            kids.append(f"{page_obj} 0 R")
+            footer = f"Page {index + 1} of {n_pages}"
+            footer_x = self.page_w - self.margin - text_width(footer, REGULAR, 8)
+            stream = "\n".join(
+                ops
+                + [f"BT /{REGULAR} 8 Tf {_num(footer_x)} {_num(self.margin - 16)} Td {_pdf_string(footer)} Tj ET"]
+            ).encode("latin-1")
+            if self.compress:
+                stream = zlib.compress(stream)
+                header = f"<< /Length {len(stream)} /Filter /FlateDecode >>"
+            else:
+                header = f"<< /Length {len(stream)} >>"
+            objects[content_obj] = header.encode("ascii") + b"\nstream\n" + stream + b"\nendstream"
+            objects[page_obj] = (
+                f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {_num(self.page_w)} {_num(self.page_h)}] "
+                f"/Resources << /Font << /{REGULAR} 3 0 R /{BOLD} 4 0 R >> >> /Contents {content_obj} 0 R >>"
+            ).encode("ascii")
+        objects[2] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {n_pages} >>".encode("ascii")
+
+        out = bytearray(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        offsets = {}
+        for num in sorted(objects):
+            offsets[num] = len(out)
+            out += f"{num} 0 obj\n".encode("ascii") + objects[num] + b"\nendobj\n"
+        xref_at = len(out)
+        size = max(objects) + 1
+        out += f"xref\n0 {size}\n0000000000 65535 f \n".encode("ascii")
+        for num in range(1, size):
+            out += f"{offsets[num]:010d} 00000 n \n".encode("ascii")
+        out += f"trailer\n<< /Size {size} /Root 1 0 R >>\nstartxref\n{xref_at}\n%%EOF\n".encode("ascii")
+        return bytes(out)
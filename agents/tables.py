@@ -0,0 +1,74 @@
+"""
+Columnar helpers for the worker agents' tabular outputs.
+Agents return pandas DataFrames for raw_rows, patents and notable_trials, and compute
+their aggregates over whole columns. Consumers go through as_frame() / has_rows(),
+which also accept the legacy list-of-dicts form.
+"""
+
+import hashlib
+from typing import Any, Dict, Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+
+Table = Union[pd.DataFrame, Sequence[Dict[str, Any]]]
+
+
+def as_frame(rows: Optional[Table]) -> pd.DataFrame:
+    """The rows as a DataFrame; DataFrames are returned as is, not copied."""
+    if isinstance(rows, pd.DataFrame):
+        return rows
+    return pd.DataFrame(list(rows or []))
+
+
+def has_rows(rows: Optional[Table]) -> bool:
+    # DataFrames have no truth value, so `if rows:` cannot be used on them
+    return rows is not None and len(rows) > 0
+
+
+def cagr_pct(frame: pd.DataFrame, value_col: str, year_col: str = "year", years: int = 3) -> Optional[float]:
+    """
+    Compound annual growth (%) of value_col over the last `years` years, after summing
+    the rows of each year. None when the start year is missing or not positive.
+    """
+    by_year = frame.groupby(year_col, sort=True)[value_col].sum()
+    if by_year.empty:
+        return None
+    end_year = by_year.index[-1]
+    start = by_year.get(end_year - years)
+    if start is None or start <= 0:
+        return None
+    return round(float(((by_year.iloc[-1] / start) ** (1 / years) - 1) * 100), 2)
+
+
+def weighted_mean(frame: pd.DataFrame, value_col: str, weight_col: str) -> Optional[float]:
+    weights = frame[weight_col].to_numpy(dtype=float)
+    total = weights.sum()
+    if not total:
+        return None
+    return round(float(np.dot(frame[value_col].to_numpy(dtype=float), weights) / total), 2)
+
+
+def phase_counts(frame: pd.DataFrame, order: Sequence[str], phase_col: str = "phase") -> Dict[str, int]:
+    """Rows per phase, listed in `order` (phases with no rows count 0)."""
+    counts = frame[phase_col].value_counts()
+    return {phase: int(counts.get(phase, 0)) for phase in order}
+
+
+def frame_digest(frame: pd.DataFrame) -> str:
+    """Content hash of a DataFrame (columns, dtypes and every cell)."""
+    h = hashlib.sha256()
+    h.update(repr([(str(c), str(t)) for c, t in frame.dtypes.items()]).encode("utf-8"))
+    h.update(pd.util.hash_pandas_object(frame, index=False).to_numpy().tobytes())
+    return h.hexdigest()
+
+
+def to_jsonable(value: Any) -> Any:
+    """Copy of value with DataFrames replaced by lists of row dicts, for JSON or comparison."""
+    if isinstance(value, pd.DataFrame):
+        return value.to_dict(orient="records")
+    if isinstance(value, dict):
+        return {k: to_jsonable(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_jsonable(v) for v in value]
+    return value
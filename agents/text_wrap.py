@@ -0,0 +1,67 @@
+"""
+Word-wrapping engine shared by the report renderers.
+Each distinct word is measured once per font and its advance width cached; a line's
+width is accumulated word by word instead of re-measuring the growing line.
+"""
+
+from typing import Callable, Dict, List
+
+
+class TextWrapper:
+    """
+    Greedy wrapper over a font's advance-width function (``measure(text) -> width``).
+    Widths are additive across words: width("a b") == width("a") + width(" ") + width("b"),
+    which holds for the unkerned fonts the renderers use.
+    """
+
+    def __init__(self, measure: Callable[[str], float], max_cached_words: int = 50_000):
+        self.measure = measure
+        self.max_cached_words = max_cached_words
+        self._widths: Dict[str, float] = {}
+        self.space_width = measure(" ")
+
+    def width(self, word: str) -> float:
+        w = self._widths.get(word)
+        if w is None:
+            if len(self._widths) >= self.max_cached_words:
+                self._widths.clear()
+            w = self._widths[word] = self.measure(word)
+        return w
+
+    def _break_word(self, word: str, max_width: float) -> List[str]:
+        # Split a token wider than a whole line character by character.
+        pieces: List[str] = []
+        piece, piece_w = "", 0.0
+        for ch in word:
+            ch_w = self.width(ch)
+            if piece and piece_w + ch_w > max_width:
+                pieces.append(piece)
+                piece, piece_w = "", 0.0
+            piece += ch
+            piece_w += ch_w
+        pieces.append(piece)
+        return pieces
+
+    def wrap(self, text: str, max_width: float) -> List[str]:
+        lines: List[str] = []
+        current: List[str] = []
+        current_w = 0.0
+        for word in text.split(" "):
+            word_w = self.width(word)
+            if word_w > max_width:
+                *full, word = self._break_word(word, max_width)
+                if current:
+                    lines.append(" ".join(current))
+                lines.extend(full)
+                current, current_w = [], 0.0
+                word_w = self.width(word)
+            added = word_w if not current else current_w + self.space_width + word_w
+            if current and added > max_width:
+                lines.append(" ".join(current))
+                current, current_w = [word], word_w
+            else:
+                current.append(word)
+                current_w = added
+        if current:
+            lines.append(" ".join(current))
+        return lines or [""]
@@ -3,53 +3,180 @@ Mock worker agents used by the Streamlit demo app.
 These provide deterministic, offline data so the app runs without external APIs.
 """
 
-from typing import Dict, Any, List
+import asyncio
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, partial
+from typing import Dict, Any, List, Optional, Tuple, Union
 from io import BytesIO
+import pandas as pd
 from PIL import Image, ImageDraw, ImageFont
 
+from agents.pdf_writer import BOLD, PDFDocument
+from agents.tables import as_frame, cagr_pct, frame_digest, has_rows, phase_counts, weighted_mean
+from stores.documents import DocumentIndex
+from stores.market import MarketDataStore
+from stores.patents import PatentStore
+from stores.trials import PHASES, TrialRegistry
+from stores.vectors import VectorIndex
+from agents.text_wrap import TextWrapper
+from tracing import NULL_TRACER, Tracer
 
-class IQVIAInsightsAgent:
-    def run(self, molecule: str, indication: str, geography: str = "US") -> Dict[str, Any]:
+
+# Blocking agent calls made from async code. Shared rather than the loop's default
+# executor, so a call abandoned at its deadline does not hold up the loop's shutdown.
+_BLOCKING_POOL = ThreadPoolExecutor(max_workers=32, thread_name_prefix="agent-run")
+
+
+async def run_blocking(fn: Any, *args: Any, **kwargs: Any) -> Any:
+    """Await a blocking call on a worker thread, keeping the event loop free."""
+    return await asyncio.get_running_loop().run_in_executor(_BLOCKING_POOL, partial(fn, *args, **kwargs))
+
+
+class WorkerAgent:
+    """
+    Base for worker agents: a blocking ``run`` plus its async counterpart ``arun``.
+    By default ``arun`` runs ``run`` on a worker thread, so store-backed agents doing
+    SQLite/Arrow I/O proceed concurrently and can be timed out. Agents backed by
+    remote data override ``arun`` to await their clients instead of holding a thread.
+    """
+
+    # Lookups without side effects: safe to hedge (issue twice) under tail latency
+    idempotent = True
+
+    def run(self, *args: Any, **kwargs: Any) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    async def arun(self, *args: Any, **kwargs: Any) -> Dict[str, Any]:
+        return await run_blocking(self.run, *args, **kwargs)
+
+    # Lifecycle hooks used by agent_pool.AgentPool; agents holding sessions,
+    # connections or indexes override them.
+    def warm_up(self) -> None:
+        pass
+
+    def health_check(self) -> bool:
+        return True
+
+    def close(self) -> None:
+        pass
+
+
+class IQVIAInsightsAgent(WorkerAgent):
+    def __init__(self, store: Optional[MarketDataStore] = None):
+        # Local IQVIA extract; without one the agent serves built-in sample rows
+        self.store = store
+
+    def warm_up(self) -> None:
+        if self.store is not None:
+            self.store.dataset("iqvia")
+
+    def _sales_rows(self, molecule: str, indication: str, geography: str) -> pd.DataFrame:
+        if self.store is not None:
+            return self.store.query(
+                "iqvia", molecule, geography, columns=["year", "sales_usd_mn"], indication=indication
+            )
         # Mock market data
-        raw_rows = [
-            {"year": 2020, "sales_usd_mn": 120},
-            {"year": 2021, "sales_usd_mn": 135},
-            {"year": 2022, "sales_usd_mn": 150},
-            {"year": 2023, "sales_usd_mn": 160},
-            {"year": 2024, "sales_usd_mn": 172},
-        ]
+        return pd.DataFrame(
+            {
+                "year": [2020, 2021, 2022, 2023, 2024],
+                "sales_usd_mn": [120, 135, 150, 160, 172],
+            }
+        )
+
+    def run(self, molecule: str, indication: str, geography: str = "US") -> Dict[str, Any]:
+        sales_by_year = self._sales_rows(molecule, indication, geography).groupby("year")["sales_usd_mn"].sum()
+        raw_rows = sales_by_year.reset_index()
+        if raw_rows.empty:
+            return {
+                "market_size_usd_mn": None,
+                "cagr_3yr_pct": None,
+                "top_year": None,
+                "comments": f"No IQVIA rows for {molecule} / {indication} in {geography}.",
+                "raw_rows": raw_rows,
+            }
+        source = "IQVIA extract" if self.store is not None else "Mock IQVIA-style market overview"
         return {
-            "market_size_usd_mn": raw_rows[-1]["sales_usd_mn"],
-            "cagr_3yr_pct": 4.8,
-            "top_year": 2024,
-            "comments": f"Mock IQVIA-style market overview for {molecule} in {geography}.",
+            "market_size_usd_mn": sales_by_year.iloc[-1].item(),
+            "cagr_3yr_pct": cagr_pct(raw_rows, "sales_usd_mn"),
+            "top_year": sales_by_year.idxmax().item(),
+            "comments": f"{source} for {molecule} in {geography}.",
             "raw_rows": raw_rows,
         }
 
 
-class EXIMTrendsAgent:
-    def run(self, molecule: str, geography: str = "US") -> Dict[str, Any]:
+class EXIMTrendsAgent(WorkerAgent):
+    def __init__(self, store: Optional[MarketDataStore] = None):
+        # Local EXIM extract; without one the agent serves built-in sample rows
+        self.store = store
+
+    def warm_up(self) -> None:
+        if self.store is not None:
+            self.store.dataset("exim")
+
+    def _trade_rows(self, molecule: str, geography: str) -> pd.DataFrame:
+        if self.store is not None:
+            return self.store.query("exim", molecule, geography, columns=["country", "price_usd_per_kg", "volume_kg"])
         # Mock trade data
-        trade_rows = [
-            {"country": "IN", "price_usd_per_kg": 95, "volume_kg": 12000},
-            {"country": "CN", "price_usd_per_kg": 88, "volume_kg": 9000},
-            {"country": "DE", "price_usd_per_kg": 110, "volume_kg": 3500},
-        ]
-        avg_price = round(sum(r["price_usd_per_kg"] for r in trade_rows) / len(trade_rows), 2)
+        return pd.DataFrame(
+            {
+                "country": ["IN", "CN", "DE"],
+                "price_usd_per_kg": [95, 88, 110],
+                "volume_kg": [12000, 9000, 3500],
+            }
+        )
+
+    def run(self, molecule: str, geography: str = "US") -> Dict[str, Any]:
+        shipments = self._trade_rows(molecule, geography)
+        if shipments.empty:
+            return {
+                "api_import_dependency": None,
+                "avg_import_price_per_kg_usd": None,
+                "weighted_avg_import_price_per_kg_usd": None,
+                "comments": f"No EXIM rows for API related to {molecule} in {geography}.",
+                "raw_rows": shipments,
+            }
+        # One row per origin country: total volume and its volume-weighted price
+        shipments = shipments.assign(value_usd=shipments["price_usd_per_kg"] * shipments["volume_kg"])
+        trade_rows = shipments.groupby("country", sort=False).agg(
+            value_usd=("value_usd", "sum"), volume_kg=("volume_kg", "sum")
+        )
+        trade_rows.insert(0, "price_usd_per_kg", (trade_rows.pop("value_usd") / trade_rows["volume_kg"]).round(2))
+        trade_rows = trade_rows.reset_index()
+        avg_price = round(float(trade_rows["price_usd_per_kg"].mean()), 2)
+        source = "EXIM extract" if self.store is not None else "Mock EXIM-style trade overview"
         return {
             "api_import_dependency": "High",
             "avg_import_price_per_kg_usd": avg_price,
-            "comments": f"Mock EXIM-style trade overview for API related to {molecule}.",
+            # Volume-weighted, i.e. what a kilogram actually cost across all imports
+            "weighted_avg_import_price_per_kg_usd": weighted_mean(shipments, "price_usd_per_kg", "volume_kg"),
+            "comments": f"{source} for API related to {molecule}.",
             "raw_rows": trade_rows,
         }
 
 
-class PatentLandscapeAgent:
+class PatentLandscapeAgent(WorkerAgent):
+    def __init__(self, store: Optional[PatentStore] = None):
+        # Local patent store; without one the agent serves a built-in sample landscape
+        self.store = store
+
+    def close(self) -> None:
+        if self.store is not None:
+            self.store.close()
+
     def run(self, molecule: str) -> Dict[str, Any]:
-        patents = [
-            {"assignee": "PharmaCorp", "title": f"Formulations of {molecule}", "year": 2018},
-            {"assignee": "GenPharm", "title": f"Use of {molecule} in neuropathic pain", "year": 2017},
-        ]
+        if self.store is not None:
+            return self._lookup(molecule)
+        patents = pd.DataFrame(
+            {
+                "assignee": ["PharmaCorp", "GenPharm"],
+                "title": [f"Formulations of {molecule}", f"Use of {molecule} in neuropathic pain"],
+                "year": [2018, 2017],
+            }
+        )
         return {
             "core_patent_expiry": "2026-12-31",
             "fto_risk": "Moderate",
@@ -57,39 +184,114 @@ class PatentLandscapeAgent:
             "patents": patents,
         }
 
+    def _lookup(self, molecule: str) -> Dict[str, Any]:
+        fto = self.store.fto(molecule)
+        columns = ["publication", "assignee", "title", "claim_type", "expiry_date"]
+        in_force = self.store.in_force(molecule)
+        patents = pd.DataFrame([{c: p[c] for c in columns} for p in in_force], columns=columns)
+        if fto is None:
+            return {
+                "core_patent_expiry": None,
+                "fto_risk": "Low",
+                "fto_score": 0.0,
+                "comments": f"No patents on {molecule} in the local patent store.",
+                "patents": patents,
+            }
+        return {
+            "core_patent_expiry": fto["core_patent_expiry"],
+            "fto_risk": fto["risk"],
+            "fto_score": fto["score"],
+            "comments": f"{fto['in_force']} patent(s) in force on {fto['as_of']}.",
+            "patents": patents,
+        }
+
 
-class ClinicalTrialsAgent:
-    def run(self, molecule: str) -> Dict[str, Any]:
-        phase_distribution = {
-            "Phase I": 6,
-            "Phase II": 12,
-            "Phase III": 8,
-            "Phase IV": 5,
+class ClinicalTrialsAgent(WorkerAgent):
+    def __init__(self, registry: Optional[TrialRegistry] = None):
+        # Local registry mirror; without one the agent serves a built-in sample
+        self.registry = registry
+
+    def close(self) -> None:
+        if self.registry is not None:
+            self.registry.close()
+
+    def _lookup(self, molecule: str) -> Dict[str, Any]:
+        aggregates = self.registry.aggregates(molecule)
+        if aggregates is None:
+            return {
+                "total_trials": 0,
+                "active_trials": 0,
+                "phase_distribution": {p: 0 for p in PHASES},
+                "comments": f"No registry trials mention {molecule}.",
+                "notable_trials": pd.DataFrame(columns=["id", "phase", "status", "title"]),
+            }
+        return {
+            "total_trials": aggregates["total_trials"],
+            "active_trials": aggregates["active_trials"],
+            "phase_distribution": aggregates["phase_distribution"],
+            "comments": "Counts from the local registry mirror.",
+            "notable_trials": pd.DataFrame(aggregates["notable_trials"], columns=["id", "phase", "status", "title"]),
         }
-        notable_trials = [
-            {"id": "NCT00000001", "phase": "Phase III", "status": "Active"},
-            {"id": "NCT00000002", "phase": "Phase II", "status": "Completed"},
-        ]
+
+    def run(self, molecule: str) -> Dict[str, Any]:
+        if self.registry is not None:
+            return self._lookup(molecule)
+        # Mock registry sample: one row per trial (total / active per phase)
+        totals, active = [6, 12, 8, 5], [2, 5, 4, 3]
+        registry = pd.DataFrame(
+            {
+                "phase": pd.Categorical(
+                    [p for p, n in zip(PHASES, totals) for _ in range(n)], categories=PHASES
+                ),
+                "status": [s for n, a in zip(totals, active) for s in ["Active"] * a + ["Completed"] * (n - a)],
+            }
+        )
+        notable_trials = pd.DataFrame(
+            {
+                "id": ["NCT00000001", "NCT00000002"],
+                "phase": ["Phase III", "Phase II"],
+                "status": ["Active", "Completed"],
+            }
+        )
         return {
-            "total_trials": sum(phase_distribution.values()),
-            "active_trials": 14,
-            "phase_distribution": phase_distribution,
+            "total_trials": len(registry),
+            "active_trials": int((registry["status"] == "Active").sum()),
+            "phase_distribution": phase_counts(registry, PHASES),
             "comments": "Mock clinical landscape derived from sample registry counts.",
             "notable_trials": notable_trials,
         }
 
 
-class InternalKnowledgeAgent:
+class InternalKnowledgeAgent(WorkerAgent):
+    # BM25 queries against the internal corpus; the molecule name is added to each
+    FEEDBACK_QUERY = "adherence dosing side effects dizziness sedation elderly tolerability patients"
+    STRATEGY_QUERY = "strategy priority differentiation formulation lifecycle opportunity"
+
+    def __init__(self, index: Optional[DocumentIndex] = None):
+        # Local document index; without one the agent serves built-in sample notes
+        self.index = index
+
+    def close(self) -> None:
+        if self.index is not None:
+            self.index.close()
+
     def run(self, molecule: str) -> Dict[str, Any]:
+        if self.index is not None:
+            return self._search(molecule)
         field_feedback = [
             "Adherence in elderly patients is challenging with current dosing.",
             "Some patients report dizziness and daytime sedation.",
             "Diabetic neuropathy subgroup may benefit from tailored regimen.",
         ]
-        raw_rows = [
-            {"doc": "FieldNotes_2024_Q3", "summary": "Elderly adherence concerns & sedation reports."},
-            {"doc": "StrategicBrief_2025", "summary": "Focus on differentiation via formulation & dosing."},
-        ]
+        raw_rows = pd.DataFrame(
+            {
+                "doc": ["FieldNotes_2024_Q3", "StrategicBrief_2025"],
+                "summary": [
+                    "Elderly adherence concerns & sedation reports.",
+                    "Focus on differentiation via formulation & dosing.",
+                ],
+            }
+        )
         return {
             "strategic_priorities_match": "Medium",
             "comments": "Mock internal insights summarizing strategy fit and feedback.",
@@ -97,9 +299,49 @@ class InternalKnowledgeAgent:
             "raw_rows": raw_rows,
         }
 
+    def _search(self, molecule: str) -> Dict[str, Any]:
+        feedback = self.index.search(f"{molecule} {self.FEEDBACK_QUERY}", molecule, k=5, kinds=("field_note",))
+        briefs = self.index.search(f"{molecule} {self.STRATEGY_QUERY}", molecule, k=5, kinds=("strategic_brief",))
+        # Briefs written about this molecule (not general portfolio ones) signal strategic fit
+        specific = sum(1 for hit in briefs if hit["molecule"])
+        hits = feedback + briefs
+        raw_rows = pd.DataFrame(
+            {
+                "doc": [h["doc"] for h in hits],
+                "kind": [h["kind"] for h in hits],
+                "summary": [h["summary"] or h["snippet"] for h in hits],
+                "score": [h["score"] for h in hits],
+            }
+        )
+        return {
+            "strategic_priorities_match": "High" if specific >= 2 else "Medium" if specific else "Low",
+            "comments": f"Top internal documents for {molecule} by BM25 relevance ({len(self.index)} indexed).",
+            "field_feedback": [h["snippet"] for h in feedback],
+            "raw_rows": raw_rows,
+        }
+
+
+class WebIntelligenceAgent(WorkerAgent):
+    # Semantic queries per source type; the molecule name is prepended to each, and
+    # snippets tagged with another molecule are filtered out
+    QUERIES = {
+        "guideline": "dosing recommendation monitoring guideline for patients",
+        "forum": "patient experience side effects sleepy dizziness adherence dose timing",
+        "news": "new formulation study approval real-world outcomes",
+    }
+
+    def __init__(self, index: Optional[VectorIndex] = None, k: int = 3):
+        # Local snippet index; without one the agent serves built-in sample snippets
+        self.index = index
+        self.k = k
+
+    def close(self) -> None:
+        if self.index is not None:
+            self.index.close()
 
-class WebIntelligenceAgent:
     def run(self, molecule: str) -> Dict[str, Any]:
+        if self.index is not None:
+            return self._search(molecule)
         guideline_extracts = [
             "Consider dose adjustments in elderly and renally impaired patients.",
             "Monitor CNS-related side effects and counsel patients accordingly.",
@@ -112,10 +354,15 @@ class WebIntelligenceAgent:
             "New formulation approaches aim to reduce CNS side effects.",
             "Real-world studies highlight adherence interventions improving outcomes.",
         ]
-        raw_rows = [
-            {"source": "ForumA", "snippet": "Users discuss adjusting dose timing for less sedation."},
-            {"source": "GuidelineX", "snippet": "Elderly dosing considerations highlighted."},
-        ]
+        raw_rows = pd.DataFrame(
+            {
+                "source": ["ForumA", "GuidelineX"],
+                "snippet": [
+                    "Users discuss adjusting dose timing for less sedation.",
+                    "Elderly dosing considerations highlighted.",
+                ],
+            }
+        )
         return {
             "guideline_extracts": guideline_extracts,
             "patient_forum_highlights": patient_forum_highlights,
@@ -123,8 +370,82 @@ class WebIntelligenceAgent:
             "raw_rows": raw_rows,
         }
 
+    def _search(self, molecule: str) -> Dict[str, Any]:
+        hits = {
+            kind: self.index.search(f"{molecule} {query}", kind, k=self.k, molecule=molecule)
+            for kind, query in self.QUERIES.items()
+        }
+        rows = [h for kind in self.QUERIES for h in hits[kind]]
+        return {
+            "guideline_extracts": [h["text"] for h in hits["guideline"]],
+            "patient_forum_highlights": [h["text"] for h in hits["forum"]],
+            "recent_news": [h["text"] for h in hits["news"]],
+            "raw_rows": pd.DataFrame(
+                {
+                    "source": [h["source"] for h in rows],
+                    "kind": [h["kind"] for h in rows],
+                    "snippet": [h["text"] for h in rows],
+                    "score": [h["score"] for h in rows],
+                }
+            ),
+        }
+
+
+@lru_cache(maxsize=1)
+def _raster_font() -> Tuple[Any, TextWrapper]:
+    # Default Pillow font plus a wrapper caching its word advance widths across reports
+    font = ImageFont.load_default()
+    return font, TextWrapper(font.getlength)
+
+
+def _fingerprint_default(value: Any) -> Any:
+    # str() of a large DataFrame elides rows, so tables are hashed cell by cell
+    if isinstance(value, pd.DataFrame):
+        return {"__frame__": frame_digest(value)}
+    return str(value)
+
+
+def payload_fingerprint(payload: Dict[str, Any]) -> str:
+    """Content hash of a report payload; equal payloads give equal fingerprints."""
+    blob = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=_fingerprint_default)
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
 
 class ReportGeneratorAgent:
+    def __init__(self, max_cached: int = 32):
+        # Rendered artifacts keyed by (format, payload fingerprint), least recently used evicted
+        self.max_cached = max_cached
+        self._artifacts: "OrderedDict[Tuple[str, str], Union[str, bytes]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def report_artifact(
+        self, payload: Dict[str, Any], fmt: str = "pdf", tracer: Optional[Tracer] = None
+    ) -> Union[str, bytes]:
+        """
+        Text ("txt") or PDF ("pdf") report for the payload, rendered at most once per
+        distinct payload content. With a tracer, the lookup / render is recorded as a span.
+        """
+        trace = tracer if tracer is not None else NULL_TRACER
+        render = {"txt": self.generate_text_report, "pdf": self.generate_pdf_report}[fmt]
+        with trace.span(f"report.{fmt}", track="report") as span:
+            key = (fmt, payload_fingerprint(payload))
+            with self._lock:
+                artifact = self._artifacts.get(key)
+                if artifact is not None:
+                    self._artifacts.move_to_end(key)
+            trace.count(f"report.cache.{'hit' if artifact is not None else 'miss'}")
+            if artifact is None:
+                artifact = render(payload)
+                with self._lock:
+                    self._artifacts[key] = artifact
+                    while len(self._artifacts) > self.max_cached:
+                        self._artifacts.popitem(last=False)
+                span.set(cached=False)
+            else:
+                span.set(cached=True)
+            span.set(bytes=len(artifact))
+        return artifact
+
     def _compose_text(self, payload: Dict[str, Any]) -> str:
         lines: List[str] = []
         lines.append(f"Innovation Report: {payload.get('molecule','')} – {payload.get('primary_indication','')} ({payload.get('target_geography','')})")
@@ -147,6 +468,7 @@ class ReportGeneratorAgent:
         lines.append("Trade Overview:")
         lines.append(f"- API import dependency: {e.get('api_import_dependency','NA')}")
         lines.append(f"- Avg import price (USD/kg): {e.get('avg_import_price_per_kg_usd','NA')}")
+        lines.append(f"- Volume-weighted import price (USD/kg): {e.get('weighted_avg_import_price_per_kg_usd','NA')}")
         lines.append("")
 
         c = payload.get("clinical_trials_landscape", {})
@@ -186,8 +508,46 @@ class ReportGeneratorAgent:
     def generate_text_report(self, payload: Dict[str, Any]) -> str:
         return self._compose_text(payload)
 
+    def _report_tables(self, payload: Dict[str, Any]) -> List[Tuple[str, pd.DataFrame]]:
+        # (title, table) for every tabular section of the payload, in report order
+        sources = [
+            ("Market data (IQVIA)", payload.get("market_overview", {}).get("raw_rows")),
+            ("Trade data (EXIM)", payload.get("exim_overview", {}).get("raw_rows")),
+            ("Notable clinical trials", payload.get("clinical_trials_landscape", {}).get("notable_trials")),
+            ("Patents", payload.get("patent_landscape", {}).get("patents")),
+            ("Internal documents", payload.get("internal_insights", {}).get("raw_rows")),
+            ("Web snippets", payload.get("web_insights", {}).get("raw_rows")),
+        ]
+        return [(title, as_frame(rows)) for title, rows in sources if has_rows(rows)]
+
     def generate_pdf_report(self, payload: Dict[str, Any]) -> bytes:
-        # Render the text into a simple PDF using Pillow (no external deps)
+        # Native vector PDF: searchable text, standard fonts, as many pages as needed
+        doc = PDFDocument()
+        lines = self._compose_text(payload).split("\n")
+        doc.paragraph(lines[0], font=BOLD, size=14)
+        for line in lines[1:]:
+            if not line:
+                doc.spacer(6)
+            elif line.endswith(":") and not line.startswith(("-", " ")):
+                doc.paragraph(line, font=BOLD, size=11)
+            else:
+                doc.paragraph(line, indent=12 if line.startswith(" ") else 0)
+
+        tables = self._report_tables(payload)
+        if tables:
+            doc.spacer(10)
+            doc.paragraph("Data Tables", font=BOLD, size=12)
+            for title, frame in tables:
+                doc.spacer(6)
+                doc.paragraph(title, font=BOLD, size=10)
+                doc.spacer(2)
+                rows = frame.astype(object).where(frame.notna(), "").itertuples(index=False, name=None)
+                doc.table([str(c) for c in frame.columns], list(rows))
+        return doc.to_bytes()
+
+    def generate_raster_pdf_report(self, payload: Dict[str, Any]) -> bytes:
+        # Legacy path: render the text into a single-page PDF image using Pillow.
+        # Kept for comparison in benchmarks/bench_report_pdf.py.
         text = self._compose_text(payload)
 
         # Create a white A4-ish image and draw text
@@ -196,30 +556,13 @@ class ReportGeneratorAgent:
         line_height = 22
         img = Image.new("RGB", (img_w, img_h), "white")
         draw = ImageDraw.Draw(img)
-        font = ImageFont.load_default()
-
-        # Wrap text to fit width
-        def wrap_line(s: str, max_width: int) -> List[str]:
-            words = s.split(" ")
-            lines: List[str] = []
-            current = ""
-            for w in words:
-                test = w if not current else current + " " + w
-                bbox = draw.textbbox((0, 0), test, font=font)
-                if bbox[2] - bbox[0] <= max_width:
-                    current = test
-                else:
-                    if current:
-                        lines.append(current)
-                    current = w
-            if current:
-                lines.append(current)
-            return lines
+        # Wrap text to fit width, measuring each distinct word once
+        font, wrapper = _raster_font()
 
         max_text_width = img_w - 2 * margin
         y = margin
         for raw_line in text.split("\n"):
-            wrapped = wrap_line(raw_line, max_text_width)
+            wrapped = wrapper.wrap(raw_line, max_text_width) if raw_line else []
             for wl in wrapped:
                 if y + line_height > img_h - margin:
                     # Stop if page would overflow; indicate truncation
@@ -1,9 +1,13 @@
 # app.py
 
+import json
+
 import streamlit as st
 import pandas as pd
 
-from graph import build_master_agent
+from graph import is_degraded
+from jobs import DIAGNOSTICS_KEY, PARTIAL_HYPOTHESIS_KEY, build_job_queue
+from agents.tables import as_frame, has_rows
 from agents.worker_agents import ReportGeneratorAgent
 
 
@@ -127,6 +131,656 @@ st.markdown(
 )
 
 
+# ----------------- Shared Resources -----------------
+
+# Seconds between polls of a running job's results
+JOB_POLL_S = 0.1
+
+SECTION_LABELS = {
+    "market_overview": "Market",
+    "exim_overview": "Trade",
+    "clinical_trials_landscape": "Clinical trials",
+    "patent_landscape": "Patents",
+    "internal_insights": "Internal insights",
+    "web_insights": "Web intelligence",
+}
+
+
+@st.cache_resource
+def get_job_queue():
+    # One job queue (and worker process pool) per server process; analyses run there,
+    # so they survive reruns and reloads and are not recomputed for repeat queries
+    return build_job_queue()
+
+
+@st.cache_resource
+def get_report_agent():
+    # Keeps rendered reports (keyed by payload hash) across reruns
+    return ReportGeneratorAgent()
+
+
+def derive(views, name, fn):
+    # Frames, chart series and report text derived from a result are built once and
+    # kept in its session-state entry (views); without one they are built each time
+    if views is None:
+        return fn()
+    if name not in views:
+        views[name] = fn()
+    return views[name]
+
+
+# ----------------- Section Renderers -----------------
+
+def render_market_kpi(market):
+    ms = market.get("market_size_usd_mn")
+    cagr = market.get("cagr_3yr_pct")
+    st.markdown(
+        f"""
+        <div class="card">
+            <div class="kpi-label">Market Size</div>
+            <div class="kpi-value">{ms if ms is not None else "NA"} {"" if ms is None else "M USD"}</div>
+            <div class="kpi-sub">CAGR: {cagr if cagr is not None else "NA"}%</div>
+        </div>
+        """,
+        unsafe_allow_html=True,
+    )
+
+
+def render_trials_kpi(trials):
+    st.markdown(
+        f"""
+        <div class="card">
+            <div class="kpi-label">Clinical Activity</div>
+            <div class="kpi-value">{trials.get("total_trials", 0)}</div>
+            <div class="kpi-sub">Active trials: {trials.get("active_trials", 0)}</div>
+        </div>
+        """,
+        unsafe_allow_html=True,
+    )
+
+
+def render_patent_kpi(patents):
+    st.markdown(
+        f"""
+        <div class="card">
+            <div class="kpi-label">FTO Risk</div>
+            <div class="kpi-value">{patents.get("fto_risk", "Unknown")}</div>
+            <div class="kpi-sub">Core expiry: {patents.get("core_patent_expiry", "NA")}</div>
+        </div>
+        """,
+        unsafe_allow_html=True,
+    )
+
+
+def render_exim_kpi(exim):
+    st.markdown(
+        f"""
+        <div class="card">
+            <div class="kpi-label">API Sourcing</div>
+            <div class="kpi-value">{exim.get("api_import_dependency", "NA")}</div>
+            <div class="kpi-sub">Avg import price: {exim.get("avg_import_price_per_kg_usd", "NA")} USD/kg</div>
+        </div>
+        """,
+        unsafe_allow_html=True,
+    )
+
+
+def render_search_context(result):
+    st.markdown(
+        f"""
+        <div class="card">
+          <div class="card-label">Search context</div>
+          <h3 style="margin-top:0.3rem;">{result["molecule"]} – {result["primary_indication"]} ({result["target_geography"]})</h3>
+        </div>
+        """,
+        unsafe_allow_html=True,
+    )
+    st.markdown("")
+
+
+def hypothesis_card(text):
+    return f"""
+        <div class="card">
+            <div class="card-label">Innovation hypothesis</div>
+            <p style='margin-top:0.5rem; font-size:0.95rem;'>{text}</p>
+        </div>
+        """
+
+
+def render_hypothesis(result):
+    st.markdown(hypothesis_card(result["innovation_hypothesis"]), unsafe_allow_html=True)
+
+
+def render_partial_hypothesis(text):
+    # The hypothesis so far while the job streams it, with a cursor
+    st.markdown(hypothesis_card(text + " ▌"), unsafe_allow_html=True)
+
+
+def render_unmet_needs(result):
+    unmet = result.get("unmet_needs", [])
+    if unmet:
+        unmet_content = (
+            "<ul style='padding-left:1.1rem; margin-top:0.4rem;'>"
+            + "".join([f"<li>{u}</li>" for u in unmet])
+            + "</ul>"
+        )
+    else:
+        unmet_content = "<p style='margin-top:0.5rem; color:#a0a8c8;'>No specific unmet needs inferred from mock data.</p>"
+
+    st.markdown(
+        f"""
+        <div class="card">
+            <div class="card-label">Unmet needs</div>
+            {unmet_content}
+            <p style='margin-top:0.8rem; font-size:0.85rem; color:#9da7ce;'><b>Clinical rationale:</b> {result['clinical_rationale']}</p>
+        </div>
+        """,
+        unsafe_allow_html=True,
+    )
+
+
+def render_market_section(m, views=None, show_raw=True):
+    st.markdown('<div class="card">', unsafe_allow_html=True)
+    st.markdown(
+        f"""
+        <h3>IQVIA-like Market Overview</h3>
+        <p><b>Market size (USD Mn):</b> {m.get('market_size_usd_mn')}</p>
+        <p><b>CAGR (3-yr %):</b> {m.get('cagr_3yr_pct')}</p>
+        <p><b>Top year:</b> {m.get('top_year')}</p>
+        <p style='font-size:0.8rem; color:#838cb0;'>{m.get("comments", "")}</p>
+        """,
+        unsafe_allow_html=True
+    )
+    if has_rows(m.get("raw_rows")):
+        df_sales = derive(views, "market.rows", lambda: as_frame(m["raw_rows"]))
+        if show_raw:
+            st.markdown("**Raw view:**")
+            st.dataframe(df_sales, use_container_width=True)
+        if "year" in df_sales.columns and "sales_usd_mn" in df_sales.columns:
+            trend = derive(views, "market.trend", lambda: df_sales.sort_values("year").set_index("year")["sales_usd_mn"])
+            st.markdown("**Sales trend (USD Mn by year):**")
+            st.line_chart(trend)
+
+
+def render_exim_section(e, views=None, show_raw=True):
+    st.markdown('<div class="card">', unsafe_allow_html=True)
+    st.markdown(
+        f"""
+        <h3>EXIM-like Trade Overview</h3>
+        <p><b>API import dependency:</b> {e.get('api_import_dependency')}</p>
+        <p><b>Avg import price (USD/kg):</b> {e.get('avg_import_price_per_kg_usd')}</p>
+        <p><b>Volume-weighted import price (USD/kg):</b> {e.get('weighted_avg_import_price_per_kg_usd')}</p>
+        <p style='font-size:0.8rem; color:#838cb0;'>{e.get("comments", "")}</p>
+        """,
+        unsafe_allow_html=True
+    )
+    if show_raw and has_rows(e.get("raw_rows")):
+        st.markdown("**Trade rows:**")
+        st.dataframe(e["raw_rows"], use_container_width=True)
+    st.markdown("</div>", unsafe_allow_html=True)
+
+
+def render_trials_section(c, views=None, show_raw=True):
+    st.markdown('<div class="card">', unsafe_allow_html=True)
+    st.markdown(
+        f"""
+        <h3>Clinical Trials Landscape</h3>
+        <p><b>Total trials:</b> {c.get('total_trials')}</p>
+        <p><b>Active trials:</b> {c.get('active_trials')}</p>
+        <p><b>Phase distribution:</b> {c.get('phase_distribution')}</p>
+        <p style='font-size:0.8rem; color:#838cb0;'>{c.get("comments", "")}</p>
+        """,
+        unsafe_allow_html=True
+    )
+    if show_raw and has_rows(c.get("notable_trials")):
+        st.markdown("**Notable trials:**")
+        st.dataframe(c["notable_trials"], use_container_width=True)
+
+    phase_dist = c.get("phase_distribution", {})
+    if phase_dist:
+        df_phase = derive(
+            views,
+            "trials.phases",
+            lambda: pd.DataFrame(list(phase_dist.items()), columns=["Phase", "Trials"]).set_index("Phase"),
+        )
+        st.markdown("**Trials by Phase:**")
+        st.bar_chart(df_phase)
+    st.markdown("</div>", unsafe_allow_html=True)
+
+
+def render_patent_section(p, views=None, show_raw=True):
+    st.markdown('<div class="card">', unsafe_allow_html=True)
+    st.markdown(
+        f"""
+        <h3>Patent Landscape</h3>
+        <p><b>Core patent expiry:</b> {p.get('core_patent_expiry')}</p>
+        <p><b>FTO risk:</b> {p.get('fto_risk')}</p>
+        <p style='font-size:0.8rem; color:#838cb0;'>{p.get("comments", "")}</p>
+        """,
+        unsafe_allow_html=True
+    )
+    if show_raw and has_rows(p.get("patents")):
+        st.markdown("**Patent list:**")
+        st.dataframe(p["patents"], use_container_width=True)
+    st.markdown("</div>", unsafe_allow_html=True)
+
+
+def render_internal_section(i, views=None, show_raw=True):
+    st.markdown('<div class="card">', unsafe_allow_html=True)
+    st.markdown(
+        f"""
+        <h3>Internal Insights</h3>
+        <p><b>Strategic priority match:</b> {i.get('strategic_priorities_match')}</p>
+        <p style='font-size:0.8rem; color:#838cb0;'>{i.get("comments", "")}</p>
+        """,
+        unsafe_allow_html=True
+    )
+    if i.get("field_feedback"):
+        st.markdown("**Field feedback:**")
+        for fb in i["field_feedback"]:
+            st.markdown(f"- {fb}")
+    if show_raw and has_rows(i.get("raw_rows")):
+        st.markdown("**Raw internal docs:**")
+        st.dataframe(i["raw_rows"], use_container_width=True)
+    st.markdown("</div>", unsafe_allow_html=True)
+
+
+def render_web_section(w, views=None, show_raw=True):
+    st.markdown('<div class="card">', unsafe_allow_html=True)
+    guideline_extracts_html = "".join([f"<li>{g}</li>" for g in w.get("guideline_extracts", [])])
+    patient_forum_highlights_html = "".join([f"<li>{p}</li>" for p in w.get("patient_forum_highlights", [])])
+    st.markdown(
+        f"""
+        <h3>Web Intelligence</h3>
+        <p><b>Guideline extracts:</b></p>
+        <ul>{guideline_extracts_html}</ul>
+        <p><b>Patient forum highlights:</b></p>
+        <ul>{patient_forum_highlights_html}</ul>
+        """,
+        unsafe_allow_html=True
+    )
+
+    st.write("**Recent news / journals:**")
+    for rn in w.get("recent_news", []):
+        st.markdown(f"- {rn}")
+
+    if show_raw and has_rows(w.get("raw_rows")):
+        st.markdown("**Raw web snippets:**")
+        st.dataframe(w["raw_rows"], use_container_width=True)
+    st.markdown("</div>", unsafe_allow_html=True)
+
+
+def report_payload(result):
+    return {
+        "molecule": result["molecule"],
+        "primary_indication": result["primary_indication"],
+        "target_geography": result["target_geography"],
+        "unmet_needs": result.get("unmet_needs", []),
+        "clinical_rationale": result.get("clinical_rationale", ""),
+        "market_overview": result.get("market_overview", {}),
+        "exim_overview": result.get("exim_overview", {}),
+        "patent_landscape": result.get("patent_landscape", {}),
+        "clinical_trials_landscape": result.get("clinical_trials_landscape", {}),
+        "internal_insights": result.get("internal_insights", {}),
+        "web_insights": result.get("web_insights", {}),
+        "innovation_hypothesis": result.get("innovation_hypothesis", ""),
+    }
+
+
+def render_report(result, views=None):
+    report_agent = get_report_agent()
+    payload = derive(views, "report.payload", lambda: report_payload(result))
+    report_text = derive(views, "report.txt", lambda: report_agent.report_artifact(payload, "txt"))
+
+    st.markdown(
+        f"""
+        <div class="card">
+            <h3>Downloadable Report</h3>
+            <p><b>Text preview:</b></p>
+            <pre>{report_text[:1500] + ("\n...\n" if len(report_text) > 1500 else "")}</pre>
+        </div>
+        """,
+        unsafe_allow_html=True
+    )
+
+    col_txt, col_pdf = st.columns(2)
+    with col_txt:
+        st.download_button(
+            label="Download full report (.txt)",
+            data=lambda: report_agent.report_artifact(payload, "txt").encode("utf-8"),
+            file_name=f"{result['molecule']}_{result['primary_indication']}_innovation_report.txt",
+            mime="text/plain",
+            on_click="ignore",
+            use_container_width=True,
+        )
+    with col_pdf:
+        st.download_button(
+            label="Download full report (.pdf)",
+            # Rendered only when the download is requested
+            data=lambda: report_agent.report_artifact(payload, "pdf"),
+            file_name=f"{result['molecule']}_{result['primary_indication']}_innovation_report.pdf",
+            mime="application/pdf",
+            on_click="ignore",
+            use_container_width=True,
+        )
+
+
+def span_frame(spans):
+    frame = pd.DataFrame(spans)
+    if frame.empty:
+        return frame
+    frame["bytes"] = [attrs.get("bytes") for attrs in frame["attrs"]]
+    return frame[["track", "name", "start_ms", "duration_ms", "bytes"]]
+
+
+def render_diagnostics(diagnostics, result, views=None):
+    # Where the time went in the job: per-step totals, every span, counters, and the
+    # counters of the worker process that ran it when the job finished
+    trace = diagnostics["trace"]
+    with st.expander("Diagnostics", expanded=False):
+        summary = derive(views, "trace.summary", lambda: pd.DataFrame.from_dict(trace["summary"], orient="index"))
+        st.markdown("**Time by step (ms):**")
+        st.dataframe(summary, use_container_width=True)
+
+        spans = derive(views, "trace.spans", lambda: span_frame(trace["spans"]))
+        if not spans.empty:
+            st.markdown("**Spans:**")
+            st.dataframe(spans, use_container_width=True)
+
+        col_counters, col_cache = st.columns(2)
+        with col_counters:
+            st.markdown("**Counters:**")
+            st.json(trace["counters"])
+        with col_cache:
+            st.markdown("**Section cache (shared; this worker's lookups):**")
+            st.json(diagnostics["cache"])
+            st.markdown("**Coalesced calls (this worker's calls):**")
+            st.json(diagnostics["flights"])
+            st.markdown("**Circuit breakers (this worker only):**")
+            st.json(diagnostics["breakers"])
+            if diagnostics["llm"] is not None:
+                st.markdown("**LLM usage (this worker):**")
+                st.json(diagnostics["llm"])
+
+        col_json, col_chrome = st.columns(2)
+        stem = f"{result['molecule']}_trace"
+        with col_json:
+            st.download_button(
+                label="Download trace (.json)",
+                data=json.dumps(trace, indent=2, default=str),
+                file_name=f"{stem}.json",
+                mime="application/json",
+                on_click="ignore",
+                use_container_width=True,
+            )
+        with col_chrome:
+            st.download_button(
+                label="Download Chrome trace",
+                data=diagnostics["chrome_trace"],
+                file_name=f"{stem}.chrome.json",
+                mime="application/json",
+                on_click="ignore",
+                use_container_width=True,
+            )
+
+
+def format_age(seconds):
+    for unit, size in (("d", 86400), ("h", 3600), ("min", 60)):
+        if seconds >= size:
+            return f"{seconds / size:.0f} {unit}"
+    return f"{seconds:.0f} s"
+
+
+def render_section(renderer, section, compact=False, **kwargs):
+    # Mark degraded sections: a stale cached copy is shown with a warning, a missing
+    # one only as an error (KPI cards keep their NA values and get a short caption)
+    if "error" in section:
+        if compact:
+            renderer(section, **kwargs)
+            st.caption("Unavailable")
+        else:
+            st.error(f"Section unavailable: {section['error']}")
+        return
+    if section.get("stale"):
+        age = format_age(section.get("stale_age_s", 0))
+        if compact:
+            st.caption(f"Stale · {age} old")
+        else:
+            st.warning(f"Showing cached data from {age} ago: {section.get('degraded_reason', '')}")
+    renderer(section, **kwargs)
+
+
+def render_kpi(renderer):
+    return lambda section: render_section(renderer, section, compact=True)
+
+
+def render_full(renderer, **kwargs):
+    return lambda section: render_section(renderer, section, **kwargs)
+
+
+def render_into(slot, renderer, *args):
+    # Replace a placeholder's contents with a rendered section
+    with slot.container():
+        renderer(*args)
+
+
+def waiting_slot(label):
+    slot = st.empty()
+    slot.caption(f"Waiting for {label}...")
+    return slot
+
+
+# ----------------- Result View -----------------
+
+TAB_LABELS = [" Overview", " Market & Trade", " Clinical & Patents", " Insights & Web", " Report"]
+# Finished results kept per session (by query), most recent last
+MAX_SESSION_RESULTS = 5
+
+
+def session_result(job):
+    # The session's entry for this job, if it has finished and was seen here before
+    entry = st.session_state.get("results", {}).get(job.key)
+    return entry if entry is not None and entry["job_id"] == job.id else None
+
+
+def remember_result(job, result, diagnostics):
+    results = st.session_state.setdefault("results", {})
+    results.pop(job.key, None)
+    results[job.key] = {"job_id": job.id, "result": result, "diagnostics": diagnostics, "views": {}}
+    while len(results) > MAX_SESSION_RESULTS:
+        results.pop(next(iter(results)))
+    return results[job.key]
+
+
+def follow_job(queue, job):
+    # Placeholder layout filled in as the job's worker produces each part
+    status = st.empty()
+    status.info("Running Master + Worker Agents...")
+
+    # --------- KPI STRIP ---------
+    cols_kpi = st.columns(4)
+    kpi_slots = {}
+    for col, key, label in zip(
+        cols_kpi,
+        ["market_overview", "clinical_trials_landscape", "patent_landscape", "exim_overview"],
+        ["market data", "clinical data", "patent data", "trade data"],
+    ):
+        with col:
+            kpi_slots[key] = waiting_slot(label)
+
+    st.markdown("")
+
+    # --------- Tabs ---------
+    tabs = st.tabs(TAB_LABELS)
+
+    with tabs[0]:
+        context_slot = st.empty()
+        col_o1, col_o2 = st.columns([1.3, 1])
+        with col_o1:
+            hypothesis_slot = waiting_slot("innovation hypothesis")
+        with col_o2:
+            unmet_slot = waiting_slot("internal & web insights")
+
+    with tabs[1]:
+        col_m1, col_m2 = st.columns([1.3, 1])
+        with col_m1:
+            market_slot = waiting_slot("IQVIA agent")
+        with col_m2:
+            exim_slot = waiting_slot("EXIM agent")
+
+    with tabs[2]:
+        col_c1, col_c2 = st.columns([1.3, 1])
+        with col_c1:
+            trials_slot = waiting_slot("clinical trials agent")
+        with col_c2:
+            patent_slot = waiting_slot("patent agent")
+
+    with tabs[3]:
+        col_i1, col_i2 = st.columns([1.3, 1])
+        with col_i1:
+            internal_slot = waiting_slot("internal knowledge agent")
+        with col_i2:
+            web_slot = waiting_slot("web intelligence agent")
+
+    with tabs[4]:
+        waiting_slot("all agents")
+
+    # Section key -> (placeholder, renderer) pairs filled as each result arrives
+    section_slots = {
+        "market_overview": [
+            (kpi_slots["market_overview"], render_kpi(render_market_kpi)),
+            (market_slot, render_full(render_market_section)),
+        ],
+        "exim_overview": [
+            (kpi_slots["exim_overview"], render_kpi(render_exim_kpi)),
+            (exim_slot, render_full(render_exim_section)),
+        ],
+        "clinical_trials_landscape": [
+            (kpi_slots["clinical_trials_landscape"], render_kpi(render_trials_kpi)),
+            (trials_slot, render_full(render_trials_section)),
+        ],
+        "patent_landscape": [
+            (kpi_slots["patent_landscape"], render_kpi(render_patent_kpi)),
+            (patent_slot, render_full(render_patent_section)),
+        ],
+        "internal_insights": [(internal_slot, render_full(render_internal_section))],
+        "web_insights": [(web_slot, render_full(render_web_section))],
+    }
+
+    # Parts arrive as the job's worker produces them (all at once for a finished job)
+    result = {}
+    diagnostics = None
+    for key, value in queue.follow(job.id, poll_s=JOB_POLL_S):
+        if key == PARTIAL_HYPOTHESIS_KEY:
+            render_into(hypothesis_slot, render_partial_hypothesis, value)
+            continue
+        if key == DIAGNOSTICS_KEY:
+            diagnostics = value
+            continue
+        result[key] = value
+        for slot, renderer in section_slots.get(key, []):
+            render_into(slot, renderer, value)
+        if key == "target_geography":
+            render_into(context_slot, render_search_context, result)
+        elif key == "clinical_rationale":
+            render_into(unmet_slot, render_unmet_needs, result)
+        elif key == "innovation_hypothesis":
+            render_into(hypothesis_slot, render_hypothesis, result)
+    return result, diagnostics
+
+
+def render_status(result):
+    degraded = [
+        f"{label} ({'stale' if result[key].get('stale') else 'missing'})"
+        for key, label in SECTION_LABELS.items()
+        if is_degraded(result[key])
+    ]
+    if degraded:
+        st.warning(f"Analysis complete with degraded sections: {', '.join(degraded)}")
+    else:
+        st.success("Analysis complete ")
+
+
+# Each tab is a fragment: its widgets rerun only that tab, against the result and
+# derived views held in session state
+
+
+@st.fragment
+def overview_tab(result):
+    render_search_context(result)
+    col_o1, col_o2 = st.columns([1.3, 1])
+    with col_o1:
+        render_hypothesis(result)
+    with col_o2:
+        render_unmet_needs(result)
+
+
+@st.fragment
+def market_tab(result, views):
+    show_raw = st.toggle("Show raw rows", value=True, key="raw_market")
+    col_m1, col_m2 = st.columns([1.3, 1])
+    with col_m1:
+        render_section(render_market_section, result["market_overview"], views=views, show_raw=show_raw)
+    with col_m2:
+        render_section(render_exim_section, result["exim_overview"], views=views, show_raw=show_raw)
+
+
+@st.fragment
+def clinical_tab(result, views):
+    show_raw = st.toggle("Show raw rows", value=True, key="raw_clinical")
+    col_c1, col_c2 = st.columns([1.3, 1])
+    with col_c1:
+        render_section(render_trials_section, result["clinical_trials_landscape"], views=views, show_raw=show_raw)
+    with col_c2:
+        render_section(render_patent_section, result["patent_landscape"], views=views, show_raw=show_raw)
+
+
+@st.fragment
+def insights_tab(result, views):
+    show_raw = st.toggle("Show raw rows", value=True, key="raw_insights")
+    col_i1, col_i2 = st.columns([1.3, 1])
+    with col_i1:
+        render_section(render_internal_section, result["internal_insights"], views=views, show_raw=show_raw)
+    with col_i2:
+        render_section(render_web_section, result["web_insights"], views=views, show_raw=show_raw)
+
+
+@st.fragment
+def report_tab(result, views):
+    render_report(result, views)
+
+
+def render_result(entry):
+    result, views = entry["result"], entry["views"]
+    render_status(result)
+
+    cols_kpi = st.columns(4)
+    for col, key, renderer in zip(
+        cols_kpi,
+        ["market_overview", "clinical_trials_landscape", "patent_landscape", "exim_overview"],
+        [render_market_kpi, render_trials_kpi, render_patent_kpi, render_exim_kpi],
+    ):
+        with col:
+            render_section(renderer, result[key], compact=True)
+
+    st.markdown("")
+
+    tabs = st.tabs(TAB_LABELS)
+    with tabs[0]:
+        overview_tab(result)
+    with tabs[1]:
+        market_tab(result, views)
+    with tabs[2]:
+        clinical_tab(result, views)
+    with tabs[3]:
+        insights_tab(result, views)
+    with tabs[4]:
+        report_tab(result, views)
+
+    if entry["diagnostics"] is not None:
+        render_diagnostics(entry["diagnostics"], result, views)
+
+
 # ----------------- Main App -----------------
 
 def main():
@@ -170,325 +824,42 @@ def main():
         """
     )
 
+    show_diagnostics = st.sidebar.checkbox("Show diagnostics", value=False, help="Trace agent timings for this run")
     run_clicked = st.sidebar.button(" Run Innovation Search", use_container_width=True)
 
-    if not run_clicked:
+    queue = get_job_queue()
+    if run_clicked:
+        if not molecule.strip():
+            st.error("Please enter a molecule name.")
+            return
+        query = {"molecule": molecule, "indication": indication, "geography": geography}
+        job_id = queue.submit(query, trace=show_diagnostics)
+        # Kept in the session for reruns and in the URL for reloads
+        st.session_state["job_id"] = job_id
+        st.query_params["job"] = job_id
+    else:
+        job_id = st.session_state.get("job_id") or st.query_params.get("job")
+
+    job = queue.get(job_id) if job_id else None
+    if job is None:
         st.info("Enter molecule, indication & geography in the left panel, then click **Run Innovation Search**.")
         return
 
-    if not molecule.strip():
-        st.error("Please enter a molecule name.")
-        return
-
-    master = build_master_agent()
-
-    with st.spinner("Running Master + Worker Agents..."):
-        result = master.run(molecule.strip(), indication.strip(), geography.strip())
-
-    st.success("Analysis complete ")
-
-    # --------- KPI STRIP ---------
-    cols_kpi = st.columns(4)
-
-    market = result["market_overview"]
-    trials = result["clinical_trials_landscape"]
-    patents = result["patent_landscape"]
-    exim = result["exim_overview"]
-
-    with cols_kpi[0]:
-        ms = market.get("market_size_usd_mn")
-        cagr = market.get("cagr_3yr_pct")
-        st.markdown(
-            f"""
-            <div class="card">
-                <div class="kpi-label">Market Size</div>
-                <div class="kpi-value">{ms if ms is not None else "NA"} {"" if ms is None else "M USD"}</div>
-                <div class="kpi-sub">CAGR: {cagr if cagr is not None else "NA"}%</div>
-            </div>
-            """,
-            unsafe_allow_html=True,
-        )
-
-    with cols_kpi[1]:
-        st.markdown(
-            f"""
-            <div class="card">
-                <div class="kpi-label">Clinical Activity</div>
-                <div class="kpi-value">{trials.get("total_trials", 0)}</div>
-                <div class="kpi-sub">Active trials: {trials.get("active_trials", 0)}</div>
-            </div>
-            """,
-            unsafe_allow_html=True,
-        )
-
-    with cols_kpi[2]:
-        st.markdown(
-            f"""
-            <div class="card">
-                <div class="kpi-label">FTO Risk</div>
-                <div class="kpi-value">{patents.get("fto_risk", "Unknown")}</div>
-                <div class="kpi-sub">Core expiry: {patents.get("core_patent_expiry", "NA")}</div>
-            </div>
-            """,
-            unsafe_allow_html=True,
-        )
-
-    with cols_kpi[3]:
-        st.markdown(
-            f"""
-            <div class="card">
-                <div class="kpi-label">API Sourcing</div>
-                <div class="kpi-value">{exim.get("api_import_dependency", "NA")}</div>
-                <div class="kpi-sub">Avg import price: {exim.get("avg_import_price_per_kg_usd", "NA")} USD/kg</div>
-            </div>
-            """,
-            unsafe_allow_html=True,
-        )
-
-    st.markdown("")
-
-    # --------- Tabs ---------
-    overview_tab, market_tab, clinical_tab, insights_tab, report_tab = st.tabs(
-        [" Overview", " Market & Trade", " Clinical & Patents", " Insights & Web", " Report"]
-    )
-
-    # ============ OVERVIEW TAB ============
-    with overview_tab:
-        st.markdown(
-            f"""
-            <div class="card">
-              <div class="card-label">Search context</div>
-              <h3 style="margin-top:0.3rem;">{result["molecule"]} – {result["primary_indication"]} ({result["target_geography"]})</h3>
-            </div>
-            """,
-            unsafe_allow_html=True,
-        )
-        st.markdown("")
-
-        col_o1, col_o2 = st.columns([1.3, 1])
-
-        with col_o1:
-            st.markdown(
-                f"""
-                <div class="card">
-                    <div class="card-label">Innovation hypothesis</div>
-                    <p style='margin-top:0.5rem; font-size:0.95rem;'>{result['innovation_hypothesis']}</p>
-                </div>
-                """,
-                unsafe_allow_html=True,
-            )
-
-        with col_o2:
-            unmet = result.get("unmet_needs", [])
-            if unmet:
-                unmet_content = (
-                    "<ul style='padding-left:1.1rem; margin-top:0.4rem;'>"
-                    + "".join([f"<li>{u}</li>" for u in unmet])
-                    + "</ul>"
-                )
-            else:
-                unmet_content = "<p style='margin-top:0.5rem; color:#a0a8c8;'>No specific unmet needs inferred from mock data.</p>"
-
-            st.markdown(
-                f"""
-                <div class="card">
-                    <div class="card-label">Unmet needs</div>
-                    {unmet_content}
-                    <p style='margin-top:0.8rem; font-size:0.85rem; color:#9da7ce;'><b>Clinical rationale:</b> {result['clinical_rationale']}</p>
-                </div>
-                """,
-                unsafe_allow_html=True,
-            )
-
-    # ============ MARKET & TRADE TAB ============
-    with market_tab:
-        col_m1, col_m2 = st.columns([1.3, 1])
-
-        with col_m1:
-            st.markdown('<div class="card">', unsafe_allow_html=True)
-            m = result["market_overview"]
-            st.markdown(
-                f"""
-                <h3>IQVIA-like Market Overview</h3>
-                <p><b>Market size (USD Mn):</b> {m.get('market_size_usd_mn')}</p>
-                <p><b>CAGR (3-yr %):</b> {m.get('cagr_3yr_pct')}</p>
-                <p><b>Top year:</b> {m.get('top_year')}</p>
-                <p style='font-size:0.8rem; color:#838cb0;'>{m.get("comments", "")}</p>
-                """,
-                unsafe_allow_html=True
-            )
-            if m.get("raw_rows"):
-                df_sales = pd.DataFrame(m["raw_rows"])
-                st.markdown("**Raw view:**")
-                st.dataframe(df_sales, use_container_width=True)
-                if "year" in df_sales.columns and "sales_usd_mn" in df_sales.columns:
-                    df_sales_sorted = df_sales.sort_values("year")
-                    st.markdown("**Sales trend (USD Mn by year):**")
-                    st.line_chart(df_sales_sorted.set_index("year")["sales_usd_mn"])
-
-
-        with col_m2:
-            st.markdown('<div class="card">', unsafe_allow_html=True)
-            e = result["exim_overview"]
-            st.markdown(
-                f"""
-                <h3>EXIM-like Trade Overview</h3>
-                <p><b>API import dependency:</b> {e.get('api_import_dependency')}</p>
-                <p><b>Avg import price (USD/kg):</b> {e.get('avg_import_price_per_kg_usd')}</p>
-                <p style='font-size:0.8rem; color:#838cb0;'>{e.get("comments", "")}</p>
-                """,
-                unsafe_allow_html=True
-            )
-            if e.get("raw_rows"):
-                st.markdown("**Trade rows:**")
-                st.dataframe(pd.DataFrame(e["raw_rows"]), use_container_width=True)
-            st.markdown("</div>", unsafe_allow_html=True)
-
-    # ============ CLINICAL & PATENTS TAB ============
-    with clinical_tab:
-        col_c1, col_c2 = st.columns([1.3, 1])
-
-        with col_c1:
-            st.markdown('<div class="card">', unsafe_allow_html=True)
-            c = result["clinical_trials_landscape"]
-            st.markdown(
-                f"""
-                <h3>Clinical Trials Landscape</h3>
-                <p><b>Total trials:</b> {c.get('total_trials')}</p>
-                <p><b>Active trials:</b> {c.get('active_trials')}</p>
-                <p><b>Phase distribution:</b> {c.get('phase_distribution')}</p>
-                <p style='font-size:0.8rem; color:#838cb0;'>{c.get("comments", "")}</p>
-                """,
-                unsafe_allow_html=True
-            )
-            if c.get("notable_trials"):
-                st.markdown("**Notable trials:**")
-                st.dataframe(pd.DataFrame(c["notable_trials"]), use_container_width=True)
-
-            phase_dist = c.get("phase_distribution", {})
-            if phase_dist:
-                df_phase = pd.DataFrame(
-                    list(phase_dist.items()), columns=["Phase", "Trials"]
-                ).set_index("Phase")
-                st.markdown("**Trials by Phase:**")
-                st.bar_chart(df_phase)
-            st.markdown("</div>", unsafe_allow_html=True)
-
-        with col_c2:
-            st.markdown('<div class="card">', unsafe_allow_html=True)
-            p = result["patent_landscape"]
-            st.markdown(
-                f"""
-                <h3>Patent Landscape</h3>
-                <p><b>Core patent expiry:</b> {p.get('core_patent_expiry')}</p>
-                <p><b>FTO risk:</b> {p.get('fto_risk')}</p>
-                <p style='font-size:0.8rem; color:#838cb0;'>{p.get("comments", "")}</p>
-                """,
-                unsafe_allow_html=True
-            )
-            if p.get("patents"):
-                st.markdown("**Patent list:**")
-                st.dataframe(pd.DataFrame(p["patents"]), use_container_width=True)
-            st.markdown("</div>", unsafe_allow_html=True)
-
-    # ============ INSIGHTS & WEB TAB ============
-    with insights_tab:
-        col_i1, col_i2 = st.columns([1.3, 1])
-
-        with col_i1:
-            st.markdown('<div class="card">', unsafe_allow_html=True)
-            i = result["internal_insights"]
-            st.markdown(
-                f"""
-                <h3>Internal Insights</h3>
-                <p><b>Strategic priority match:</b> {i.get('strategic_priorities_match')}</p>
-                <p style='font-size:0.8rem; color:#838cb0;'>{i.get("comments", "")}</p>
-                """,
-                unsafe_allow_html=True
-            )
-            if i.get("field_feedback"):
-                st.markdown("**Field feedback:**")
-                for fb in i["field_feedback"]:
-                    st.markdown(f"- {fb}")
-            if i.get("raw_rows"):
-                st.markdown("**Raw internal docs:**")
-                st.dataframe(pd.DataFrame(i["raw_rows"]), use_container_width=True)
-            st.markdown("</div>", unsafe_allow_html=True)
-
-        with col_i2:
-            st.markdown('<div class="card">', unsafe_allow_html=True)
-            w = result["web_insights"]
-            guideline_extracts_html = "".join([f"<li>{g}</li>" for g in w.get("guideline_extracts", [])])
-            patient_forum_highlights_html = "".join([f"<li>{p}</li>" for p in w.get("patient_forum_highlights", [])])
-            st.markdown(
-                f"""
-                <h3>Web Intelligence</h3>
-                <p><b>Guideline extracts:</b></p>
-                <ul>{guideline_extracts_html}</ul>
-                <p><b>Patient forum highlights:</b></p>
-                <ul>{patient_forum_highlights_html}</ul>
-                """,
-                unsafe_allow_html=True
-            )
-
-            st.write("**Recent news / journals:**")
-            for rn in w.get("recent_news", []):
-                st.markdown(f"- {rn}")
-
-            if w.get("raw_rows"):
-                st.markdown("**Raw web snippets:**")
-                st.dataframe(pd.DataFrame(w["raw_rows"]), use_container_width=True)
-            st.markdown("</div>", unsafe_allow_html=True)
-
-    # ============ REPORT TAB ============
-    with report_tab:
-        payload = {
-            "molecule": result["molecule"],
-            "primary_indication": result["primary_indication"],
-            "target_geography": result["target_geography"],
-            "unmet_needs": result.get("unmet_needs", []),
-            "clinical_rationale": result.get("clinical_rationale", ""),
-            "market_overview": result.get("market_overview", {}),
-            "exim_overview": result.get("exim_overview", {}),
-            "patent_landscape": result.get("patent_landscape", {}),
-            "clinical_trials_landscape": result.get("clinical_trials_landscape", {}),
-            "internal_insights": result.get("internal_insights", {}),
-            "web_insights": result.get("web_insights", {}),
-            "innovation_hypothesis": result.get("innovation_hypothesis", ""),
-        }
-
-        report_agent = ReportGeneratorAgent()
-        report_text = report_agent.generate_text_report(payload)
-        pdf_bytes = report_agent.generate_pdf_report(payload)
-
-        st.markdown(
-            f"""
-            <div class="card">
-                <h3>Downloadable Report</h3>
-                <p><b>Text preview:</b></p>
-                <pre>{report_text[:1500] + ("\n...\n" if len(report_text) > 1500 else "")}</pre>
-            </div>
-            """,
-            unsafe_allow_html=True
-        )
-
-        col_txt, col_pdf = st.columns(2)
-        with col_txt:
-            st.download_button(
-                label="Download full report (.txt)",
-                data=report_text.encode("utf-8"),
-                file_name=f"{result['molecule']}_{result['primary_indication']}_innovation_report.txt",
-                mime="text/plain",
-                use_container_width=True,
-            )
-        with col_pdf:
-            st.download_button(
-                label="Download full report (.pdf)",
-                data=pdf_bytes,
-                file_name=f"{result['molecule']}_{result['primary_indication']}_innovation_report.pdf",
-                mime="application/pdf",
-                use_container_width=True,
-            )
+    entry = session_result(job)
+    if entry is None:
+        # First sight of this job in the session: show its parts as they arrive, then
+        # swap in the interactive view below once it is finished
+        live = st.empty()
+        with live.container():
+            result, diagnostics = follow_job(queue, job)
+        live.empty()
+        job = queue.get(job.id)
+        if job.status == "failed":
+            st.error(f"Analysis failed: {job.error}")
+            return
+        entry = remember_result(job, result, diagnostics)
+
+    render_result(entry)
 
 
 if __name__ == "__main__":
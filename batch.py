@@ -0,0 +1,155 @@
+# batch.py
+
+"""
+Command-line batch mode: evaluate a portfolio of (molecule, indication, geography)
+queries and stream the results out as JSONL.
+
+    python batch.py portfolio.csv -o results.jsonl --workers 8
+    python batch.py portfolio.jsonl -o results.jsonl --resume
+
+CSV input needs a header with molecule, indication and (optionally) geography columns;
+JSONL input has one object with the same keys per line. Rows that are not a valid
+query are reported on stderr and skipped. With --resume, queries that already have a
+complete result line in the output file are skipped and new lines are appended; a
+query whose result had failed or stale sections is run again, and its new line
+supersedes the earlier one.
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+from typing import Any, Dict, Iterator, List, Optional, Set
+
+from agents.tables import to_jsonable
+from cache import build_result_cache
+from graph import AGENT_CALLS, build_master_agent, is_degraded, normalize_query, query_key
+
+
+def parse_query(record: Any) -> Dict[str, str]:
+    """A normalized query from one input row; ValueError says what is wrong with it."""
+    if not isinstance(record, dict):
+        raise ValueError("expected an object with molecule, indication and geography")
+    if None in record:
+        raise ValueError("more fields than the header")
+    bad = [k for k in ("molecule", "indication") if not isinstance(record.get(k), str)]
+    if record.get("geography") is not None and not isinstance(record["geography"], str):
+        bad.append("geography")
+    if bad:
+        raise ValueError(f"missing or non-text {', '.join(bad)}")
+    query = normalize_query(record)
+    if not query["molecule"]:
+        raise ValueError("empty molecule")
+    return query
+
+
+def read_queries(path: str, rejected: Optional[List[str]] = None) -> Iterator[Dict[str, str]]:
+    """
+    Queries of a CSV or JSONL file. Invalid rows are appended to rejected as
+    "path:line: reason" (without a list, the first one raises ValueError).
+    """
+
+    def rows() -> Iterator[Any]:
+        with open(path, newline="", encoding="utf-8") as f:
+            if path.lower().endswith((".jsonl", ".ndjson")):
+                for number, line in enumerate(f, start=1):
+                    if line.strip():
+                        try:
+                            yield number, json.loads(line)
+                        except json.JSONDecodeError as exc:
+                            yield number, ValueError(f"invalid JSON ({exc.msg})")
+            else:
+                reader = csv.DictReader(f)
+                for row in reader:
+                    yield reader.line_num, row
+
+    for number, record in rows():
+        try:
+            if isinstance(record, ValueError):
+                raise record
+            yield parse_query(record)
+        except ValueError as exc:
+            message = f"{path}:{number}: {exc}"
+            if rejected is None:
+                raise ValueError(message) from None
+            rejected.append(message)
+
+
+def is_complete(result: Dict[str, Any]) -> bool:
+    """Whether a recorded result has every agent section, none failed or stale."""
+    return all(isinstance(result.get(key), dict) and not is_degraded(result[key]) for key, _, _ in AGENT_CALLS)
+
+
+def completed_query_keys(output_path: str) -> Set[str]:
+    """Keys of queries that already have a complete result in an earlier output file."""
+    done: Set[str] = set()
+    if not os.path.exists(output_path):
+        return done
+    with open(output_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # A line cut short by the interruption; the query is simply re-run.
+                continue
+            if "result" in record and is_complete(record["result"]):
+                done.add(query_key(record["query"]))
+    return done
+
+
+def drop_partial_line(output_path: str) -> None:
+    """Cut off a trailing line left incomplete by an interrupted run."""
+    if not os.path.exists(output_path):
+        return
+    with open(output_path, "rb+") as f:
+        data = f.read()
+        if data and not data.endswith(b"\n"):
+            f.truncate(data.rfind(b"\n") + 1)
+
+
+def run(input_path: str, output_path: Optional[str], workers: int = 8, resume: bool = False) -> int:
+    rejected: List[str] = []
+    queries = list(read_queries(input_path, rejected))
+    for message in rejected:
+        print(f"skipped {message}", file=sys.stderr)
+    if resume and output_path:
+        drop_partial_line(output_path)
+        done = completed_query_keys(output_path)
+        queries = [q for q in queries if query_key(q) not in done]
+
+    # Duplicate queries in the input are evaluated once.
+    unique: Dict[str, Dict[str, str]] = {}
+    for q in queries:
+        unique.setdefault(query_key(q), q)
+
+    master = build_master_agent(cache=build_result_cache())
+    out = open(output_path, "a" if resume else "w", encoding="utf-8") if output_path else sys.stdout
+    failures = 0
+    try:
+        for record in master.run_batch(unique.values(), max_workers=workers):
+            failures += "error" in record
+            out.write(json.dumps(to_jsonable(record), ensure_ascii=False, default=str) + "\n")
+            out.flush()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    return failures + len(rejected)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Run innovation searches for a portfolio of molecules.")
+    parser.add_argument("input", help="CSV or JSONL file of queries")
+    parser.add_argument("-o", "--output", help="JSONL output file (default: stdout)")
+    parser.add_argument("-w", "--workers", type=int, default=8, help="parallel queries (default: 8)")
+    parser.add_argument("--resume", action="store_true", help="skip queries already present in the output file")
+    args = parser.parse_args(argv)
+
+    if args.resume and not args.output:
+        parser.error("--resume requires --output")
+    failures = run(args.input, args.output, workers=args.workers, resume=args.resume)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
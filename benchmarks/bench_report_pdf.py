@@ -0,0 +1,59 @@
+"""
+Compare the vector PDF writer against the legacy Pillow raster path.
+
+    python -m benchmarks.bench_report_pdf
+
+Reports file size, render time (best of N) and page count for the demo payload and
+for a large payload with hundreds of trial / patent rows. The raster path only ever
+produces one page, so on the large payload it silently drops most of the content.
+"""
+
+import time
+from typing import Any, Callable, Dict
+
+from agents.worker_agents import ReportGeneratorAgent
+from graph import build_master_agent
+
+
+def large_payload(n_rows: int = 400) -> Dict[str, Any]:
+    payload = build_master_agent().run("pregabalin", "neuropathic pain", "US")
+    payload["clinical_trials_landscape"]["notable_trials"] = [
+        {"id": f"NCT{i:08d}", "phase": f"Phase {'I' * (1 + i % 3)}", "status": "Active" if i % 2 else "Completed"}
+        for i in range(n_rows)
+    ]
+    payload["patent_landscape"]["patents"] = [
+        {"assignee": f"Assignee {i % 37}", "title": f"Extended-release formulation variant {i} of pregabalin", "year": 2000 + i % 25}
+        for i in range(n_rows)
+    ]
+    payload["internal_insights"]["field_feedback"] = [
+        f"Field note {i}: adherence in elderly patients remains challenging with twice-daily dosing."
+        for i in range(n_rows // 4)
+    ]
+    return payload
+
+
+def best_of(fn: Callable[[], bytes], repeat: int) -> "tuple[float, bytes]":
+    best, out = float("inf"), b""
+    for _ in range(repeat):
+        started = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - started)
+    return best, out
+
+
+def main(repeat: int = 5) -> None:
+    agent = ReportGeneratorAgent()
+    payloads = {
+        "demo": build_master_agent().run("pregabalin", "neuropathic pain", "US"),
+        "large": large_payload(),
+    }
+    print(f"{'payload':<8} {'renderer':<8} {'size (KB)':>10} {'time (ms)':>10} {'pages':>6}")
+    for name, payload in payloads.items():
+        for renderer, fn in (("raster", agent.generate_raster_pdf_report), ("vector", agent.generate_pdf_report)):
+            seconds, pdf = best_of(lambda: fn(payload), repeat)
+            pages = pdf.count(b"/Type /Page") - pdf.count(b"/Type /Pages")
+            print(f"{name:<8} {renderer:<8} {len(pdf) / 1024:>10.1f} {seconds * 1000:>10.1f} {pages:>6}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Micro-benchmark: legacy Pillow wrap_line vs the cached TextWrapper.
+
+    python -m benchmarks.bench_text_wrap
+
+The legacy routine re-measures the whole growing candidate line with draw.textbbox
+for every word (quadratic in line length); TextWrapper measures each distinct word
+once and accumulates line widths. TextWrapper uses advance widths where the legacy
+code used ink bounding boxes, so a line whose ink overhangs by a pixel can break one
+word later; the "differs" column counts such lines.
+"""
+
+import random
+import time
+from typing import Callable, List
+
+from PIL import Image, ImageDraw, ImageFont
+
+from agents.text_wrap import TextWrapper
+
+
+def legacy_wrap_line(draw: ImageDraw.ImageDraw, font, s: str, max_width: int) -> List[str]:
+    # Verbatim copy of the wrap_line closure previously in generate_pdf_report
+    words = s.split(" ")
+    lines: List[str] = []
+    current = ""
+    for w in words:
+        test = w if not current else current + " " + w
+        bbox = draw.textbbox((0, 0), test, font=font)
+        if bbox[2] - bbox[0] <= max_width:
+            current = test
+        else:
+            if current:
+                lines.append(current)
+            current = w
+    if current:
+        lines.append(current)
+    return lines
+
+
+def sample_lines(n: int, words_per_line: int, seed: int = 7) -> List[str]:
+    vocab = (
+        "adherence elderly patients dosing regimen sedation dizziness neuropathic pain diabetic "
+        "formulation extended-release once-daily trial phase active completed guideline forum "
+        "NCT04211234 pregabalin duloxetine gabapentin titration renal impairment outcomes"
+    ).split()
+    rng = random.Random(seed)
+    return [" ".join(rng.choice(vocab) for _ in range(words_per_line)) for _ in range(n)]
+
+
+def timed(fn: Callable[[], List[List[str]]]) -> "tuple[float, List[List[str]]]":
+    started = time.perf_counter()
+    out = fn()
+    return time.perf_counter() - started, out
+
+
+def main() -> None:
+    font = ImageFont.load_default()
+    draw = ImageDraw.Draw(Image.new("RGB", (1, 1)))
+    max_width = 1160
+
+    print(
+        f"{'words/line':>10} {'lines':>6} {'legacy (ms)':>12} {'cold (ms)':>10} "
+        f"{'warm (ms)':>10} {'speedup':>8} {'differs':>8}"
+    )
+    for words_per_line in (10, 40, 120):
+        lines = sample_lines(100, words_per_line)
+        legacy, legacy_out = timed(lambda: [legacy_wrap_line(draw, font, s, max_width) for s in lines])
+        wrapper = TextWrapper(font.getlength)
+        cold, _ = timed(lambda: [wrapper.wrap(s, max_width) for s in lines])
+        warm, new_out = timed(lambda: [wrapper.wrap(s, max_width) for s in lines])
+
+        differs = sum(a != b for a, b in zip(legacy_out, new_out))
+        print(
+            f"{words_per_line:>10} {len(lines):>6} {legacy * 1000:>12.1f} {cold * 1000:>10.1f} "
+            f"{warm * 1000:>10.2f} {legacy / cold:>7.0f}x {differs:>8}"
+        )
+
+
+if __name__ == "__main__":
+    main()
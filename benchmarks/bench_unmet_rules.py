@@ -0,0 +1,124 @@
+"""
+Benchmark the compiled unmet-needs rule engine against the legacy keyword loops.
+
+    python -m benchmarks.bench_unmet_rules
+
+Runs over 100k synthetic field-feedback snippets, once with the shipped rule table
+and once with a 300-rule table, checking that both approaches derive the same needs.
+Modes:
+
+- derive: the end-to-end synthesis. The compiled set stops reading a source once all
+  of its rules have fired, so with the shipped table this mostly measures that early
+  exit, not matching.
+- derive-all: the same synthesis matching every snippet (no early exit).
+- scan: every snippet matched against every rule.
+
+The shipped table is below rules.SMALL_TABLE_KEYWORDS, so in production it uses
+substring checks ("substring"); it is also run with the single-pass trie forced
+("trie") for comparison. The 300-rule table uses the trie.
+"""
+
+import random
+import time
+from typing import Dict, List, Sequence
+
+from rules import UNMET_NEED_RULES, CompiledRuleSet, UnmetNeedRule
+
+VOCAB = (
+    "patients report elderly adherence dizziness sedation sleepy diabetic neuropathy dosing regimen "
+    "twice daily titration renal clinic visit formulation switch pain relief follow up nurse pharmacy "
+    "refill cost coverage caregiver morning evening tablets capsule"
+).split()
+
+
+def snippets(n: int, seed: int = 11) -> List[str]:
+    rng = random.Random(seed)
+    return [" ".join(rng.choice(VOCAB) for _ in range(rng.randint(8, 24))).capitalize() + "." for _ in range(n)]
+
+
+def legacy_scan(rules: Sequence[UnmetNeedRule], texts: List[str]) -> List[List[str]]:
+    scoped = [r for r in rules if "field_feedback" in r.sources]
+    return [[r.need for r in scoped if any(kw in t.lower() for kw in r.keywords)] for t in texts]
+
+
+def legacy_derive(rules: Sequence[UnmetNeedRule], texts_by_source: Dict[str, List[str]]) -> List[str]:
+    # The nested loop previously hard-coded in MasterAgent.run, generalised to a rule list
+    needs: List[str] = []
+    sources = list(dict.fromkeys(s for r in rules for s in r.sources))
+    for source in sources:
+        scoped = [r for r in rules if source in r.sources]
+        for text in texts_by_source.get(source, []):
+            tl = text.lower()
+            for rule in scoped:
+                if any(kw in tl for kw in rule.keywords):
+                    needs.append(rule.need)
+    return list(dict.fromkeys(needs))
+
+
+def derive_all(compiled: CompiledRuleSet, texts_by_source: Dict[str, List[str]]) -> List[str]:
+    # CompiledRuleSet.derive without its early exit
+    return list(
+        dict.fromkeys(
+            compiled.rules[i].need
+            for source in compiled.sources
+            for text in texts_by_source.get(source, [])
+            for i in compiled._matchers[source].match(text)
+        )
+    )
+
+
+def synthetic_rules(n: int, seed: int = 3) -> List[UnmetNeedRule]:
+    rng = random.Random(seed)
+    rules = list(UNMET_NEED_RULES)
+    for i in range(n - len(rules)):
+        kw = rng.choice(VOCAB)[: rng.randint(4, 7)] + rng.choice(["", "", "ing", "s", "al"])
+        rules.append(UnmetNeedRule(f"Need {i} ({kw})", ("field_feedback",), keywords=(kw,)))
+    return rules
+
+
+def best_of(fn, repeat: int = 3) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main() -> None:
+    texts = {"field_feedback": snippets(100_000), "patient_forum_highlights": snippets(1_000, seed=5)}
+    feedback = texts["field_feedback"]
+    n = sum(len(v) for v in texts.values())
+    print(
+        f"{'rules':>6} {'matcher':>9} {'mode':>10} {'snippets':>9} {'legacy (ms)':>12} {'compiled (ms)':>14}"
+        f" {'speedup':>9} {'same':>5}"
+    )
+    large = synthetic_rules(300)
+    for rules, matcher, compiled in (
+        (UNMET_NEED_RULES, "substring", CompiledRuleSet(UNMET_NEED_RULES)),
+        (UNMET_NEED_RULES, "trie", CompiledRuleSet(UNMET_NEED_RULES, small_table_keywords=0)),
+        (large, "trie", CompiledRuleSet(large)),
+    ):
+        modes = (
+            ("derive", n, lambda: legacy_derive(rules, texts), lambda: compiled.derive(texts), 3),
+            ("derive-all", n, lambda: legacy_derive(rules, texts), lambda: derive_all(compiled, texts), 1),
+            (
+                "scan",
+                len(feedback),
+                lambda: legacy_scan(rules, feedback),
+                lambda: [compiled.match("field_feedback", t) for t in feedback],
+                1,
+            ),
+        )
+        for mode, count, legacy_fn, compiled_fn, repeat in modes:
+            same = legacy_fn() == compiled_fn()
+            legacy = best_of(legacy_fn, repeat=repeat)
+            fast = best_of(compiled_fn, repeat=repeat)
+            print(
+                f"{len(rules):>6} {matcher:>9} {mode:>10} {count:>9} {legacy * 1000:>12.1f} {fast * 1000:>14.1f} "
+                f"{legacy / fast:>8.1f}x {str(same):>5}"
+            )
+
+
+if __name__ == "__main__":
+    main()
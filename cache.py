@@ -0,0 +1,231 @@
+# cache.py
+
+"""
+Result cache for MasterAgent sections.
+
+Each worker agent section is cached separately, keyed by the normalized query, so
+every section can expire on its own schedule (market data goes stale faster than a
+patent landscape). Backends are pluggable: an in-memory LRU for a single process and
+an SQLite file that survives restarts.
+"""
+
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+
+HOUR = 60 * 60
+DAY = 24 * HOUR
+
+# Default freshness per result section, in seconds.
+DEFAULT_SECTION_TTLS: Dict[str, float] = {
+    "market_overview": 6 * HOUR,
+    "exim_overview": DAY,
+    "patent_landscape": 7 * DAY,
+    "clinical_trials_landscape": DAY,
+    "internal_insights": HOUR,
+    "web_insights": HOUR,
+}
+
+
+def normalize_key_part(value: Any) -> str:
+    """Case-fold and collapse whitespace so 'Pregabalin ' and 'pregabalin' share a key."""
+    return " ".join(str(value).split()).lower()
+
+
+def make_key(namespace: str, parts: Iterable[Any]) -> str:
+    return "|".join([namespace] + [normalize_key_part(p) for p in parts])
+
+
+class MemoryCacheBackend:
+    """In-process LRU store of (value, stored_at) pairs."""
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[Any, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Tuple[Any, float]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key: str, value: Any, stored_at: float) -> None:
+        with self._lock:
+            self._entries[key] = (value, stored_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class DiskCacheBackend:
+    """
+    SQLite-backed store that survives restarts and can be shared by several processes
+    (WAL, with a busy timeout). Values are pickled; the least recently read entries are
+    evicted once the table grows past max_entries. Reads do not write: their access
+    times are kept in memory and written with the next set().
+    """
+
+    def __init__(self, path: str, max_entries: int = 10_000):
+        self.path = path
+        self.max_entries = max_entries
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._touched: Dict[str, float] = {}
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode = WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " key TEXT PRIMARY KEY, value BLOB NOT NULL,"
+            " stored_at REAL NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access)")
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[Tuple[Any, float]]:
+        with self._lock:
+            row = self._conn.execute("SELECT value, stored_at FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self._touched[key] = time.time()
+        return pickle.loads(row[0]), row[1]
+
+    def _flush_touched(self) -> None:
+        if self._touched:
+            self._conn.executemany(
+                "UPDATE entries SET last_access = ? WHERE key = ?", [(t, k) for k, t in self._touched.items()]
+            )
+            self._touched.clear()
+
+    def set(self, key: str, value: Any, stored_at: float) -> None:
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._flush_touched()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, stored_at, last_access) VALUES (?, ?, ?, ?)",
+                (key, blob, stored_at, time.time()),
+            )
+            self._conn.execute(
+                "DELETE FROM entries WHERE key IN ("
+                " SELECT key FROM entries ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            self._conn.commit()
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM entries")
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._flush_touched()
+            self._conn.commit()
+            self._conn.close()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+
+class ResultCache:
+    """
+    Section-level cache around MasterAgent.run with per-section TTLs and hit/miss counters.
+    Expired entries are kept (until replaced or evicted) as a stale fallback for when
+    an agent is failing, see get_stale().
+    """
+
+    def __init__(
+        self,
+        backend: Optional[Any] = None,
+        ttls: Optional[Dict[str, float]] = None,
+        default_ttl_s: float = HOUR,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.backend = backend if backend is not None else MemoryCacheBackend()
+        self.ttls = dict(DEFAULT_SECTION_TTLS)
+        self.ttls.update(ttls or {})
+        self.default_ttl_s = default_ttl_s
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._hits: Dict[str, int] = {}
+        self._misses: Dict[str, int] = {}
+
+    def ttl_for(self, section: str) -> float:
+        return self.ttls.get(section, self.default_ttl_s)
+
+    def _count(self, counter: Dict[str, int], section: str) -> None:
+        with self._lock:
+            counter[section] = counter.get(section, 0) + 1
+
+    def get(self, section: str, key_parts: Iterable[Any]) -> Optional[Any]:
+        key = make_key(section, key_parts)
+        entry = self.backend.get(key)
+        if entry is not None:
+            value, stored_at = entry
+            if self.clock() - stored_at <= self.ttl_for(section):
+                self._count(self._hits, section)
+                return value
+        self._count(self._misses, section)
+        return None
+
+    def get_stale(self, section: str, key_parts: Iterable[Any]) -> Optional[Tuple[Any, float]]:
+        """The last stored value whatever its age, with that age in seconds."""
+        entry = self.backend.get(make_key(section, key_parts))
+        if entry is None:
+            return None
+        value, stored_at = entry
+        return value, self.clock() - stored_at
+
+    def set(self, section: str, key_parts: Iterable[Any], value: Any) -> None:
+        self.backend.set(make_key(section, key_parts), value, self.clock())
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            hits, misses = dict(self._hits), dict(self._misses)
+        sections = sorted(set(hits) | set(misses))
+        return {
+            "hits": sum(hits.values()),
+            "misses": sum(misses.values()),
+            "entries": len(self.backend),
+            "by_section": {s: {"hits": hits.get(s, 0), "misses": misses.get(s, 0)} for s in sections},
+        }
+
+    def clear(self) -> None:
+        self.backend.clear()
+        with self._lock:
+            self._hits.clear()
+            self._misses.clear()
+
+
+def build_result_cache() -> ResultCache:
+    """
+    Disk-backed cache when RESULT_CACHE_DIR is set, otherwise an in-memory one.
+    """
+    cache_dir = os.environ.get("RESULT_CACHE_DIR")
+    if cache_dir:
+        return ResultCache(DiskCacheBackend(os.path.join(cache_dir, "results.sqlite")))
+    return ResultCache(MemoryCacheBackend())
@@ -1,8 +1,27 @@
 # graph.py
 
-from dataclasses import dataclass
-from typing import Dict, Any, List
+import asyncio
+import hashlib
+import inspect
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, as_completed, wait
+from dataclasses import dataclass, field
+from functools import partial
+from typing import Dict, Any, Awaitable, Callable, Iterable, Iterator, List, Optional, Set, Tuple, TypeVar
 
+from agent_pool import AgentPool, get_default_pool
+from cache import MemoryCacheBackend, ResultCache, make_key
+from llm_client import chunk_text
+from resilience import SYNTHESIS_RESERVE, CircuitBreakers, ahedged, bounded_call, deadline_budgets
+from rules import DEFAULT_RULESET, CompiledRuleSet
+from singleflight import SingleFlight
+from stores.documents import build_document_index
+from stores.market import build_market_store
+from stores.patents import build_patent_store
+from stores.trials import build_trial_registry
+from stores.vectors import build_vector_index
+from tracing import NULL_TRACER, Tracer, payload_size
 from agents.worker_agents import (
     IQVIAInsightsAgent,
     EXIMTrendsAgent,
@@ -10,9 +29,325 @@ from agents.worker_agents import (
     ClinicalTrialsAgent,
     InternalKnowledgeAgent,
     WebIntelligenceAgent,
+    payload_fingerprint,
+    run_blocking,
 )
 
 
+# Worker agent calls made by the MasterAgent:
+# (result key, MasterAgent field, query arguments passed to the agent's run)
+AgentCall = Tuple[str, str, Tuple[str, ...]]
+AGENT_CALLS: List[AgentCall] = [
+    ("market_overview", "iqvia_agent", ("molecule", "indication", "geography")),
+    ("exim_overview", "exim_agent", ("molecule", "geography")),
+    ("patent_landscape", "patent_agent", ("molecule",)),
+    ("clinical_trials_landscape", "clinical_agent", ("molecule",)),
+    ("internal_insights", "internal_agent", ("molecule",)),
+    ("web_insights", "web_agent", ("molecule",)),
+]
+
+
+# Query graph sources and synthesis nodes (see MasterAgent.query_graph)
+QUERY_INPUTS = ("molecule", "indication", "geography")
+SYNTHESIS_NODE = "synthesis"  # unmet_needs + clinical_rationale
+HYPOTHESIS_NODE = "innovation_hypothesis"
+
+
+# iter_run(stream_tokens=True) key carrying the hypothesis as an iterator of text chunks
+HYPOTHESIS_STREAM_KEY = "innovation_hypothesis_stream"
+
+
+def failed_section(reason: str) -> Dict[str, Any]:
+    """Placeholder for a section whose agent failed or timed out."""
+    return {"error": reason, "comments": f"Section unavailable: {reason}"}
+
+
+def stale_section(section: Dict[str, Any], reason: str, age_s: float) -> Dict[str, Any]:
+    """An expired cached section served in place of a failing agent's, marked as such."""
+    return dict(section, stale=True, stale_age_s=round(age_s, 1), degraded_reason=reason)
+
+
+def is_degraded(section: Dict[str, Any]) -> bool:
+    return "error" in section or bool(section.get("stale"))
+
+
+CIRCUIT_OPEN = "circuit open after repeated failures"
+DEADLINE_PASSED = "query deadline passed before the call"
+
+
+T = TypeVar("T")
+
+
+async def call_agent_async(agent: Any, *args: Any) -> Dict[str, Any]:
+    """
+    Await an agent's ``arun`` when it has one; sync-only agents are adapted by
+    running their blocking ``run`` on a worker thread.
+    """
+    arun = getattr(agent, "arun", None)
+    if arun is not None and inspect.iscoroutinefunction(arun):
+        return await arun(*args)
+    return await run_blocking(agent.run, *args)
+
+
+def run_sync(awaitable: Awaitable[T]) -> T:
+    """
+    Drive a coroutine to completion from synchronous code (e.g. a Streamlit script run).
+    If the calling thread already runs an event loop, the coroutine gets its own loop
+    on a helper thread instead.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(awaitable)
+
+    outcome: Dict[str, Any] = {}
+
+    def _target() -> None:
+        try:
+            outcome["value"] = asyncio.run(awaitable)
+        except BaseException as exc:
+            outcome["error"] = exc
+
+    thread = threading.Thread(target=_target, name="master-agent-loop")
+    thread.start()
+    thread.join()
+    if "error" in outcome:
+        raise outcome["error"]
+    return outcome["value"]
+
+
+class SharedCalls:
+    """
+    Per-batch registry of agent calls: the first query needing a given
+    (section, agent arguments) computes it, later queries wait for and reuse its result.
+    """
+
+    def __init__(self):
+        self._futures: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self.computed = 0
+        self.shared = 0
+
+    def call(self, key: str, fn: Callable[[], T]) -> T:
+        with self._lock:
+            future = self._futures.get(key)
+            owner = future is None
+            if owner:
+                future = self._futures[key] = Future()
+                self.computed += 1
+            else:
+                self.shared += 1
+        if owner:
+            try:
+                future.set_result(fn())
+            except BaseException as exc:
+                future.set_exception(exc)
+        return future.result()
+
+
+@dataclass(frozen=True)
+class Node:
+    """One step of a QueryGraph: output = fn(*values of inputs)."""
+
+    name: str
+    inputs: Tuple[str, ...]
+    fn: Callable[..., Any]
+    # Reuse the output while the inputs' fingerprints are unchanged (pure steps only);
+    # salt separates configurations that share a memo (e.g. template vs LLM hypothesis).
+    memoize: bool = False
+    salt: str = ""
+    # Turns a failure or timeout (reason text) into an output instead of failing the run
+    fallback: Optional[Callable[[str], Any]] = None
+    # Wall-clock budget from the start of the run; only enforced with max_workers > 1
+    timeout_s: Optional[float] = None
+
+
+def fingerprint(value: Any) -> str:
+    return payload_fingerprint({"value": value})
+
+
+def llm_fingerprint(llm: Any) -> str:
+    """Identifies an LLM client by its configuration (type, model, temperature, endpoint)."""
+    pool = getattr(llm, "pool", None)
+    endpoint = None
+    if pool is not None:
+        endpoint = [getattr(pool, a, None) for a in ("https", "host", "port", "base_path")]
+    return fingerprint(
+        [type(llm).__name__, getattr(llm, "model", None), getattr(llm, "temperature", None), endpoint]
+    )
+
+
+class QueryGraph:
+    """
+    Dependency graph of named steps over a set of source values. iter_execute runs
+    every node once its inputs are known, independent nodes in parallel, yielding
+    (node, output) in completion order.
+
+    Incremental recomputation: each output is fingerprinted, and a memoized node whose
+    input fingerprints match an entry in `memo` reuses the stored output instead of
+    running. A changed source therefore re-executes only the memoized nodes
+    downstream of it, and only as far as outputs actually change.
+    """
+
+    def __init__(self, nodes: Iterable[Node], sources: Iterable[str]):
+        self.sources = tuple(sources)
+        self.nodes: Dict[str, Node] = {}
+        for node in nodes:
+            if node.name in self.nodes or node.name in self.sources:
+                raise ValueError(f"duplicate graph node {node.name!r}")
+            self.nodes[node.name] = node
+        for node in self.nodes.values():
+            unknown = [i for i in node.inputs if i not in self.nodes and i not in self.sources]
+            if unknown:
+                raise ValueError(f"node {node.name!r} has unknown inputs {unknown}")
+        self.order = self._topological_order()
+
+    def _topological_order(self) -> List[str]:
+        order: List[str] = []
+        pending = {name: {i for i in node.inputs if i in self.nodes} for name, node in self.nodes.items()}
+        while pending:
+            ready = [name for name, deps in pending.items() if not deps]
+            if not ready:
+                raise ValueError(f"cycle between graph nodes {sorted(pending)}")
+            for name in ready:
+                del pending[name]
+                order.append(name)
+            for deps in pending.values():
+                deps.difference_update(ready)
+        return order
+
+    def downstream(self, changed: Iterable[str]) -> List[str]:
+        """Nodes that (transitively) depend on any of the changed sources or nodes, in run order."""
+        dirty: Set[str] = set(changed)
+        affected = []
+        for name in self.order:
+            if dirty.intersection(self.nodes[name].inputs):
+                dirty.add(name)
+                affected.append(name)
+        return affected
+
+    def iter_execute(
+        self,
+        values: Dict[str, Any],
+        max_workers: int = 1,
+        memo: Optional[MemoryCacheBackend] = None,
+        trace: Any = NULL_TRACER,
+    ) -> Iterator[Tuple[str, Any]]:
+        """
+        Evaluate every node for the given source values. With max_workers > 1, ready
+        nodes run concurrently on a thread pool and node timeouts are enforced;
+        otherwise nodes run one by one on the calling thread, in topological order.
+        """
+        values = {name: values[name] for name in self.sources}
+        # Fingerprints are only needed for the inputs of memoized nodes
+        wanted = {i for node in self.nodes.values() if node.memoize for i in node.inputs}
+        fingerprints = {name: fingerprint(values[name]) for name in self.sources if name in wanted}
+
+        def memo_key(node: Node) -> Optional[str]:
+            if not node.memoize or memo is None:
+                return None
+            digest = hashlib.sha256("|".join([node.salt] + [fingerprints[i] for i in node.inputs]).encode("utf-8"))
+            return f"{node.name}|{digest.hexdigest()}"
+
+        def resolved(name: str, output: Any, key: Optional[str], fresh: bool) -> Tuple[str, Any]:
+            values[name] = output
+            if name in wanted:
+                fingerprints[name] = fingerprint(output)
+            if key is not None and fresh:
+                memo.set(key, output, time.time())
+            return name, output
+
+        def evaluate(node: Node) -> Any:
+            try:
+                return node.fn(*(values[i] for i in node.inputs))
+            except Exception as exc:
+                if node.fallback is None:
+                    raise
+                return node.fallback(f"{type(exc).__name__}: {exc}")
+
+        def lookup(node: Node) -> Tuple[Optional[str], Optional[Tuple[Any, float]]]:
+            key = memo_key(node)
+            hit = memo.get(key) if key is not None else None
+            trace.count(f"graph.{'reused' if hit is not None else 'executed'}.{node.name}")
+            return key, hit
+
+        if max_workers <= 1:
+            for name in self.order:
+                node = self.nodes[name]
+                key, hit = lookup(node)
+                if hit is not None:
+                    yield resolved(name, hit[0], key, fresh=False)
+                else:
+                    yield resolved(name, evaluate(node), key, fresh=True)
+            return
+
+        waiting = {name: {i for i in node.inputs if i in self.nodes} for name, node in self.nodes.items()}
+        executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="graph-node")
+        try:
+            started = time.monotonic()
+            running: Dict[Future, Tuple[str, Optional[str]]] = {}
+            finished: List[Tuple[str, Any, Optional[str], bool]] = []
+
+            while waiting or running or finished:
+                # Resolve finished nodes, then start (or reuse) everything they unblocked
+                for name, output, key, fresh in finished:
+                    yield resolved(name, output, key, fresh)
+                    for deps in waiting.values():
+                        deps.discard(name)
+                finished = []
+                for name in [n for n, deps in waiting.items() if not deps]:
+                    del waiting[name]
+                    node = self.nodes[name]
+                    key, hit = lookup(node)
+                    if hit is not None:
+                        finished.append((name, hit[0], key, False))
+                    else:
+                        running[executor.submit(evaluate, node)] = (name, key)
+                if finished or not running:
+                    if not finished and waiting:
+                        raise RuntimeError(f"graph stalled with {sorted(waiting)} waiting")
+                    continue
+
+                deadlines = [
+                    started + self.nodes[name].timeout_s
+                    for name, _ in running.values()
+                    if self.nodes[name].timeout_s is not None
+                ]
+                wait_s = max(0.0, min(deadlines) - time.monotonic()) if deadlines else None
+                done, _ = wait(running, timeout=wait_s, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name, key = running.pop(future)
+                    finished.append((name, future.result(), key, True))
+                now = time.monotonic()
+                for future, (name, key) in list(running.items()):
+                    node = self.nodes[name]
+                    if node.timeout_s is not None and now >= started + node.timeout_s:
+                        del running[future]
+                        future.cancel()
+                        reason = f"timed out after {node.timeout_s:g}s"
+                        if node.fallback is None:
+                            raise TimeoutError(f"graph node {name!r} {reason}")
+                        finished.append((name, node.fallback(reason), None, False))
+        finally:
+            # Do not wait for nodes that overran their timeout.
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+def normalize_query(query: Any) -> Dict[str, str]:
+    """Accept a dict or a (molecule, indication[, geography]) tuple."""
+    if isinstance(query, dict):
+        molecule, indication = query["molecule"], query.get("indication", "")
+        geography = query.get("geography") or "US"
+    else:
+        molecule, indication, *rest = query
+        geography = rest[0] if rest else "US"
+    return {"molecule": molecule.strip(), "indication": indication.strip(), "geography": geography.strip()}
+
+
+def query_key(query: Dict[str, str]) -> str:
+    return make_key("query", (query["molecule"], query["indication"], query["geography"]))
+
+
 @dataclass
 class MasterAgent:
     iqvia_agent: IQVIAInsightsAgent
@@ -21,71 +356,455 @@ class MasterAgent:
     clinical_agent: ClinicalTrialsAgent
     internal_agent: InternalKnowledgeAgent
     web_agent: WebIntelligenceAgent
+    # Execution mode: when True the worker agents are dispatched concurrently
+    # on a thread pool and a failing / slow agent only blanks its own section.
+    parallel: bool = False
+    # When True, run() gathers the agents' arun coroutines on one event loop.
+    use_async: bool = False
+    agent_timeout_s: Optional[float] = None
+    # Per-section overrides of agent_timeout_s, keyed by result key.
+    agent_timeouts: Dict[str, float] = field(default_factory=dict)
+    max_workers: int = len(AGENT_CALLS)
+    # Optional section cache; only agents whose sections are missing or expired run.
+    cache: Optional[ResultCache] = None
+    unmet_need_rules: CompiledRuleSet = DEFAULT_RULESET
+    # Optional LLM client (llm_client.py interface: invoke / stream). When set it writes
+    # the innovation hypothesis from hypothesis_prompt(); otherwise a template is used.
+    llm: Optional[Any] = None
+    # Optional tracing.Tracer: spans per agent call and synthesis step, cache counters.
+    tracer: Optional[Tracer] = None
+    # Outputs of memoized graph nodes (the synthesis steps) keyed by input fingerprints;
+    # share one across runs so a changed query input only recomputes what it affects.
+    node_memo: Optional[MemoryCacheBackend] = None
+    # Optional SingleFlight shared across sessions: identical concurrent run() calls and
+    # agent lookups share one in-flight computation. Share only between MasterAgents
+    # with the same agents and configuration.
+    flights: Optional[SingleFlight] = None
+    # Tail-latency controls (resilience.py). sla_s: end-to-end budget from which the
+    # agents' deadlines are derived (agent_timeouts still win); no agent call runs past
+    # the run's agent phase, so sequential runs keep to it too. hedge_after_s: start a
+    # backup attempt of an idempotent agent lookup after this long. breakers: per-agent
+    # circuit breakers, shared per process. A failed, overrun or short-circuited agent
+    # gives a degraded section: its last cached copy marked stale, else a failed section.
+    sla_s: Optional[float] = None
+    hedge_after_s: Optional[float] = None
+    breakers: Optional[CircuitBreakers] = None
+
+    @property
+    def _trace(self) -> Any:
+        return self.tracer if self.tracer is not None else NULL_TRACER
+
+    def _agent_args(self, arg_names: Tuple[str, ...], query: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(query[name] for name in arg_names)
+
+    def _agent_deadline(self) -> Optional[float]:
+        # Monotonic time by which a run started now must have all its sections
+        return None if self.sla_s is None else time.monotonic() + self.sla_s * (1.0 - SYNTHESIS_RESERVE)
+
+    def _timeout_for(self, key: str, deadline: Optional[float] = None) -> Optional[float]:
+        if key in self.agent_timeouts:
+            timeout = self.agent_timeouts[key]
+        elif self.sla_s is not None:
+            timeout = deadline_budgets(self.sla_s, [key])[key]
+        else:
+            timeout = self.agent_timeout_s
+        if deadline is None:
+            return timeout
+        # Sequential agents share the run's budget: never past its deadline
+        left = max(0.0, deadline - time.monotonic())
+        return left if timeout is None else min(timeout, left)
+
+    def _hedge_for(self, agent: Any) -> Optional[float]:
+        # Only lookups declared idempotent are safe to issue twice
+        return self.hedge_after_s if getattr(agent, "idempotent", False) else None
+
+    def _degraded(self, key: str, args: Tuple[str, ...], reason: str) -> Dict[str, Any]:
+        self._trace.count(f"degraded.{key}")
+        if self.cache is not None:
+            entry = self._cache_op(key, self.cache.get_stale, key, args)
+            if entry is not None and not is_degraded(entry[0]):
+                return stale_section(entry[0], reason, entry[1])
+        return failed_section(reason)
+
+    def _cache_op(self, key: str, op: Callable[..., T], *args: Any) -> Optional[T]:
+        # A failing cache backend (e.g. a locked disk cache) counts as a miss or a
+        # skipped write, never as a failed section
+        try:
+            return op(*args)
+        except Exception:
+            self._trace.count(f"cache.error.{key}")
+            return None
+
+    def _cached_sections(self, query: Dict[str, str]) -> Tuple[Dict[str, Dict[str, Any]], List[AgentCall]]:
+        """
+        Split AGENT_CALLS into sections served from the cache and calls still to make.
+        Each section is keyed on the arguments its agent actually takes, so e.g. the
+        patent landscape is shared by every indication and geography of a molecule.
+        """
+        if self.cache is None:
+            return {}, list(AGENT_CALLS)
+        sections: Dict[str, Dict[str, Any]] = {}
+        calls: List[AgentCall] = []
+        trace = self._trace
+        with trace.span("cache.lookup", track="master"):
+            for call in AGENT_CALLS:
+                cached = self._cache_op(call[0], self.cache.get, call[0], self._agent_args(call[2], query))
+                if cached is None:
+                    calls.append(call)
+                    trace.count(f"cache.miss.{call[0]}")
+                else:
+                    sections[call[0]] = cached
+                    trace.count(f"cache.hit.{call[0]}")
+        return sections, calls
+
+    def _store_sections(self, query: Dict[str, str], sections: Dict[str, Dict[str, Any]]) -> None:
+        if self.cache is None:
+            return
+        for key, _, arg_names in AGENT_CALLS:
+            section = sections.get(key)
+            if section is not None and not is_degraded(section):
+                self._cache_op(key, self.cache.set, key, self._agent_args(arg_names, query), section)
+
+    def _run_agent(self, key: str, attr: str, args: Tuple[str, ...]) -> Dict[str, Any]:
+        agent = getattr(self, attr)
+        trace = self._trace
+        with trace.span(f"agent.{key}", track=key, agent=type(agent).__name__) as span:
+            section = agent.run(*args)
+            if trace.enabled:
+                span.set(bytes=payload_size(section))
+        return section
+
+    def _bounded_run(self, key: str, attr: str, args: Tuple[str, ...], deadline: Optional[float]) -> Dict[str, Any]:
+        return bounded_call(
+            partial(self._run_agent, key, attr, args),
+            self._timeout_for(key, deadline),
+            self._hedge_for(getattr(self, attr)),
+            partial(self._trace.count, f"hedge.fired.{key}"),
+        )
+
+    def _fetch_section(self, key: str, attr: str, *args: str, deadline: Optional[float] = None) -> Dict[str, Any]:
+        """
+        One agent's section: from the cache while fresh, otherwise from the agent within
+        its deadline (hedged if configured), or degraded when it fails, its circuit is
+        open or the run's deadline (monotonic time) has passed.
+        """
+        trace = self._trace
+        if self.cache is not None:
+            cached = self._cache_op(key, self.cache.get, key, args)
+            trace.count(f"cache.{'miss' if cached is None else 'hit'}.{key}")
+            if cached is not None:
+                return cached
+        timeout = self._timeout_for(key, deadline)
+        if timeout is not None and timeout <= 0:
+            return self._degraded(key, args, DEADLINE_PASSED)
+        breaker = self.breakers.get(key) if self.breakers is not None else None
+        if breaker is not None and not breaker.allow():
+            trace.count(f"breaker.rejected.{key}")
+            return self._degraded(key, args, CIRCUIT_OPEN)
+        # Coalesce around the bounded call, so a hedge attempt is a new agent call
+        # rather than a wait on the slow one in flight
+        led = []
+
+        def call() -> Dict[str, Any]:
+            led.append(True)
+            return self._bounded_run(key, attr, args, deadline)
+
+        try:
+            if self.flights is None:
+                section = call()
+            else:
+                section, shared = self.flights.do(make_key(key, args), call, timeout)
+                if shared:
+                    trace.count(f"singleflight.coalesced.{key}")
+        except Exception as exc:
+            reason = str(exc) if isinstance(exc, TimeoutError) else f"{type(exc).__name__}: {exc}"
+            # A coalesced failure counts once, against the caller that made the call
+            if breaker is not None and led:
+                breaker.record_failure(reason)
+            return self._degraded(key, args, reason)
+        if breaker is not None:
+            breaker.record_success()
+        if self.cache is not None and not is_degraded(section):
+            self._cache_op(key, self.cache.set, key, args, section)
+        return section
+
+    def query_graph(
+        self, with_hypothesis: bool = True, fetch: Optional[Callable[..., Dict[str, Any]]] = None
+    ) -> QueryGraph:
+        """
+        The query as a QueryGraph over QUERY_INPUTS: one node per worker agent taking
+        the query arguments it uses, the unmet-needs synthesis over the internal and web
+        sections, and the hypothesis over molecule, indication and that synthesis.
+        fetch(key, attr, *args) produces an agent's section (default: cache, then agent).
+        """
+        fetch = fetch or self._fetch_section
+        nodes = [
+            # Deadlines are enforced per call in _fetch_section, in every execution mode
+            Node(key, arg_names, partial(fetch, key, attr), fallback=failed_section)
+            for key, attr, arg_names in AGENT_CALLS
+        ]
+        nodes.append(
+            Node(
+                SYNTHESIS_NODE,
+                ("internal_insights", "web_insights"),
+                self._derive_needs,
+                memoize=True,
+                salt=f"rules:{self.unmet_need_rules.fingerprint}",
+            )
+        )
+        if with_hypothesis:
+            nodes.append(
+                Node(
+                    HYPOTHESIS_NODE,
+                    ("molecule", "indication", SYNTHESIS_NODE),
+                    self._hypothesis,
+                    memoize=True,
+                    salt="template" if self.llm is None else f"llm:{llm_fingerprint(self.llm)}",
+                )
+            )
+        return QueryGraph(nodes, QUERY_INPUTS)
+
+    def _execute(
+        self,
+        query: Dict[str, str],
+        parallel: bool = True,
+        with_hypothesis: bool = True,
+        fetch: Optional[Callable[..., Dict[str, Any]]] = None,
+    ) -> Iterator[Tuple[str, Any]]:
+        if fetch is None:
+            fetch = partial(self._fetch_section, deadline=self._agent_deadline())
+        graph = self.query_graph(with_hypothesis, fetch)
+        return graph.iter_execute(
+            query, max_workers=self.max_workers if parallel else 1, memo=self.node_memo, trace=self._trace
+        )
+
+    async def _acall_agent(self, key: str, agent: Any, args: Tuple[str, ...]) -> Dict[str, Any]:
+        timeout = self._timeout_for(key)
+        trace = self._trace
+        breaker = self.breakers.get(key) if self.breakers is not None else None
+        if breaker is not None and not breaker.allow():
+            trace.count(f"breaker.rejected.{key}")
+            return self._degraded(key, args, CIRCUIT_OPEN)
+        call = partial(call_agent_async, agent, *args)
+        hedge_after_s = self._hedge_for(agent)
+        if hedge_after_s is not None:
+            call = partial(ahedged, call, hedge_after_s, partial(trace.count, f"hedge.fired.{key}"))
+        reason: Optional[str] = None
+        with trace.span(f"agent.{key}", track=key, agent=type(agent).__name__) as span:
+            try:
+                if self.flights is None:
+                    section = await asyncio.wait_for(call(), timeout)
+                else:
+                    section, shared = await asyncio.wait_for(self.flights.ado(make_key(key, args), call), timeout)
+                    if shared:
+                        trace.count(f"singleflight.coalesced.{key}")
+                        span.set(coalesced=True)
+            except asyncio.TimeoutError:
+                reason = f"timed out after {timeout:g}s"
+            except Exception as exc:
+                reason = f"{type(exc).__name__}: {exc}"
+            if reason is not None:
+                section = self._degraded(key, args, reason)
+            if breaker is not None and reason is None:
+                breaker.record_success()
+            elif breaker is not None:
+                breaker.record_failure(reason)
+            if trace.enabled:
+                span.set(bytes=payload_size(section), degraded=is_degraded(section))
+        return section
+
+    async def arun(self, molecule: str, indication: str, geography: str = "US") -> Dict[str, Any]:
+        with self._trace.span("master.run", track="master", molecule=molecule):
+            query = {"molecule": molecule, "indication": indication, "geography": geography}
+            sections, calls = self._cached_sections(query)
+            results = await asyncio.gather(
+                *(
+                    self._acall_agent(key, getattr(self, attr), self._agent_args(arg_names, query))
+                    for key, attr, arg_names in calls
+                )
+            )
+            fresh = {key: section for (key, _, _), section in zip(calls, results)}
+            self._store_sections(query, fresh)
+            sections.update(fresh)
+            synthesis = self._derive_needs(sections["internal_insights"], sections["web_insights"])
+            outputs: Dict[str, Any] = dict(sections)
+            outputs[SYNTHESIS_NODE] = synthesis
+            outputs[HYPOTHESIS_NODE] = self._hypothesis(molecule, indication, synthesis)
+            return self._result(query, outputs)
+
+    def _run_shared(self, query: Dict[str, str], shared: SharedCalls) -> Dict[str, Any]:
+        deadline = self._agent_deadline()
+
+        def fetch(key: str, attr: str, *args: str) -> Dict[str, Any]:
+            return shared.call(make_key(key, args), lambda: self._fetch_section(key, attr, *args, deadline=deadline))
+
+        return self._result(query, dict(self._execute(query, parallel=False, fetch=fetch)))
+
+    def run_batch(self, queries: Iterable[Any], max_workers: int = 8) -> Iterator[Dict[str, Any]]:
+        """
+        Evaluate many queries on a bounded thread pool, yielding one record per query
+        as it completes: {"query": ..., "result": ...} or {"query": ..., "error": ...}.
+        Agent calls with identical arguments are computed once for the whole batch.
+        """
+        shared = SharedCalls()
+        with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="batch-query") as executor:
+            futures = {}
+            for raw in queries:
+                query = normalize_query(raw)
+                futures[executor.submit(self._run_shared, query, shared)] = query
+            for future in as_completed(futures):
+                query = futures[future]
+                try:
+                    yield {"query": query, "result": future.result()}
+                except Exception as exc:
+                    yield {"query": query, "error": f"{type(exc).__name__}: {exc}"}
+
+    def iter_run(
+        self, molecule: str, indication: str, geography: str = "US", stream_tokens: bool = False
+    ) -> Iterator[Tuple[str, Any]]:
+        """
+        Progressive variant of run(): yields (result key, value) pairs as soon as each is
+        known. Worker sections arrive in completion order; the unmet-needs synthesis
+        follows as soon as the internal and web sections are in.
+        dict(iter_run(...)) equals run(...).
+
+        With stream_tokens, the hypothesis is first yielded as
+        (HYPOTHESIS_STREAM_KEY, iterator of text chunks) and then, once the consumer has
+        read (or abandoned) that iterator, as ("innovation_hypothesis", full text).
+        """
+        with self._trace.span("master.run", track="master", molecule=molecule):
+            yield from self._iter_run(molecule, indication, geography, stream_tokens)
+
+    def _iter_run(
+        self, molecule: str, indication: str, geography: str, stream_tokens: bool
+    ) -> Iterator[Tuple[str, Any]]:
+        yield "molecule", molecule
+        yield "primary_indication", indication
+        yield "target_geography", geography
+
+        query = {"molecule": molecule, "indication": indication, "geography": geography}
+        for name, value in self._execute(query, with_hypothesis=not stream_tokens):
+            if name != SYNTHESIS_NODE:
+                yield name, value
+                continue
+            yield from value.items()
+            if stream_tokens:
+                chunks: List[str] = []
+
+                def recorded() -> Iterator[str]:
+                    with self._trace.span("synthesis.hypothesis", track="master", streamed=True) as span:
+                        for chunk in self.stream_hypothesis(molecule, indication, value["unmet_needs"]):
+                            chunks.append(chunk)
+                            yield chunk
+                        span.set(chunks=len(chunks))
+
+                tokens = recorded()
+                yield HYPOTHESIS_STREAM_KEY, tokens
+                for _ in tokens:  # finish whatever the consumer left unread
+                    pass
+                yield "innovation_hypothesis", "".join(chunks)
 
     def run(self, molecule: str, indication: str, geography: str = "US") -> Dict[str, Any]:
-        # 1. Call worker agents
-        market = self.iqvia_agent.run(molecule, indication, geography)
-        exim = self.exim_agent.run(molecule, geography)
-        patents = self.patent_agent.run(molecule)
-        trials = self.clinical_agent.run(molecule)
-        internal = self.internal_agent.run(molecule)
-        web = self.web_agent.run(molecule)
-
-        # 2. Derive unmet needs (rule-based)
-        unmet_needs: List[str] = []
-
-        for fb in internal.get("field_feedback", []):
-            fbl = fb.lower()
-            if "dizziness" in fbl:
-                unmet_needs.append("Reduce dizziness / CNS side effects.")
-            if "adherence" in fbl:
-                unmet_needs.append("Improve adherence in elderly / complex regimens.")
-            if "elderly" in fbl:
-                unmet_needs.append("Design regimen better suited to elderly patients.")
-            if "diabet" in fbl:
-                unmet_needs.append("Target neuropathic pain in diabetic patients more specifically.")
-
-        for p in web.get("patient_forum_highlights", []):
-            pl = p.lower()
-            if "sleepy" in pl or "sedation" in pl:
-                unmet_needs.append("Minimize daytime sedation while maintaining pain relief.")
-
-        unmet_needs = list(dict.fromkeys(unmet_needs))
+        if self.flights is None:
+            return self._run(molecule, indication, geography)
+        query = {"molecule": molecule, "indication": indication, "geography": geography}
+        result, shared = self.flights.do(query_key(query), partial(self._run, molecule, indication, geography))
+        if not shared:
+            return result
+        self._trace.count("singleflight.coalesced.query")
+        # The leader may have spelled the query differently (keys are normalized)
+        return dict(result, molecule=molecule, primary_indication=indication, target_geography=geography)
 
-        clinical_rationale = (
-            "Internal feedback and external snippets indicate scope for differentiation via "
-            "formulation, dosing regimen or population targeting (e.g., elderly, diabetic neuropathy)."
+    def _run(self, molecule: str, indication: str, geography: str) -> Dict[str, Any]:
+        if self.use_async:
+            return run_sync(self.arun(molecule, indication, geography))
+
+        with self._trace.span("master.run", track="master", molecule=molecule):
+            query = {"molecule": molecule, "indication": indication, "geography": geography}
+            return self._result(query, dict(self._execute(query, parallel=self.parallel)))
+
+    def hypothesis_prompt(self, molecule: str, indication: str, unmet_needs: List[str]) -> str:
+        needs = "\n".join(f"- {n}" for n in unmet_needs) or "- (none identified)"
+        return (
+            f"Write a one-paragraph innovation hypothesis for repurposing {molecule} in {indication}.\n"
+            f"Address these unmet needs:\n{needs}\n"
+            "Name the target population, the differentiation (formulation, dosing or indication) "
+            "and the expected clinical benefit."
         )
 
-        # 3. Simple template-based innovation hypothesis
+    def _template_hypothesis(self, molecule: str, indication: str, unmet_needs: List[str]) -> str:
         base_pop = "elderly patients" if any("elderly" in n.lower() for n in unmet_needs) else "high-risk patients"
-        innovation = (
+        return (
             f"Develop a differentiated formulation of {molecule} for {indication}, "
             f"focusing on {base_pop} and aiming to reduce side effects while improving adherence."
         )
 
+    def stream_hypothesis(self, molecule: str, indication: str, unmet_needs: List[str]) -> Iterator[str]:
+        """The innovation hypothesis as text chunks, token by token when an LLM is configured."""
+        if self.llm is not None:
+            yield from self.llm.stream(self.hypothesis_prompt(molecule, indication, unmet_needs))
+        else:
+            yield from chunk_text(self._template_hypothesis(molecule, indication, unmet_needs))
+
+    def _derive_needs(self, internal: Dict[str, Any], web: Dict[str, Any]) -> Dict[str, Any]:
+        # Unmet needs from the declarative rule table (see rules.py)
+        with self._trace.span("synthesis.unmet_needs", track="master"):
+            unmet_needs = self.unmet_need_rules.derive(
+                {
+                    "field_feedback": internal.get("field_feedback", []),
+                    "patient_forum_highlights": web.get("patient_forum_highlights", []),
+                }
+            )
+
+        clinical_rationale = (
+            "Internal feedback and external snippets indicate scope for differentiation via "
+            "formulation, dosing regimen or population targeting (e.g., elderly, diabetic neuropathy)."
+        )
+        return {"unmet_needs": unmet_needs, "clinical_rationale": clinical_rationale}
+
+    def _hypothesis(self, molecule: str, indication: str, synthesis: Dict[str, Any]) -> str:
+        # Innovation hypothesis: LLM-written when configured, else a simple template
+        unmet_needs = synthesis["unmet_needs"]
+        with self._trace.span("synthesis.hypothesis", track="master", llm=self.llm is not None):
+            if self.llm is not None:
+                return self.llm.invoke(self.hypothesis_prompt(molecule, indication, unmet_needs))
+            return self._template_hypothesis(molecule, indication, unmet_needs)
+
+    def _result(self, query: Dict[str, str], outputs: Dict[str, Any]) -> Dict[str, Any]:
+        synthesis = outputs[SYNTHESIS_NODE]
         return {
-            "molecule": molecule,
-            "primary_indication": indication,
-            "target_geography": geography,
-            "unmet_needs": unmet_needs,
-            "clinical_rationale": clinical_rationale,
-            "market_overview": market,
-            "exim_overview": exim,
-            "patent_landscape": patents,
-            "clinical_trials_landscape": trials,
-            "internal_insights": internal,
-            "web_insights": web,
-            "innovation_hypothesis": innovation,
+            "molecule": query["molecule"],
+            "primary_indication": query["indication"],
+            "target_geography": query["geography"],
+            "unmet_needs": synthesis["unmet_needs"],
+            "clinical_rationale": synthesis["clinical_rationale"],
+            "market_overview": outputs["market_overview"],
+            "exim_overview": outputs["exim_overview"],
+            "patent_landscape": outputs["patent_landscape"],
+            "clinical_trials_landscape": outputs["clinical_trials_landscape"],
+            "internal_insights": outputs["internal_insights"],
+            "web_insights": outputs["web_insights"],
+            "innovation_hypothesis": outputs[HYPOTHESIS_NODE],
         }
 
+# MasterAgent field -> worker agent factory, built once per pool. Agents with a local
+# data store read it from AGENT_DATA_DIR when set (see stores/).
+AGENT_FACTORIES: Dict[str, Callable[[], Any]] = {
+    "iqvia_agent": lambda: IQVIAInsightsAgent(store=build_market_store()),
+    "exim_agent": lambda: EXIMTrendsAgent(store=build_market_store()),
+    "patent_agent": lambda: PatentLandscapeAgent(store=build_patent_store()),
+    "clinical_agent": lambda: ClinicalTrialsAgent(registry=build_trial_registry()),
+    "internal_agent": lambda: InternalKnowledgeAgent(index=build_document_index()),
+    "web_agent": lambda: WebIntelligenceAgent(index=build_vector_index()),
+}
 
-def build_master_agent() -> MasterAgent:
-    return MasterAgent(
-        iqvia_agent=IQVIAInsightsAgent(),
-        exim_agent=EXIMTrendsAgent(),
-        patent_agent=PatentLandscapeAgent(),
-        clinical_agent=ClinicalTrialsAgent(),
-        internal_agent=InternalKnowledgeAgent(),
-        web_agent=WebIntelligenceAgent(),
-    )
+
+def build_master_agent(pool: Optional[AgentPool] = None, **options: Any) -> MasterAgent:
+    """
+    Build the MasterAgent around pooled worker agents (the process-wide pool unless
+    one is given); options (parallel, use_async, agent_timeout_s, cache, ...) set its
+    execution mode. The MasterAgent itself is cheap; the agents it wraps are shared.
+    """
+    pool = pool if pool is not None else get_default_pool()
+    agents = {attr: pool.get(attr, factory) for attr, factory in AGENT_FACTORIES.items()}
+    return MasterAgent(**agents, **options)
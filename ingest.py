@@ -0,0 +1,154 @@
+# ingest.py
+
+"""
+Command-line ingestion of raw data drops into the agents' local stores (see stores/).
+
+    python ingest.py iqvia iqvia_2025_q3.csv
+    python ingest.py exim exim_2025_09.csv --replace
+    python ingest.py documents field_notes.jsonl strategic_briefs.csv
+    python ingest.py snippets web_mirror.jsonl
+    python ingest.py patents patent_dump_2025_10.csv
+    python ingest.py trials ctgov_studies.jsonl
+
+Stores live under --data-dir (default: $AGENT_DATA_DIR, else ./data); point the app
+at the same directory with AGENT_DATA_DIR for the agents to use them.
+"""
+
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from typing import Any, Dict, Iterator, List, Optional
+
+from stores.documents import DocumentIndex
+from stores.market import SCHEMAS, MarketDataStore
+from stores.patents import PATENT_COLUMNS, PatentStore
+from stores.trials import TrialRegistry
+from stores.vectors import VectorIndex
+
+
+def read_records(path: str) -> Iterator[Dict[str, Any]]:
+    """Rows of a CSV file (with header) or objects of a JSONL file."""
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.lower().endswith((".jsonl", ".ndjson")):
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from csv.DictReader(f)
+
+
+def ingest_market(data_dir: str, dataset: str, paths: List[str], replace: bool = False) -> int:
+    store = MarketDataStore(os.path.join(data_dir, "market"))
+    total = 0
+    for path in paths:
+        started = time.perf_counter()
+        rows = store.ingest_csv(dataset, path, replace=replace)
+        total += rows
+        print(f"{dataset}: {rows} rows from {path} in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+    return total
+
+
+def ingest_documents(data_dir: str, paths: List[str]) -> int:
+    os.makedirs(data_dir, exist_ok=True)
+    index = DocumentIndex(os.path.join(data_dir, "documents.sqlite"))
+    total = 0
+    try:
+        for path in paths:
+            started = time.perf_counter()
+            docs = index.add_documents(read_records(path))
+            total += docs
+            print(f"documents: {docs} from {path} in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+    finally:
+        index.close()
+    return total
+
+
+def ingest_snippets(data_dir: str, paths: List[str]) -> int:
+    index = VectorIndex(os.path.join(data_dir, "web"))
+    total = 0
+    try:
+        for path in paths:
+            started = time.perf_counter()
+            snippets = index.add_snippets(read_records(path))
+            total += snippets
+            print(f"snippets: {snippets} from {path} in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+        # Re-cluster so searches probe a few lists instead of scanning the new rows
+        for kind in index.kinds():
+            started = time.perf_counter()
+            index.build_ivf(kind)
+            print(f"snippets: indexed {kind} in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+    finally:
+        index.close()
+    return total
+
+
+def ingest_patents(data_dir: str, paths: List[str]) -> int:
+    os.makedirs(data_dir, exist_ok=True)
+    store = PatentStore(os.path.join(data_dir, "patents.sqlite"))
+    total = 0
+    try:
+        for path in paths:
+            started = time.perf_counter()
+            patents = store.add_patents(read_records(path))
+            total += patents
+            print(f"patents: {patents} from {path} in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+    finally:
+        store.close()
+    return total
+
+
+def ingest_trials(data_dir: str, paths: List[str]) -> Dict[str, int]:
+    os.makedirs(data_dir, exist_ok=True)
+    registry = TrialRegistry(os.path.join(data_dir, "trials.sqlite"))
+    totals = {"inserted": 0, "updated": 0, "skipped": 0}
+    try:
+        for path in paths:
+            started = time.perf_counter()
+            counts = registry.sync(read_records(path))
+            for key, n in counts.items():
+                totals[key] += n
+            summary = ", ".join(f"{n} {key}" for key, n in counts.items())
+            print(f"trials: {summary} from {path} in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+    finally:
+        registry.close()
+    return totals
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Convert raw data drops into the agents' local stores.")
+    parser.add_argument("--data-dir", default=os.environ.get("AGENT_DATA_DIR", "data"))
+    commands = parser.add_subparsers(dest="command", required=True)
+    for name in SCHEMAS:
+        cmd = commands.add_parser(name, help=f"{name.upper()} CSV drop(s): {', '.join(SCHEMAS[name].names)}")
+        cmd.add_argument("paths", nargs="+", help="CSV files")
+        cmd.add_argument(
+            "--replace", action="store_true", help="clear the molecule/geography partitions present in the drop first"
+        )
+    cmd = commands.add_parser("documents", help="internal documents: name, text, molecule, kind, summary")
+    cmd.add_argument("paths", nargs="+", help="CSV or JSONL files")
+    cmd = commands.add_parser("snippets", help="mirrored web snippets: kind (guideline/forum/news), text, source")
+    cmd.add_argument("paths", nargs="+", help="CSV or JSONL files")
+    cmd = commands.add_parser("patents", help=f"patent dump: {', '.join(PATENT_COLUMNS)}")
+    cmd.add_argument("paths", nargs="+", help="CSV or JSONL files")
+    cmd = commands.add_parser("trials", help="registry dump: flat rows or ClinicalTrials.gov v2 studies (JSONL)")
+    cmd.add_argument("paths", nargs="+", help="CSV or JSONL files")
+    args = parser.parse_args(argv)
+
+    if args.command in SCHEMAS:
+        ingest_market(args.data_dir, args.command, args.paths, replace=args.replace)
+    elif args.command == "documents":
+        ingest_documents(args.data_dir, args.paths)
+    elif args.command == "snippets":
+        ingest_snippets(args.data_dir, args.paths)
+    elif args.command == "patents":
+        ingest_patents(args.data_dir, args.paths)
+    elif args.command == "trials":
+        ingest_trials(args.data_dir, args.paths)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,481 @@
+# jobs.py
+
+"""
+Local background job queue for analyses, so a search neither blocks nor is lost to a
+Streamlit script rerun.
+
+Jobs live in one SQLite file: the query, its status (queued, running, done, failed)
+and timestamps in `jobs`, and every result key in `job_parts` as soon as the worker
+produces it. The UI renders a job's parts while it runs and can re-attach to it by
+id after a rerun or a page reload. Jobs run in a process pool. The workers share a
+disk section cache next to the job database, and coalesce identical agent lookups
+through the `flights` table (StoreFlights); each worker keeps its own pooled agents
+and circuit breakers between jobs.
+
+Submitting a query that is queued, running or was done within max_age_s returns the
+existing job instead of computing it again; a done job with a degraded section (failed
+or stale) is not reused, so a transient agent failure is retried on the next submit. Run one app server per job database:
+jobs left unfinished by a previous server are re-queued on start-up.
+"""
+
+import json
+import multiprocessing
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass
+from functools import partial
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, TypeVar
+
+from agent_pool import get_default_pool
+from cache import HOUR, DiskCacheBackend, MemoryCacheBackend, ResultCache, build_result_cache
+from graph import HYPOTHESIS_STREAM_KEY, build_master_agent, is_degraded, normalize_query, query_key
+from llm_client import LLM_AVAILABLE, get_llm_client
+from resilience import CircuitBreakers, DeadlineExceeded
+from singleflight import SingleFlight
+from tracing import Tracer
+
+T = TypeVar("T")
+
+# End-to-end budget per search; agents get deadlines derived from it
+QUERY_SLA_S = float(os.environ.get("QUERY_SLA_S", "20"))
+# Idempotent agent lookups slower than this get a second (hedged) attempt
+HEDGE_AFTER_S = float(os.environ.get("HEDGE_AFTER_S", "3"))
+
+# job_parts keys that are not result keys: the hypothesis text so far while it
+# streams, and the run's trace / process stats when the job was traced
+PARTIAL_HYPOTHESIS_KEY = HYPOTHESIS_STREAM_KEY
+DIAGNOSTICS_KEY = "_diagnostics"
+# Minimum interval between writes of the streaming hypothesis
+PARTIAL_INTERVAL_S = 0.1
+
+FINISHED = ("done", "failed")
+
+
+@dataclass
+class Job:
+    id: str
+    key: str
+    query: Dict[str, str]
+    options: Dict[str, Any]
+    status: str
+    submitted_at: float
+    started_at: Optional[float]
+    finished_at: Optional[float]
+    error: Optional[str]
+    # Done, but with a failed or stale section
+    degraded: bool = False
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED
+
+
+_JOB_COLUMNS = "id, key, query, options, status, submitted_at, started_at, finished_at, error, degraded"
+
+
+class JobStore:
+    """SQLite persistence of jobs and their result parts; safe to open from several processes."""
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.executescript(
+            """
+            PRAGMA journal_mode = WAL;
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                key TEXT NOT NULL,
+                query TEXT NOT NULL,
+                options TEXT NOT NULL,
+                status TEXT NOT NULL,
+                submitted_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL,
+                error TEXT,
+                degraded INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS jobs_key ON jobs (key, submitted_at);
+            CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status);
+            CREATE TABLE IF NOT EXISTS job_parts (
+                job_id TEXT NOT NULL,
+                key TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                value BLOB NOT NULL,
+                PRIMARY KEY (job_id, key)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS job_parts_seq ON job_parts (job_id, seq);
+            CREATE TABLE IF NOT EXISTS flights (
+                key TEXT PRIMARY KEY,
+                flight TEXT NOT NULL,
+                started_at REAL NOT NULL,
+                done INTEGER NOT NULL DEFAULT 0,
+                value BLOB,
+                error BLOB
+            );
+            """
+        )
+        if "degraded" not in {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}:
+            try:
+                self._conn.execute("ALTER TABLE jobs ADD COLUMN degraded INTEGER NOT NULL DEFAULT 0")
+            except sqlite3.OperationalError:
+                pass  # added by another process meanwhile
+        self._conn.commit()
+
+    def create(self, key: str, query: Dict[str, str], options: Dict[str, Any]) -> str:
+        job_id = uuid.uuid4().hex
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"INSERT INTO jobs ({_JOB_COLUMNS}) VALUES (?, ?, ?, ?, 'queued', ?, NULL, NULL, NULL, 0)",
+                (job_id, key, json.dumps(query), json.dumps(options), time.time()),
+            )
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            row = self._conn.execute(f"SELECT {_JOB_COLUMNS} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._job(row) if row is not None else None
+
+    def _job(self, row: Tuple[Any, ...]) -> Job:
+        job_id, key, query, options, status, submitted_at, started_at, finished_at, error, degraded = row
+        return Job(
+            job_id, key, json.loads(query), json.loads(options), status, submitted_at, started_at, finished_at, error,
+            bool(degraded),
+        )
+
+    def find_reusable(self, key: str, max_age_s: float) -> Optional[Job]:
+        """The newest job for key that is queued, running, or done within max_age_s and not degraded."""
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {_JOB_COLUMNS} FROM jobs WHERE key = ?"
+                " AND (status IN ('queued', 'running') OR (status = 'done' AND degraded = 0 AND finished_at >= ?))"
+                " ORDER BY submitted_at DESC LIMIT 1",
+                (key, time.time() - max_age_s),
+            ).fetchone()
+        return self._job(row) if row is not None else None
+
+    def unfinished(self) -> List[str]:
+        with self._lock:
+            return [r[0] for r in self._conn.execute("SELECT id FROM jobs WHERE status IN ('queued', 'running')")]
+
+    def mark(self, job_id: str, status: str, error: Optional[str] = None, degraded: bool = False) -> None:
+        column = {"queued": None, "running": "started_at"}.get(status, "finished_at")
+        with self._lock, self._conn:
+            if status == "queued":
+                self._conn.execute("DELETE FROM job_parts WHERE job_id = ?", (job_id,))
+            sql = "UPDATE jobs SET status = ?, error = ?, degraded = ?"
+            sql += (f", {column} = ?" if column else "") + " WHERE id = ?"
+            params = (status, error, int(degraded)) + ((time.time(),) if column else ()) + (job_id,)
+            self._conn.execute(sql, params)
+
+    def put_part(self, job_id: str, key: str, value: Any) -> None:
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO job_parts (job_id, key, seq, value) VALUES"
+                " (?, ?, (SELECT COALESCE(MAX(seq), 0) + 1 FROM job_parts WHERE job_id = ?), ?)",
+                (job_id, key, job_id, blob),
+            )
+
+    def parts(self, job_id: str, after_seq: int = 0) -> List[Tuple[int, str, Any]]:
+        """(seq, key, value) of the job's parts written after after_seq, in write order."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT seq, key, value FROM job_parts WHERE job_id = ? AND seq > ? ORDER BY seq", (job_id, after_seq)
+            ).fetchall()
+        return [(seq, key, pickle.loads(value)) for seq, key, value in rows]
+
+    def join_flight(self, key: str, lease_s: float) -> Tuple[str, bool]:
+        """
+        The flight in progress for key, and whether the caller now leads it: a new
+        flight replaces a finished one or one whose leader has held it past lease_s.
+        """
+        flight, now = uuid.uuid4().hex, time.time()
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM flights WHERE done = 1 AND started_at < ?", (now - lease_s,))
+            self._conn.execute(
+                "INSERT INTO flights (key, flight, started_at) VALUES (?, ?, ?)"
+                " ON CONFLICT (key) DO UPDATE SET flight = excluded.flight, started_at = excluded.started_at,"
+                " done = 0, value = NULL, error = NULL WHERE done = 1 OR started_at < ?",
+                (key, flight, now, now - lease_s),
+            )
+            current = self._conn.execute("SELECT flight FROM flights WHERE key = ?", (key,)).fetchone()[0]
+        return current, current == flight
+
+    def land_flight(self, key: str, flight: str, value: Any = None, error: Optional[BaseException] = None) -> None:
+        if error is None:
+            value_blob, error_blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), None
+        else:
+            try:
+                error_blob = pickle.dumps(error, protocol=pickle.HIGHEST_PROTOCOL)
+            except Exception:
+                error_blob = pickle.dumps(RuntimeError(f"{type(error).__name__}: {error}"))
+            value_blob = None
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE flights SET done = 1, value = ?, error = ? WHERE key = ? AND flight = ?",
+                (value_blob, error_blob, key, flight),
+            )
+
+    def flight_outcome(self, key: str, flight: str) -> Tuple[str, Any]:
+        """("running", None), ("done", value), ("failed", exception) or ("gone", None)."""
+        with self._lock:
+            row = self._conn.execute("SELECT flight, done, value, error FROM flights WHERE key = ?", (key,)).fetchone()
+        if row is None or row[0] != flight:
+            return "gone", None
+        if not row[1]:
+            return "running", None
+        if row[3] is not None:
+            return "failed", pickle.loads(row[3])
+        return "done", pickle.loads(row[2])
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class StoreFlights(SingleFlight):
+    """
+    SingleFlight across the worker processes sharing a job database. Calls are
+    coalesced within the process first; the process's leader then joins the key's
+    flight in the database, where one worker runs fn and the others poll for its
+    pickled outcome. A waiter whose leader is gone or has held the flight past
+    lease_s runs fn itself; one whose timeout_s runs out first gives up with
+    DeadlineExceeded, so a crashed worker costs its waiters no more than their deadline.
+    """
+
+    def __init__(self, store: JobStore, lease_s: float = 60.0, poll_s: float = 0.05):
+        super().__init__()
+        self.store = store
+        self.lease_s = lease_s
+        self.poll_s = poll_s
+        self._across = 0
+        self._across_lock = threading.Lock()
+
+    def do(self, key: str, fn: Callable[[], T], timeout_s: Optional[float] = None) -> Tuple[T, bool]:
+        (value, across), shared = super().do(key, partial(self._do_across, key, fn, timeout_s), timeout_s)
+        return value, shared or across
+
+    def _do_across(self, key: str, fn: Callable[[], T], timeout_s: Optional[float]) -> Tuple[T, bool]:
+        flight, leader = self.store.join_flight(key, self.lease_s)
+        if leader:
+            try:
+                value = fn()
+            except BaseException as exc:
+                self.store.land_flight(key, flight, error=exc)
+                raise
+            self.store.land_flight(key, flight, value=value)
+            return value, False
+        wait_s = self.lease_s if timeout_s is None else min(self.lease_s, timeout_s)
+        deadline, state = time.monotonic() + wait_s, "running"
+        while time.monotonic() < deadline:
+            state, outcome = self.store.flight_outcome(key, flight)
+            if state == "done":
+                self._count_across()
+                return outcome, True
+            if state == "failed":
+                self._count_across()
+                raise outcome
+            if state == "gone":
+                break
+            time.sleep(self.poll_s)
+        if state == "running" and wait_s < self.lease_s:
+            raise DeadlineExceeded(f"timed out after {timeout_s:g}s waiting for another worker's call")
+        return fn(), False
+
+    def _count_across(self) -> None:
+        with self._across_lock:
+            self._across += 1
+
+    def stats(self) -> Dict[str, Any]:
+        stats = super().stats()
+        with self._across_lock:
+            stats["coalesced_across_workers"] = self._across
+        return stats
+
+
+# -- worker process side --
+
+_WORKER_RESOURCES: Dict[str, Any] = {}
+
+
+def _section_cache(path: str) -> ResultCache:
+    # $RESULT_CACHE_DIR when set, otherwise a disk cache beside the job database: the
+    # workers are separate processes, so an in-memory cache would not be shared
+    if os.environ.get("RESULT_CACHE_DIR"):
+        return build_result_cache()
+    return ResultCache(DiskCacheBackend(os.path.join(os.path.dirname(os.path.abspath(path)), "sections.sqlite")))
+
+
+def _worker_resources(path: str) -> Dict[str, Any]:
+    # Built once per worker process and kept for every job it runs
+    if not _WORKER_RESOURCES:
+        _WORKER_RESOURCES.update(
+            cache=_section_cache(path),
+            node_memo=MemoryCacheBackend(max_entries=512),
+            flights=StoreFlights(JobStore(path)),
+            breakers=CircuitBreakers(),
+            llm=get_llm_client() if LLM_AVAILABLE else None,
+        )
+    return _WORKER_RESOURCES
+
+
+def diagnostics(tracer: Tracer) -> Dict[str, Any]:
+    """
+    A traced job's trace plus its worker's counters: lookups in the shared section
+    cache, coalesced calls, and the worker's own circuit breakers and LLM usage.
+    """
+    resources = _WORKER_RESOURCES
+    llm = resources["llm"]
+    return {
+        "trace": tracer.to_dict(),
+        "chrome_trace": tracer.chrome_trace_json(),
+        "cache": resources["cache"].stats(),
+        "flights": resources["flights"].stats(),
+        "breakers": resources["breakers"].snapshot(),
+        "llm": llm.usage.snapshot() if llm is not None and hasattr(llm, "usage") else None,
+    }
+
+
+def run_job(path: str, job_id: str) -> None:
+    """Worker entry point: run the job's query and write each result key as it arrives."""
+    store = JobStore(path)
+    try:
+        job = store.get(job_id)
+        if job is None or job.finished:
+            return
+        store.mark(job_id, "running")
+        try:
+            get_default_pool().ensure_healthy()
+            tracer = Tracer() if job.options.get("trace") else None
+            master = build_master_agent(
+                sla_s=QUERY_SLA_S, hedge_after_s=HEDGE_AFTER_S, tracer=tracer, **_worker_resources(path)
+            )
+            q = job.query
+            degraded = False
+            for key, value in master.iter_run(q["molecule"], q["indication"], q["geography"], stream_tokens=True):
+                if key == HYPOTHESIS_STREAM_KEY:
+                    text, written = "", 0.0
+                    for chunk in value:
+                        text += chunk
+                        if time.monotonic() - written >= PARTIAL_INTERVAL_S:
+                            store.put_part(job_id, PARTIAL_HYPOTHESIS_KEY, text)
+                            written = time.monotonic()
+                    continue
+                degraded = degraded or (isinstance(value, dict) and is_degraded(value))
+                store.put_part(job_id, key, value)
+            if tracer is not None:
+                store.put_part(job_id, DIAGNOSTICS_KEY, diagnostics(tracer))
+        except Exception as exc:
+            store.mark(job_id, "failed", f"{type(exc).__name__}: {exc}")
+        else:
+            store.mark(job_id, "done", degraded=degraded)
+    finally:
+        store.close()
+
+
+# -- app side --
+
+
+class JobQueue:
+    def __init__(self, path: str, max_workers: int = 2, max_age_s: float = HOUR):
+        self.store = JobStore(path)
+        self.max_workers = max_workers
+        self.max_age_s = max_age_s
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        for job_id in self.store.unfinished():
+            self.store.mark(job_id, "queued")
+            self._dispatch(job_id)
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn: the app process is multi-threaded, which fork does not survive safely
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+
+    def _dispatch(self, job_id: str) -> None:
+        with self._lock:
+            future = self._pool().submit(run_job, self.store.path, job_id)
+        future.add_done_callback(lambda f: self._landed(job_id, f))
+
+    def _landed(self, job_id: str, future: Future) -> None:
+        # run_job records its own failures; this catches a worker process that died
+        exc = future.exception()
+        if exc is None:
+            return
+        if isinstance(exc, BrokenProcessPool):
+            with self._lock:
+                self._executor = None
+        job = self.store.get(job_id)
+        if job is not None and not job.finished:
+            self.store.mark(job_id, "failed", f"{type(exc).__name__}: {exc}")
+
+    def submit(self, query: Any, trace: bool = False, force: bool = False) -> str:
+        """
+        Job id for the query: an existing queued, running or recent job unless force,
+        otherwise a new job. trace records a trace and process stats with the result.
+        """
+        query = normalize_query(query)
+        key = query_key(query) + ("|trace" if trace else "")
+        with self._lock:
+            existing = None if force else self.store.find_reusable(key, self.max_age_s)
+            if existing is not None:
+                return existing.id
+            job_id = self.store.create(key, query, {"trace": trace})
+        self._dispatch(job_id)
+        return job_id
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self.store.get(job_id)
+
+    def parts(self, job_id: str, after_seq: int = 0) -> List[Tuple[int, str, Any]]:
+        return self.store.parts(job_id, after_seq)
+
+    def follow(self, job_id: str, poll_s: float = 0.1) -> Iterator[Tuple[str, Any]]:
+        """(key, value) parts of the job as they are written, until it finishes."""
+        seq = 0
+        while True:
+            job = self.store.get(job_id)  # read the status first: parts precede "done"
+            for seq, key, value in self.store.parts(job_id, seq):
+                yield key, value
+            if job is None or job.finished:
+                return
+            time.sleep(poll_s)
+
+    def result(self, job_id: str) -> Dict[str, Any]:
+        """The job's result keys so far (the full result once done)."""
+        skip = (PARTIAL_HYPOTHESIS_KEY, DIAGNOSTICS_KEY)
+        return {key: value for _, key, value in self.store.parts(job_id) if key not in skip}
+
+    def wait(self, job_id: str, timeout_s: Optional[float] = None, poll_s: float = 0.05) -> Job:
+        deadline = None if timeout_s is None else time.monotonic() + timeout_s
+        while True:
+            job = self.store.get(job_id)
+            if job is None or job.finished:
+                return job
+            if deadline is not None and time.monotonic() >= deadline:
+                raise TimeoutError(f"job {job_id} still {job.status} after {timeout_s:g}s")
+            time.sleep(poll_s)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+        self.store.close()
+
+
+def build_job_queue() -> JobQueue:
+    """Queue at $JOB_DIR/jobs.sqlite (default ./.jobs), with JOB_WORKERS worker processes (default 2)."""
+    job_dir = os.environ.get("JOB_DIR", ".jobs")
+    return JobQueue(os.path.join(job_dir, "jobs.sqlite"), max_workers=int(os.environ.get("JOB_WORKERS", "2")))
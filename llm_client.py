@@ -1,14 +1,27 @@
 # llm_client.py
 
-from typing import Optional
+import hashlib
+import http.client
+import json
+import os
+import queue
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, asdict
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlsplit
 
-try:
-    # future: yaha real LLM client import karna
-    # from langchain_openai import ChatOpenAI
-    # from langchain_groq import ChatGroq
-    LLM_AVAILABLE = False
-except Exception:
-    LLM_AVAILABLE = False
+from cache import DiskCacheBackend, MemoryCacheBackend
+
+# Real model ke liye LLM_BASE_URL set karo (OpenAI-compatible /v1/chat/completions endpoint).
+LLM_AVAILABLE = bool(os.environ.get("LLM_BASE_URL"))
+
+
+def chunk_text(text: str) -> Iterator[str]:
+    """Split text into word-sized chunks (each keeps its trailing whitespace)."""
+    return iter(re.findall(r"\s*\S+\s*", text) or [text])
 
 
 class DummyLLM:
@@ -19,21 +32,272 @@ class DummyLLM:
         # Bahut simple behavior: prompt ke last lines ko hi return kar deta hai
         return "LLM placeholder response (no real model configured)."
 
+    def stream(self, prompt: str) -> Iterator[str]:
+        yield from chunk_text(self.invoke(prompt))
+
+    def batch(self, prompts: List[str]) -> List[str]:
+        return [self.invoke(p) for p in prompts]
+
+
+class LLMError(RuntimeError):
+    pass
+
+
+@dataclass
+class LLMUsage:
+    """Running totals for one client; tokens come from the server's usage block."""
+    requests: int = 0
+    cache_hits: int = 0
+    errors: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    latency_s: float = 0.0
+    streams: int = 0
+    first_token_s: float = 0.0
+
+    def snapshot(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data["avg_latency_ms"] = round(1000 * self.latency_s / self.requests, 2) if self.requests else 0.0
+        data["avg_time_to_first_token_ms"] = round(1000 * self.first_token_s / self.streams, 2) if self.streams else 0.0
+        return data
+
+
+class ConnectionPool:
+    """
+    Keep-alive HTTP(S) connections to one host, at most `size` in use at a time.
+    A connection that the server has since closed is replaced and the request retried once.
+    """
+
+    def __init__(self, base_url: str, size: int = 8, timeout: float = 60.0):
+        parts = urlsplit(base_url)
+        self.https = parts.scheme == "https"
+        self.host = parts.hostname or "localhost"
+        self.port = parts.port
+        self.base_path = parts.path.rstrip("/")
+        self.timeout = timeout
+        self._idle: "queue.LifoQueue[http.client.HTTPConnection]" = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self.opened = 0
+
+    def _connect(self) -> http.client.HTTPConnection:
+        self.opened += 1
+        cls = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+        return cls(self.host, self.port, timeout=self.timeout)
+
+    def _send(
+        self, method: str, path: str, body: bytes, headers: Dict[str, str]
+    ) -> Tuple[http.client.HTTPConnection, http.client.HTTPResponse]:
+        try:
+            conn = self._idle.get_nowait()
+            reused = True
+        except queue.Empty:
+            conn, reused = self._connect(), False
+        try:
+            conn.request(method, self.base_path + path, body=body, headers=headers)
+            return conn, conn.getresponse()
+        except (http.client.HTTPException, OSError):
+            conn.close()
+            if not reused:
+                raise
+        conn = self._connect()
+        conn.request(method, self.base_path + path, body=body, headers=headers)
+        return conn, conn.getresponse()
+
+    def _release(self, conn: http.client.HTTPConnection, resp: http.client.HTTPResponse) -> None:
+        if resp.will_close or not resp.isclosed():
+            conn.close()
+        else:
+            self._idle.put(conn)
+
+    def request(self, method: str, path: str, body: bytes, headers: Dict[str, str]) -> Tuple[int, bytes]:
+        with self._slots:
+            conn, resp = self._send(method, path, body, headers)
+            data = resp.read()
+            self._release(conn, resp)
+            return resp.status, data
+
+    def stream(self, method: str, path: str, body: bytes, headers: Dict[str, str]) -> Iterator[Tuple[int, bytes]]:
+        """Like request(), but yields (status, line) as the response body arrives."""
+        with self._slots:
+            conn, resp = self._send(method, path, body, headers)
+            try:
+                for line in resp:
+                    yield resp.status, line
+            finally:
+                self._release(conn, resp)
+
+    def close(self) -> None:
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+class HTTPLLMClient:
+    """
+    Client for an OpenAI-compatible chat completions endpoint with pooled connections,
+    concurrent batching, a prompt-hash response cache and usage accounting.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        model: str = "gpt-4.1-mini",
+        api_key: Optional[str] = None,
+        temperature: float = 0.1,
+        max_concurrency: int = 8,
+        timeout: float = 60.0,
+        cache: Optional[Any] = None,
+    ):
+        self.model = model
+        self.api_key = api_key
+        self.temperature = temperature
+        self.max_concurrency = max_concurrency
+        self.pool = ConnectionPool(base_url, size=max_concurrency, timeout=timeout)
+        # Any cache.py backend; responses are keyed by a hash of model, parameters and prompt.
+        self.cache = cache
+        self.usage = LLMUsage()
+        self._usage_lock = threading.Lock()
+
+    def _cache_key(self, prompt: str) -> str:
+        blob = json.dumps([self.model, self.temperature, prompt], ensure_ascii=False)
+        return "llm|" + hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+    def _headers(self) -> Dict[str, str]:
+        headers = {"Content-Type": "application/json"}
+        if self.api_key:
+            headers["Authorization"] = f"Bearer {self.api_key}"
+        return headers
+
+    def _body(self, prompt: str, **extra: Any) -> bytes:
+        body = {
+            "model": self.model,
+            "temperature": self.temperature,
+            "messages": [{"role": "user", "content": prompt}],
+            **extra,
+        }
+        return json.dumps(body).encode("utf-8")
+
+    def _account(self, latency_s: float, usage: Optional[Dict[str, Any]] = None, error: bool = False) -> None:
+        with self._usage_lock:
+            self.usage.requests += 1
+            self.usage.latency_s += latency_s
+            self.usage.errors += error
+            if usage:
+                self.usage.prompt_tokens += int(usage.get("prompt_tokens", 0))
+                self.usage.completion_tokens += int(usage.get("completion_tokens", 0))
+
+    def invoke(self, prompt: str) -> str:
+        key = self._cache_key(prompt)
+        if self.cache is not None:
+            hit = self.cache.get(key)
+            if hit is not None:
+                with self._usage_lock:
+                    self.usage.cache_hits += 1
+                return hit[0]
+
+        started = time.perf_counter()
+        try:
+            status, data = self.pool.request("POST", "/chat/completions", self._body(prompt), self._headers())
+            if status >= 400:
+                raise LLMError(f"LLM endpoint returned HTTP {status}: {data[:200]!r}")
+            payload = json.loads(data)
+            text = payload["choices"][0]["message"]["content"]
+        except Exception:
+            self._account(time.perf_counter() - started, error=True)
+            raise
+        self._account(time.perf_counter() - started, payload.get("usage"))
+
+        if self.cache is not None:
+            self.cache.set(key, text, time.time())
+        return text
+
+    def stream(self, prompt: str) -> Iterator[str]:
+        """
+        Yield the completion incrementally as the server streams it (SSE). Cached prompts
+        are replayed in word-sized chunks. A stream that ends before its terminal event
+        ([DONE] or a finish_reason), e.g. on a dropped connection, raises LLMError after
+        the chunks received so far and is not cached; neither is an empty reply.
+        """
+        key = self._cache_key(prompt)
+        if self.cache is not None:
+            hit = self.cache.get(key)
+            if hit is not None:
+                with self._usage_lock:
+                    self.usage.cache_hits += 1
+                yield from chunk_text(hit[0])
+                return
+
+        started = time.perf_counter()
+        chunks: List[str] = []
+        usage: Optional[Dict[str, Any]] = None
+        complete = False
+        body = self._body(prompt, stream=True, stream_options={"include_usage": True})
+        try:
+            for status, line in self.pool.stream("POST", "/chat/completions", body, self._headers()):
+                if status >= 400:
+                    raise LLMError(f"LLM endpoint returned HTTP {status}: {line[:200]!r}")
+                line = line.strip()
+                if not line.startswith(b"data:"):
+                    continue
+                data = line[5:].strip()
+                if data == b"[DONE]":
+                    complete = True
+                    break
+                event = json.loads(data)
+                usage = event.get("usage") or usage
+                for choice in event.get("choices", []):
+                    complete = complete or bool(choice.get("finish_reason"))
+                    delta = (choice.get("delta") or {}).get("content")
+                    if delta:
+                        if not chunks:
+                            with self._usage_lock:
+                                self.usage.streams += 1
+                                self.usage.first_token_s += time.perf_counter() - started
+                        chunks.append(delta)
+                        yield delta
+        except Exception:
+            self._account(time.perf_counter() - started, error=True)
+            raise
+        if not complete:
+            self._account(time.perf_counter() - started, error=True)
+            raise LLMError("stream ended before completion")
+        self._account(time.perf_counter() - started, usage)
+
+        text = "".join(chunks)
+        if self.cache is not None and text:
+            self.cache.set(key, text, time.time())
+
+    def batch(self, prompts: List[str]) -> List[str]:
+        """Send prompts concurrently (bounded by max_concurrency); results keep input order."""
+        unique = list(dict.fromkeys(prompts))
+        with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(unique) or 1)) as executor:
+            answers = dict(zip(unique, executor.map(self.invoke, unique)))
+        return [answers[p] for p in prompts]
+
+    def close(self) -> None:
+        self.pool.close()
+
 
 def get_llm_client():
     """
     Future me yaha se real LLM connect hoga.
     Abhi ke liye DummyLLM return kar rahe hain, no API key needed.
+
+    With LLM_BASE_URL set (e.g. https://api.openai.com/v1 or a local stub server) an
+    HTTPLLMClient is returned instead, configured from LLM_MODEL, LLM_API_KEY and, for
+    an on-disk response cache, LLM_CACHE_DIR.
     """
-    if not LLM_AVAILABLE:
+    base_url = os.environ.get("LLM_BASE_URL")
+    if not base_url:
         return DummyLLM()
 
-    # Example future code (jab tum OpenAI use karna chaho):
-    # import os
-    # from dotenv import load_dotenv
-    # load_dotenv()
-    # api_key = os.getenv("OPENAI_API_KEY")
-    # return ChatOpenAI(model="gpt-4.1-mini", temperature=0.1, api_key=api_key)
-
-    # For Groq in future:
-    # return ChatGroq(model="llama-3.1-8b-instant", temperature=0.1, api_key=os.getenv("GROQ_API_KEY"))
+    cache_dir = os.environ.get("LLM_CACHE_DIR")
+    cache = DiskCacheBackend(os.path.join(cache_dir, "llm.sqlite")) if cache_dir else MemoryCacheBackend()
+    return HTTPLLMClient(
+        base_url,
+        model=os.environ.get("LLM_MODEL", "gpt-4.1-mini"),
+        api_key=os.environ.get("LLM_API_KEY"),
+        cache=cache,
+    )
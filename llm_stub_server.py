@@ -0,0 +1,175 @@
+# llm_stub_server.py
+
+"""
+Local deterministic stand-in for an OpenAI-compatible chat completions server, so the
+whole LLM path (pooling, batching, caching, accounting) runs offline in tests.
+
+    python llm_stub_server.py --port 8765
+    LLM_BASE_URL=http://127.0.0.1:8765/v1 streamlit run app.py
+
+The reply to a prompt is always the same: "stub:" followed by a short hash and the
+prompt's first words. Token counts are whitespace word counts. Requests with
+"stream": true get the reply as server-sent events, one word per chunk.
+"""
+
+import argparse
+import hashlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional
+
+
+def stub_reply(prompt: str) -> str:
+    digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:8]
+    return f"stub:{digest} " + " ".join(prompt.split()[:12])
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, so client connection pooling is exercised
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def _send_json(self, status: int, payload: Dict[str, Any]) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _stream_reply(self, server: "StubLLMServer", prompt: str, reply: str) -> None:
+        # Server-sent events, one word per chunk, then a usage chunk and [DONE]
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        def event(payload: Dict[str, Any]) -> None:
+            self.wfile.write(b"data: " + json.dumps(payload).encode("utf-8") + b"\n\n")
+            self.wfile.flush()
+
+        words = reply.split(" ")
+        for i, word in enumerate(words):
+            if server.drop_stream_after is not None and i == server.drop_stream_after:
+                return  # connection closes mid-stream, without usage or [DONE]
+            if server.token_latency_s:
+                time.sleep(server.token_latency_s)
+            delta = word if i == len(words) - 1 else word + " "
+            event({"object": "chat.completion.chunk", "choices": [{"index": 0, "delta": {"content": delta}}]})
+        event(
+            {
+                "object": "chat.completion.chunk",
+                "choices": [],
+                "usage": {"prompt_tokens": len(prompt.split()), "completion_tokens": len(words)},
+            }
+        )
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+    def do_POST(self) -> None:
+        server: "StubLLMServer" = self.server.stub  # type: ignore[attr-defined]
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        if not self.path.endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": f"unknown path {self.path}"}})
+            return
+
+        prompt = "\n".join(m.get("content", "") for m in request.get("messages", []))
+        server.record(prompt)
+        if server.latency_s:
+            time.sleep(server.latency_s)
+        reply = stub_reply(prompt)
+        if request.get("stream"):
+            self._stream_reply(server, prompt, reply)
+            return
+        self._send_json(
+            200,
+            {
+                "id": "stub-" + hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:12],
+                "object": "chat.completion",
+                "model": request.get("model", "stub"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": reply}, "finish_reason": "stop"}],
+                "usage": {
+                    "prompt_tokens": len(prompt.split()),
+                    "completion_tokens": len(reply.split()),
+                    "total_tokens": len(prompt.split()) + len(reply.split()),
+                },
+            },
+        )
+
+
+class StubLLMServer:
+    """
+    Threaded stub server on 127.0.0.1; use as a context manager to run it in the background.
+    `requests` counts the prompts it has answered.
+    """
+
+    def __init__(
+        self,
+        port: int = 0,
+        latency_s: float = 0.0,
+        token_latency_s: float = 0.0,
+        drop_stream_after: Optional[int] = None,
+    ):
+        self.latency_s = latency_s
+        self.token_latency_s = token_latency_s
+        # Cut streamed replies off after this many chunks (simulates a dropped connection)
+        self.drop_stream_after = drop_stream_after
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", port), _Handler)
+        self._httpd.daemon_threads = True
+        self._httpd.stub = self  # type: ignore[attr-defined]
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def record(self, prompt: str) -> None:
+        with self._lock:
+            self.requests += 1
+
+    def serve_forever(self) -> None:
+        try:
+            self._httpd.serve_forever()
+        finally:
+            self._httpd.server_close()
+
+    def start(self) -> "StubLLMServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="llm-stub", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self) -> "StubLLMServer":
+        return self.start()
+
+    def __exit__(self, *exc: Any) -> None:
+        self.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Deterministic OpenAI-compatible stub LLM server.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="artificial delay per request, seconds")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="delay per streamed word, seconds")
+    args = parser.parse_args()
+    server = StubLLMServer(port=args.port, latency_s=args.latency, token_latency_s=args.token_latency)
+    print(f"Stub LLM listening on {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,202 @@
+# resilience.py
+
+"""
+Tail-latency and failure controls for worker agent calls.
+
+- deadline_budgets: per-agent time budgets derived from one end-to-end query SLA,
+  keeping a reserve for the synthesis steps that run after the agents.
+- bounded_call / ahedged: enforce a call's deadline and, for idempotent lookups,
+  start a backup attempt when the first one is slower than a delay and take
+  whichever finishes first.
+- CircuitBreaker: after repeated failures (errors or overrun deadlines) calls to a
+  backend are refused for a cool-down period, so the caller can serve a degraded
+  section at once instead of waiting on a backend that is down. After the cool-down
+  a single trial call decides whether the circuit closes again.
+"""
+
+import asyncio
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, TypeVar
+
+T = TypeVar("T")
+
+# Share of the query SLA kept for the unmet-needs synthesis and hypothesis
+SYNTHESIS_RESERVE = 0.2
+
+
+def deadline_budgets(
+    sla_s: float, keys: Iterable[str], shares: Optional[Dict[str, float]] = None, reserve: float = SYNTHESIS_RESERVE
+) -> Dict[str, float]:
+    """
+    Seconds each agent may take so the whole query fits in sla_s. Agents run
+    concurrently, so each gets the agent phase (sla_s minus the reserve) scaled by its
+    share (default 1.0).
+    """
+    phase = sla_s * (1.0 - reserve)
+    shares = shares or {}
+    return {key: phase * shares.get(key, 1.0) for key in keys}
+
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+
+# Bounded and hedged attempts run here, so the caller can stop waiting on them
+_CALL_POOL = ThreadPoolExecutor(max_workers=32, thread_name_prefix="bounded-call")
+
+
+def bounded_call(
+    fn: Callable[[], T],
+    timeout_s: Optional[float] = None,
+    hedge_after_s: Optional[float] = None,
+    on_hedge: Optional[Callable[[], None]] = None,
+) -> T:
+    """
+    fn() with an optional deadline and one optional hedge. Past timeout_s raises
+    DeadlineExceeded (the attempt is abandoned, not killed). If fn() has not returned
+    after hedge_after_s a second attempt starts and the first success wins; only hedge
+    idempotent calls. Errors are not retried: the first one is raised once no attempt
+    is left. With neither limit set, fn runs inline.
+    """
+    if timeout_s is None and hedge_after_s is None:
+        return fn()
+    started = time.monotonic()
+    deadline = None if timeout_s is None else started + timeout_s
+    hedge_at = None if hedge_after_s is None else started + hedge_after_s
+    pending = {_CALL_POOL.submit(fn)}
+    error: Optional[BaseException] = None
+    while pending:
+        marks = [t for t in (deadline, hedge_at) if t is not None]
+        wait_s = max(0.0, min(marks) - time.monotonic()) if marks else None
+        done, pending = wait(pending, timeout=wait_s, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                for other in pending:
+                    other.cancel()
+                return future.result()
+            error = error or future.exception()
+        if not pending:
+            break
+        now = time.monotonic()
+        if deadline is not None and now >= deadline:
+            for future in pending:
+                future.cancel()
+            raise DeadlineExceeded(f"timed out after {timeout_s:g}s")
+        if hedge_at is not None and now >= hedge_at:
+            hedge_at = None
+            if on_hedge is not None:
+                on_hedge()
+            pending.add(_CALL_POOL.submit(fn))
+    raise error
+
+
+async def ahedged(
+    fn: Callable[[], Awaitable[T]], delay_s: float, on_hedge: Optional[Callable[[], None]] = None
+) -> T:
+    """
+    Await fn() hedged once after delay_s (see bounded_call); the losing attempt is
+    cancelled. Deadlines are left to asyncio.wait_for.
+    """
+    first = asyncio.ensure_future(fn())
+    done, _ = await asyncio.wait({first}, timeout=delay_s)
+    if done:
+        return first.result()
+    if on_hedge is not None:
+        on_hedge()
+    pending = {first, asyncio.ensure_future(fn())}
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+        return first.result()
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure breaker: closed -> open after failure_threshold failures,
+    open -> half-open after reset_after_s, half-open -> closed on a successful trial
+    call (or open again on a failed one).
+    """
+
+    def __init__(
+        self, failure_threshold: int = 3, reset_after_s: float = 30.0, clock: Callable[[], float] = time.monotonic
+    ):
+        self.failure_threshold = failure_threshold
+        self.reset_after_s = reset_after_s
+        self.clock = clock
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.last_error = ""
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state()
+
+    def _state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half_open" if self.clock() - self.opened_at >= self.reset_after_s else "open"
+
+    def allow(self) -> bool:
+        """Whether a call may go ahead now; in half-open state only one trial call at a time."""
+        with self._lock:
+            state = self._state()
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._probing = False
+
+    def record_failure(self, reason: str = "") -> None:
+        with self._lock:
+            self.failures += 1
+            self.last_error = reason
+            if self._probing or self.failures >= self.failure_threshold:
+                self.opened_at = self.clock()
+            self._probing = False
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"state": self._state(), "failures": self.failures, "last_error": self.last_error}
+
+
+class CircuitBreakers:
+    """One CircuitBreaker per backend name, created on first use; share one per process."""
+
+    def __init__(
+        self, failure_threshold: int = 3, reset_after_s: float = 30.0, clock: Callable[[], float] = time.monotonic
+    ):
+        self.failure_threshold = failure_threshold
+        self.reset_after_s = reset_after_s
+        self.clock = clock
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def get(self, name: str) -> CircuitBreaker:
+        with self._lock:
+            breaker = self._breakers.get(name)
+            if breaker is None:
+                breaker = self._breakers[name] = CircuitBreaker(self.failure_threshold, self.reset_after_s, self.clock)
+            return breaker
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            breakers = dict(self._breakers)
+        return {name: b.snapshot() for name, b in sorted(breakers.items())}
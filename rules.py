@@ -0,0 +1,173 @@
+# rules.py
+
+"""
+Declarative unmet-needs rules and their compiled single-pass matcher.
+
+Each rule maps keywords (case-insensitive substrings) or a regex to an unmet need and
+is scoped to the text sources it applies to. Per source, a table with more than
+SMALL_TABLE_KEYWORDS keywords has them compiled into one trie-shaped regex that is
+tried at every position of the text in a single scan, so the cost per snippet grows
+with its length rather than with the number of rules. Smaller tables, including the
+shipped one, use one substring check per keyword, which is cheaper there. A source's
+regex rules are combined into one pattern that filters out snippets none of them
+match; only the other snippets are checked rule by rule. derive() also stops reading
+a source once every rule of that source has fired; with the shipped table that early
+exit saves most of the work.
+Adding a rule is a table edit, not a code change.
+"""
+
+import hashlib
+import json
+import re
+from dataclasses import astuple, dataclass
+from typing import Dict, Iterable, List, Optional, Pattern, Sequence, Tuple
+
+
+@dataclass(frozen=True)
+class UnmetNeedRule:
+    need: str
+    sources: Tuple[str, ...]
+    keywords: Tuple[str, ...] = ()
+    regex: Optional[str] = None
+
+
+# Text sources: field notes from InternalKnowledgeAgent, forum posts from WebIntelligenceAgent.
+UNMET_NEED_RULES: List[UnmetNeedRule] = [
+    UnmetNeedRule("Reduce dizziness / CNS side effects.", ("field_feedback",), keywords=("dizziness",)),
+    UnmetNeedRule("Improve adherence in elderly / complex regimens.", ("field_feedback",), keywords=("adherence",)),
+    UnmetNeedRule("Design regimen better suited to elderly patients.", ("field_feedback",), keywords=("elderly",)),
+    UnmetNeedRule(
+        "Target neuropathic pain in diabetic patients more specifically.", ("field_feedback",), keywords=("diabet",)
+    ),
+    UnmetNeedRule(
+        "Minimize daytime sedation while maintaining pain relief.",
+        ("patient_forum_highlights",),
+        keywords=("sleepy", "sedation"),
+    ),
+]
+
+
+def _trie_regex(words: Iterable[str]) -> str:
+    """Regex equivalent to an alternation of words, factored into a prefix trie."""
+    trie: Dict[str, dict] = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def build(node: Dict[str, dict]) -> str:
+        terminal = "" in node
+        branches = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ""
+        if len(branches) == 1 and not terminal:
+            return branches[0]
+        group = "(?:" + "|".join(branches) + ")"
+        return group + "?" if terminal else group
+
+    return build(trie)
+
+
+# Up to this many keywords, per-keyword substring checks (each a C-level scan) beat
+# the per-position trie scan; above it the single pass wins (see
+# benchmarks/bench_unmet_rules.py).
+SMALL_TABLE_KEYWORDS = 16
+
+
+_BACKREFERENCE = re.compile(r"\\\d|\(\?P=")
+
+
+def _any_regex(patterns: Sequence[str]) -> Optional[Pattern[str]]:
+    # One pattern matching wherever any of patterns does; None when they cannot be
+    # combined (a backreference would point into another pattern's groups)
+    if len(patterns) < 2 or any(_BACKREFERENCE.search(p) for p in patterns):
+        return None
+    try:
+        return re.compile("|".join(f"(?:{p})" for p in patterns), re.IGNORECASE)
+    except re.error:
+        return None
+
+
+class _SourceMatcher:
+    def __init__(self, rules: Sequence[Tuple[int, UnmetNeedRule]], small_table_keywords: int = SMALL_TABLE_KEYWORDS):
+        rules_by_keyword: Dict[str, List[int]] = {}
+        for index, rule in rules:
+            for kw in rule.keywords:
+                rules_by_keyword.setdefault(kw.lower(), []).append(index)
+        # The greedy trie match is the longest keyword starting at a position; every
+        # keyword that is a prefix of it matched there too.
+        self.hits: Dict[str, Tuple[int, ...]] = {
+            kw: tuple(sorted({i for j in range(1, len(kw) + 1) for i in rules_by_keyword.get(kw[:j], ())}))
+            for kw in rules_by_keyword
+        }
+        self.rule_ids = frozenset(index for index, _ in rules)
+        self.small: Optional[List[Tuple[str, Tuple[int, ...]]]] = None
+        self.keywords: Optional[Pattern[str]] = None
+        if len(rules_by_keyword) <= small_table_keywords:
+            self.small = list(self.hits.items())
+        else:
+            self.keywords = re.compile("(?=(" + _trie_regex(rules_by_keyword) + "))")
+        self.regexes: List[Tuple[int, Pattern[str]]] = [
+            (index, re.compile(rule.regex, re.IGNORECASE)) for index, rule in rules if rule.regex
+        ]
+        self.any_regex = _any_regex([rule.regex for _, rule in rules if rule.regex])
+
+    def match(self, text: str) -> List[int]:
+        found = set()
+        if self.small is not None:
+            lowered = text.lower()
+            for kw, ids in self.small:
+                if kw in lowered:
+                    found.update(ids)
+        elif self.keywords is not None:
+            hits = self.hits
+            for kw in set(self.keywords.findall(text.lower())):
+                found.update(hits[kw])
+        if self.regexes and (self.any_regex is None or self.any_regex.search(text)):
+            for index, pattern in self.regexes:
+                if pattern.search(text):
+                    found.add(index)
+        return sorted(found)
+
+
+class CompiledRuleSet:
+    """
+    Rule table compiled into one matcher per source. derive() reproduces the legacy
+    ordering: sources in table order, texts in order, rules in table order per text,
+    duplicates dropped.
+    """
+
+    def __init__(self, rules: Sequence[UnmetNeedRule], small_table_keywords: int = SMALL_TABLE_KEYWORDS):
+        self.rules = list(rules)
+        self.sources: List[str] = list(dict.fromkeys(s for rule in self.rules for s in rule.sources))
+        self._matchers = {
+            source: _SourceMatcher(
+                [(i, r) for i, r in enumerate(self.rules) if source in r.sources], small_table_keywords
+            )
+            for source in self.sources
+        }
+        # Content hash of the table: equal tables built separately share memoized results
+        blob = json.dumps([astuple(rule) for rule in self.rules], ensure_ascii=False)
+        self.fingerprint = hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+    def match(self, source: str, text: str) -> List[str]:
+        matcher = self._matchers.get(source)
+        return [self.rules[i].need for i in matcher.match(text)] if matcher else []
+
+    def derive(self, texts_by_source: Dict[str, Iterable[str]]) -> List[str]:
+        needs: List[str] = []
+        for source in self.sources:
+            matcher = self._matchers[source]
+            fired = set()
+            for text in texts_by_source.get(source, ()):
+                ids = matcher.match(text)
+                needs.extend(self.rules[i].need for i in ids)
+                fired.update(ids)
+                if len(fired) == len(matcher.rule_ids):
+                    # Every rule of this source has fired; later texts only add duplicates.
+                    break
+        return list(dict.fromkeys(needs))
+
+
+DEFAULT_RULESET = CompiledRuleSet(UNMET_NEED_RULES)
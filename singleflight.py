@@ -0,0 +1,108 @@
+# singleflight.py
+
+"""
+Request coalescing ("single flight") for identical concurrent calls.
+
+While a call for a key is in flight, later callers with the same key wait for it and
+receive its result (or exception) instead of starting their own. Nothing is kept once
+the call completes, so unlike a cache a coalesced result is never older than the
+request that receives it. Share one SingleFlight per process (e.g. across Streamlit
+sessions) so that simultaneous searches for a molecule hit each backend once.
+"""
+
+import asyncio
+import threading
+from concurrent.futures import Future, wait
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """Per-key coalescing of sync and async calls, with per-namespace counters."""
+
+    def __init__(self):
+        self._flights: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        # namespace (key up to the first "|") -> [calls, executed, coalesced]
+        self._counts: Dict[str, list] = {}
+
+    def _join(self, key: str) -> Tuple[Future, bool]:
+        namespace = key.split("|", 1)[0]
+        with self._lock:
+            counts = self._counts.setdefault(namespace, [0, 0, 0])
+            counts[0] += 1
+            future = self._flights.get(key)
+            if future is None:
+                future = self._flights[key] = Future()
+                counts[1] += 1
+                return future, True
+            counts[2] += 1
+            return future, False
+
+    def _land(self, key: str, future: Future) -> None:
+        # Later callers start a new flight once this one is done
+        with self._lock:
+            if self._flights.get(key) is future:
+                del self._flights[key]
+
+    def do(self, key: str, fn: Callable[[], T], timeout_s: Optional[float] = None) -> Tuple[T, bool]:
+        """
+        fn()'s result, computed once per in-flight key; also whether it was shared. A
+        caller waiting on another's call gives up after timeout_s with TimeoutError
+        (the call itself goes on).
+        """
+        future, leader = self._join(key)
+        if not leader:
+            if not wait([future], timeout_s).done:
+                raise TimeoutError(f"timed out after {timeout_s:g}s waiting for a coalesced call")
+            return future.result(), True
+        try:
+            value = fn()
+        except BaseException as exc:
+            self._land(key, future)
+            future.set_exception(exc)
+            raise
+        self._land(key, future)
+        future.set_result(value)
+        return value, False
+
+    async def ado(self, key: str, fn: Callable[[], Awaitable[T]]) -> Tuple[T, bool]:
+        """
+        Async do(): the leader awaits fn() on its own event loop, callers from any loop
+        or thread await its outcome. A waiter's cancellation never cancels the leader.
+        """
+        future, leader = self._join(key)
+        if not leader:
+            return await asyncio.shield(asyncio.wrap_future(future)), True
+        try:
+            value = await fn()
+        except asyncio.CancelledError:
+            self._land(key, future)
+            future.set_exception(RuntimeError(f"coalesced call {key!r} was cancelled"))
+            raise
+        except BaseException as exc:
+            self._land(key, future)
+            future.set_exception(exc)
+            raise
+        self._land(key, future)
+        future.set_result(value)
+        return value, False
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counts = {ns: list(c) for ns, c in self._counts.items()}
+            in_flight = len(self._flights)
+        return {
+            "calls": sum(c[0] for c in counts.values()),
+            "executed": sum(c[1] for c in counts.values()),
+            "coalesced": sum(c[2] for c in counts.values()),
+            "in_flight": in_flight,
+            "by_namespace": {
+                ns: {"calls": c[0], "executed": c[1], "coalesced": c[2]} for ns, c in sorted(counts.items())
+            },
+        }
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self._counts.clear()
@@ -0,0 +1,3 @@
+"""
+Local on-disk data stores the worker agents query instead of their mock data.
+"""
@@ -0,0 +1,233 @@
+# stores/documents.py
+
+"""
+On-disk inverted index with BM25 ranking over the internal document corpus (field
+notes, strategic briefs, ...).
+
+One SQLite file holds the documents, a postings table keyed by (term, molecule, kind,
+doc_id) and per-term document frequencies. A search reads only the postings of its
+query terms within the requested molecule (and kind) scope, so its cost follows those
+posting lists rather than the corpus size. Documents are added or replaced incrementally by
+name; the frequencies and corpus statistics BM25 needs are updated in the same
+transaction.
+"""
+
+import heapq
+import math
+import os
+import re
+import sqlite3
+import threading
+from collections import Counter
+from operator import itemgetter
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from cache import normalize_key_part
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+_SENTENCE = re.compile(r"(?<=[.!?])\s+")
+
+STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have in into is it its of on or that the "
+    "their there this to was were will with".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    return [t for t in _TOKEN.findall(text.lower()) if t not in STOPWORDS]
+
+
+def best_snippet(text: str, terms: Iterable[str], max_chars: int = 240) -> str:
+    """The sentence of text sharing the most terms with the query."""
+    wanted = set(terms)
+    sentences = [s for s in _SENTENCE.split(text.strip()) if s]
+    if not sentences:
+        return ""
+    best = max(sentences, key=lambda s: len(wanted.intersection(tokenize(s))))
+    return best if len(best) <= max_chars else best[: max_chars - 3].rstrip() + "..."
+
+
+class DocumentIndex:
+    """
+    BM25 (k1, b) search scoped by molecule. Documents with an empty molecule are
+    general (e.g. portfolio strategy) and match every molecule's searches.
+    """
+
+    def __init__(self, path: str, k1: float = 1.2, b: float = 0.75):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(
+            """
+            PRAGMA journal_mode = WAL;
+            CREATE TABLE IF NOT EXISTS docs (
+                id INTEGER PRIMARY KEY,
+                name TEXT UNIQUE NOT NULL,
+                molecule TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                summary TEXT NOT NULL,
+                text TEXT NOT NULL,
+                length INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS postings (
+                term TEXT NOT NULL,
+                molecule TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                doc_id INTEGER NOT NULL,
+                tf INTEGER NOT NULL,
+                length INTEGER NOT NULL,
+                PRIMARY KEY (term, molecule, kind, doc_id)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS postings_doc ON postings (doc_id);
+            CREATE TABLE IF NOT EXISTS terms (term TEXT PRIMARY KEY, df INTEGER NOT NULL) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS corpus (id INTEGER PRIMARY KEY CHECK (id = 0), docs INTEGER, tokens INTEGER);
+            INSERT OR IGNORE INTO corpus VALUES (0, 0, 0);
+            """
+        )
+        self._conn.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT docs FROM corpus").fetchone()[0]
+
+    def _remove(self, doc_id: int, length: int) -> None:
+        terms = [r[0] for r in self._conn.execute("SELECT DISTINCT term FROM postings WHERE doc_id = ?", (doc_id,))]
+        self._conn.execute("DELETE FROM postings WHERE doc_id = ?", (doc_id,))
+        self._conn.executemany("UPDATE terms SET df = df - 1 WHERE term = ?", [(t,) for t in terms])
+        self._conn.execute("DELETE FROM docs WHERE id = ?", (doc_id,))
+        self._conn.execute("UPDATE corpus SET docs = docs - 1, tokens = tokens - ?", (length,))
+
+    def _flush(self, postings: List[Tuple[Any, ...]], df: Counter) -> None:
+        postings.sort(key=itemgetter(0))  # by term, so the batch lands in neighbouring B-tree pages
+        self._conn.executemany(
+            "INSERT INTO postings (term, molecule, kind, doc_id, tf, length) VALUES (?, ?, ?, ?, ?, ?)", postings
+        )
+        self._conn.executemany(
+            "INSERT INTO terms (term, df) VALUES (?, ?) ON CONFLICT(term) DO UPDATE SET df = df + excluded.df",
+            df.items(),
+        )
+        postings.clear()
+        df.clear()
+
+    def add_documents(self, documents: Iterable[Dict[str, Any]], batch_size: int = 1000) -> int:
+        """
+        Add or replace documents (keys: name, text, and optionally molecule, kind,
+        summary), all in one transaction. Returns the number of documents written.
+        """
+        count = 0
+        postings: List[Tuple[Any, ...]] = []
+        df: Counter = Counter()
+        with self._lock, self._conn:
+            for doc in documents:
+                name, text = str(doc["name"]), str(doc["text"])
+                molecule = normalize_key_part(doc.get("molecule") or "")
+                kind = str(doc.get("kind") or "")
+                tokens = tokenize(text)
+                old = self._conn.execute("SELECT id, length FROM docs WHERE name = ?", (name,)).fetchone()
+                if old is not None:
+                    self._flush(postings, df)  # the old version may still be pending
+                    self._remove(*old)
+                doc_id = self._conn.execute(
+                    "INSERT INTO docs (name, molecule, kind, summary, text, length) VALUES (?, ?, ?, ?, ?, ?)",
+                    (name, molecule, kind, str(doc.get("summary") or ""), text, len(tokens)),
+                ).lastrowid
+                tf = Counter(tokens)
+                postings.extend((term, molecule, kind, doc_id, n, len(tokens)) for term, n in tf.items())
+                df.update(tf.keys())
+                self._conn.execute("UPDATE corpus SET docs = docs + 1, tokens = tokens + ?", (len(tokens),))
+                count += 1
+                if count % batch_size == 0:
+                    self._flush(postings, df)
+            self._flush(postings, df)
+        return count
+
+    def search(
+        self, query: str, molecule: Optional[str] = None, k: int = 5, kinds: Optional[Sequence[str]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Top-k documents for query by BM25, most relevant first. With molecule, only that
+        molecule's documents and general ones are considered; kinds narrows document types.
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+        placeholders = ",".join("?" * len(terms))
+        sql = f"SELECT p.term, p.doc_id, p.tf, p.length FROM postings p WHERE p.term IN ({placeholders})"
+        params: List[Any] = list(terms)
+        if molecule is not None:
+            sql += " AND p.molecule IN (?, '')"
+            params.append(normalize_key_part(molecule))
+        if kinds:
+            sql += f" AND p.kind IN ({','.join('?' * len(kinds))})"
+            params.extend(kinds)
+
+        # One read transaction: statistics, postings and documents come from the same
+        # snapshot even while add_documents replaces documents (here or in another process)
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                n_docs, n_tokens = self._conn.execute("SELECT docs, tokens FROM corpus").fetchone()
+                df = dict(self._conn.execute(f"SELECT term, df FROM terms WHERE term IN ({placeholders})", terms))
+                postings = self._conn.execute(sql, params).fetchall()
+                ranked = self._rank(terms, postings, n_docs, n_tokens, df, k)
+                ids = [doc_id for doc_id, _ in ranked]
+                rows = (
+                    self._conn.execute(
+                        f"SELECT id, name, molecule, kind, summary, text FROM docs WHERE id IN ({','.join('?' * len(ids))})",
+                        ids,
+                    ).fetchall()
+                    if ids
+                    else []
+                )
+            finally:
+                self._conn.execute("COMMIT")
+        docs = {row[0]: row for row in rows}
+        hits = []
+        for doc_id, score in ranked:
+            if doc_id not in docs:
+                continue
+            _, name, doc_molecule, kind, summary, text = docs[doc_id]
+            hits.append(
+                {
+                    "doc": name,
+                    "molecule": doc_molecule,
+                    "kind": kind,
+                    "summary": summary,
+                    "snippet": best_snippet(text, terms),
+                    "score": round(score, 4),
+                }
+            )
+        return hits
+
+    def _rank(
+        self,
+        terms: List[str],
+        postings: List[Tuple[str, int, int, int]],
+        n_docs: int,
+        n_tokens: int,
+        df: Dict[str, int],
+        k: int,
+    ) -> List[Tuple[int, float]]:
+        # BM25 over the matched postings; the k best (doc_id, score) pairs
+        avg_len = n_tokens / n_docs if n_docs else 1.0
+        idf = {t: math.log(1 + (n_docs - df.get(t, 0) + 0.5) / (df.get(t, 0) + 0.5)) for t in terms}
+        scores: Dict[int, float] = {}
+        for term, doc_id, tf, length in postings:
+            norm = tf + self.k1 * (1 - self.b + self.b * length / avg_len)
+            scores[doc_id] = scores.get(doc_id, 0.0) + idf[term] * tf * (self.k1 + 1) / norm
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def build_document_index() -> Optional[DocumentIndex]:
+    """Index at $AGENT_DATA_DIR/documents.sqlite when AGENT_DATA_DIR is set, otherwise None."""
+    data_dir = os.environ.get("AGENT_DATA_DIR")
+    if not data_dir:
+        return None
+    os.makedirs(data_dir, exist_ok=True)
+    return DocumentIndex(os.path.join(data_dir, "documents.sqlite"))
@@ -0,0 +1,205 @@
+# stores/market.py
+
+"""
+Partitioned, memory-mapped store for the licensed IQVIA (sales) and EXIM (trade) drops.
+
+Each dataset is a directory of uncompressed Arrow IPC files in a hive layout,
+
+    <root>/iqvia/molecule=pregabalin/geography=us/part-<id>-0.arrow
+
+so a lookup for one molecule and geography opens only that partition's files, and
+does so through memory maps: pages are read on demand by the OS and shared between
+processes instead of being copied into each one. Partition values are normalized
+like cache keys ('Pregabalin ' and 'pregabalin' are the same molecule).
+"""
+
+import os
+import threading
+import uuid
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
+import pyarrow.dataset as ds
+from pyarrow import fs
+
+from cache import normalize_key_part
+
+PARTITION_KEYS = ("molecule", "geography")
+# Rewritten by every ingest; a changed stamp on it tells stores in other processes to
+# rediscover the dataset's files. Discovery skips names starting with "_".
+MANIFEST = "_ingest"
+
+# Columns of each dataset; CSV drops must have at least these (extra columns are ignored).
+SCHEMAS: Dict[str, pa.Schema] = {
+    "iqvia": pa.schema(
+        [
+            ("molecule", pa.string()),
+            ("geography", pa.string()),
+            ("indication", pa.string()),
+            ("year", pa.int32()),
+            ("sales_usd_mn", pa.float64()),
+        ]
+    ),
+    "exim": pa.schema(
+        [
+            ("molecule", pa.string()),
+            ("geography", pa.string()),
+            ("country", pa.string()),
+            ("price_usd_per_kg", pa.float64()),
+            ("volume_kg", pa.float64()),
+        ]
+    ),
+}
+
+
+def _normalize(column: Union[pa.Array, ds.Expression]) -> Union[pa.Array, ds.Expression]:
+    # Vectorized normalize_key_part() (trim, collapse whitespace, lower-case), on an
+    # array at ingest or on a column in a scan filter
+    column = pc.replace_substring_regex(pc.utf8_trim_whitespace(column), r"\s+", " ")
+    return pc.utf8_lower(column)
+
+
+class MarketDataStore:
+    def __init__(self, root: str):
+        self.root = root
+        self._fs = fs.LocalFileSystem(use_mmap=True)
+        # name -> (manifest stamp, file listing) of the last discovery
+        self._datasets: Dict[str, Tuple[Optional[Tuple[int, int]], Optional[ds.Dataset]]] = {}
+        self._lock = threading.Lock()
+
+    def _path(self, name: str) -> str:
+        if name not in SCHEMAS:
+            raise ValueError(f"unknown dataset {name!r}; expected one of {sorted(SCHEMAS)}")
+        return os.path.join(self.root, name)
+
+    @staticmethod
+    def _stamp(path: str) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(os.path.join(path, MANIFEST))
+        except FileNotFoundError:
+            return None
+        return st.st_ino, st.st_mtime_ns
+
+    def dataset(self, name: str) -> Optional[ds.Dataset]:
+        """
+        The dataset's file listing, reused until an ingest (from any process) rewrites
+        its manifest; None before any ingest.
+        """
+        path = self._path(name)
+        stamp = self._stamp(path)
+        with self._lock:
+            cached = self._datasets.get(name)
+            if cached is None or cached[0] != stamp:
+                self._datasets[name] = stamp, (
+                    ds.dataset(
+                        path,
+                        schema=SCHEMAS[name],
+                        format="ipc",
+                        partitioning="hive",
+                        filesystem=self._fs,
+                    )
+                    if os.path.isdir(path)
+                    else None
+                )
+            return self._datasets[name][1]
+
+    def _forget(self, name: str) -> None:
+        with self._lock:
+            self._datasets.pop(name, None)
+
+    def _filter(self, molecule: str, geography: str, **equals: str) -> ds.Expression:
+        expr = (ds.field("molecule") == normalize_key_part(molecule)) & (
+            ds.field("geography") == normalize_key_part(geography)
+        )
+        for column, value in equals.items():
+            expr &= _normalize(ds.field(column)) == normalize_key_part(value)
+        return expr
+
+    def files(self, name: str, molecule: str, geography: str) -> List[str]:
+        """Files a lookup for molecule and geography reads (the partition pruning result)."""
+        dataset = self.dataset(name)
+        if dataset is None:
+            return []
+        return [f.path for f in dataset.get_fragments(filter=self._filter(molecule, geography))]
+
+    def query(
+        self,
+        name: str,
+        molecule: str,
+        geography: str,
+        columns: Optional[Sequence[str]] = None,
+        **equals: str,
+    ) -> pd.DataFrame:
+        """
+        Rows for molecule and geography, optionally narrowed by column equality under
+        key normalization (e.g. indication="neuropathic pain" matches " Neuropathic  Pain"). Partition keys prune files; the
+        remaining predicates and the column projection are pushed into the scan.
+        """
+        for attempt in range(2):
+            dataset = self.dataset(name)
+            if dataset is None:
+                return pd.DataFrame(columns=list(columns or SCHEMAS[name].names))
+            try:
+                table = dataset.to_table(
+                    columns=list(columns) if columns else None, filter=self._filter(molecule, geography, **equals)
+                )
+            except FileNotFoundError:
+                # Files replaced by an ingest still writing its manifest: rediscover once
+                if attempt:
+                    raise
+                self._forget(name)
+                continue
+            return table.to_pandas()
+
+    def ingest_csv(self, name: str, csv_path: str, replace: bool = False, block_size: int = 16 << 20) -> int:
+        """
+        Append a raw CSV drop to a dataset, streaming it block by block so the drop never
+        has to fit in memory. With replace, the molecule/geography partitions present in
+        the drop are cleared first (a restated drop). Returns the number of rows written.
+        """
+        schema = SCHEMAS[name]
+        reader = pa_csv.open_csv(
+            csv_path,
+            read_options=pa_csv.ReadOptions(block_size=block_size),
+            convert_options=pa_csv.ConvertOptions(
+                column_types={f.name: f.type for f in schema}, include_columns=schema.names
+            ),
+        )
+        rows = 0
+
+        def batches() -> Iterator[pa.RecordBatch]:
+            nonlocal rows
+            for batch in reader:
+                columns = [
+                    _normalize(batch.column(f.name)) if f.name in PARTITION_KEYS else batch.column(f.name)
+                    for f in schema
+                ]
+                rows += batch.num_rows
+                yield pa.RecordBatch.from_arrays(columns, schema=schema)
+
+        ds.write_dataset(
+            ds.Scanner.from_batches(batches(), schema=schema),
+            self._path(name),
+            format="ipc",
+            partitioning=ds.partitioning(pa.schema([schema.field(k) for k in PARTITION_KEYS]), flavor="hive"),
+            basename_template=f"part-{uuid.uuid4().hex}-{{i}}.arrow",
+            existing_data_behavior="delete_matching" if replace else "overwrite_or_ignore",
+        )
+        manifest = os.path.join(self._path(name), MANIFEST)
+        with open(manifest + ".tmp", "w") as f:
+            f.write(uuid.uuid4().hex)
+        os.replace(manifest + ".tmp", manifest)  # new inode: a new stamp for every store
+        self._forget(name)
+        return rows
+
+
+def build_market_store() -> Optional[MarketDataStore]:
+    """
+    Store under $AGENT_DATA_DIR/market when AGENT_DATA_DIR is set, otherwise None (the
+    agents then serve their built-in sample data).
+    """
+    data_dir = os.environ.get("AGENT_DATA_DIR")
+    return MarketDataStore(os.path.join(data_dir, "market")) if data_dir else None
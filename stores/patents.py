@@ -0,0 +1,277 @@
+# stores/patents.py
+
+"""
+Patent store for freedom-to-operate (FTO) questions over a local patent dump.
+
+Patents live in SQLite, indexed by molecule, assignee and expiry date. "Which claims
+are in force on date X" is a stabbing query over [filing_date, expiry_date]
+intervals, answered by a per-molecule interval tree built on first use and dropped
+when that molecule's patents change.
+
+FTO scores are precomputed per molecule into the `fto` table and refreshed only for
+the molecules an ingest touched. A score also records the last date it holds (the
+next expiry among the in-force patents, or the eve of the next filing); a lookup
+after that date recomputes just that molecule. A query is therefore a keyed lookup,
+not a scan.
+"""
+
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from datetime import date
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from cache import normalize_key_part
+
+# Blocking weight of an in-force claim by type; a compound claim alone blocks entry.
+CLAIM_WEIGHTS: Dict[str, float] = {
+    "compound": 1.0,
+    "use": 0.6,
+    "formulation": 0.4,
+    "process": 0.2,
+}
+DEFAULT_CLAIM_WEIGHT = 0.3
+
+# Score thresholds for the reported risk label, highest first.
+RISK_LEVELS: Sequence[Tuple[float, str]] = ((0.8, "High"), (0.4, "Moderate"), (0.0, "Low"))
+
+PATENT_COLUMNS = ("publication", "family", "molecule", "assignee", "title", "claim_type", "filing_date", "expiry_date")
+
+
+class IntervalTree:
+    """
+    Static centered interval tree over closed [start, end] intervals: stab(x) returns
+    the payloads of intervals containing x in O(log n + hits).
+    """
+
+    def __init__(self, intervals: Sequence[Tuple[int, int, Any]]):
+        self._root = self._build(list(intervals))
+
+    def _build(self, intervals: List[Tuple[int, int, Any]]) -> Optional[tuple]:
+        if not intervals:
+            return None
+        points = sorted(p for start, end, _ in intervals for p in (start, end))
+        center = points[len(points) // 2]
+        left = [iv for iv in intervals if iv[1] < center]
+        right = [iv for iv in intervals if iv[0] > center]
+        here = [iv for iv in intervals if iv[0] <= center <= iv[1]]
+        by_start = sorted(here, key=lambda iv: iv[0])
+        by_end = sorted(here, key=lambda iv: iv[1], reverse=True)
+        return center, by_start, by_end, self._build(left), self._build(right)
+
+    def stab(self, x: int) -> List[Any]:
+        found: List[Any] = []
+        node = self._root
+        while node is not None:
+            center, by_start, by_end, left, right = node
+            if x < center:
+                for start, _, payload in by_start:
+                    if start > x:
+                        break
+                    found.append(payload)
+                node = left
+            elif x > center:
+                for _, end, payload in by_end:
+                    if end < x:
+                        break
+                    found.append(payload)
+                node = right
+            else:
+                found.extend(payload for _, _, payload in by_start)
+                break
+        return found
+
+
+def fto_score(claim_types: Iterable[str]) -> float:
+    """1 - prod(1 - w) over in-force claims: the chance at least one claim blocks entry."""
+    clear = 1.0
+    for claim_type in claim_types:
+        clear *= 1.0 - CLAIM_WEIGHTS.get(claim_type, DEFAULT_CLAIM_WEIGHT)
+    return round(1.0 - clear, 4)
+
+
+def risk_label(score: float) -> str:
+    return next(label for threshold, label in RISK_LEVELS if score >= threshold)
+
+
+class PatentStore:
+    def __init__(self, path: str, today: Callable[[], date] = date.today, max_trees: int = 256):
+        self.path = path
+        self.today = today
+        self.max_trees = max_trees
+        self._trees: "OrderedDict[str, IntervalTree]" = OrderedDict()
+        self._data_version = -1
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(
+            """
+            PRAGMA journal_mode = WAL;
+            CREATE TABLE IF NOT EXISTS patents (
+                publication TEXT PRIMARY KEY,
+                family TEXT NOT NULL,
+                molecule TEXT NOT NULL,
+                assignee TEXT NOT NULL,
+                title TEXT NOT NULL,
+                claim_type TEXT NOT NULL,
+                filing_date TEXT NOT NULL,
+                expiry_date TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS patents_molecule_expiry ON patents (molecule, expiry_date);
+            CREATE INDEX IF NOT EXISTS patents_assignee ON patents (assignee);
+            CREATE INDEX IF NOT EXISTS patents_expiry ON patents (expiry_date);
+            CREATE TABLE IF NOT EXISTS fto (
+                molecule TEXT PRIMARY KEY,
+                score REAL NOT NULL,
+                risk TEXT NOT NULL,
+                in_force INTEGER NOT NULL,
+                core_patent_expiry TEXT,
+                as_of TEXT NOT NULL,
+                valid_until TEXT
+            );
+            """
+        )
+        self._conn.commit()
+
+    # -- ingestion --
+
+    def add_patents(self, records: Iterable[Dict[str, Any]]) -> int:
+        """
+        Upsert patents by publication number and refresh the FTO scores of every
+        molecule they touch (including a molecule a patent was moved away from).
+        """
+        touched = set()
+        count = 0
+        with self._lock, self._conn:
+            for r in records:
+                row = {c: str(r.get(c) or "").strip() for c in PATENT_COLUMNS}
+                row["molecule"] = normalize_key_part(row["molecule"])
+                row["claim_type"] = row["claim_type"].lower()
+                row["family"] = row["family"] or row["publication"]
+                date.fromisoformat(row["filing_date"])
+                date.fromisoformat(row["expiry_date"])  # reject malformed dates up front
+                old = self._conn.execute(
+                    "SELECT molecule FROM patents WHERE publication = ?", (row["publication"],)
+                ).fetchone()
+                if old is not None:
+                    touched.add(old[0])
+                self._conn.execute(
+                    f"INSERT OR REPLACE INTO patents ({', '.join(PATENT_COLUMNS)})"
+                    f" VALUES ({', '.join('?' * len(PATENT_COLUMNS))})",
+                    [row[c] for c in PATENT_COLUMNS],
+                )
+                touched.add(row["molecule"])
+                count += 1
+            for molecule in touched:
+                self._trees.pop(molecule, None)
+                self._refresh_fto(molecule, self.today())
+        return count
+
+    # -- queries --
+
+    def _tree(self, molecule: str) -> IntervalTree:
+        # data_version changes when another connection (e.g. an ingest run) commits
+        version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        if version != self._data_version:
+            self._trees.clear()
+            self._data_version = version
+        tree = self._trees.get(molecule)
+        if tree is not None:
+            self._trees.move_to_end(molecule)
+            return tree
+        rows = self._conn.execute(
+            "SELECT publication, filing_date, expiry_date FROM patents WHERE molecule = ?", (molecule,)
+        ).fetchall()
+        tree = IntervalTree(
+            [(date.fromisoformat(f).toordinal(), date.fromisoformat(e).toordinal(), pub) for pub, f, e in rows]
+        )
+        self._trees[molecule] = tree
+        while len(self._trees) > self.max_trees:
+            self._trees.popitem(last=False)
+        return tree
+
+    def _in_force_rows(self, molecule: str, on: date) -> List[Dict[str, Any]]:
+        publications = self._tree(molecule).stab(on.toordinal())
+        if not publications:
+            return []
+        cursor = self._conn.execute(
+            f"SELECT {', '.join(PATENT_COLUMNS)} FROM patents"
+            f" WHERE publication IN ({','.join('?' * len(publications))}) ORDER BY expiry_date DESC, publication",
+            publications,
+        )
+        return [dict(zip(PATENT_COLUMNS, row)) for row in cursor]
+
+    def in_force(self, molecule: str, on: Optional[date] = None) -> List[Dict[str, Any]]:
+        """Patents on molecule whose [filing, expiry] interval contains the date (default today)."""
+        with self._lock:
+            return self._in_force_rows(normalize_key_part(molecule), on or self.today())
+
+    def by_assignee(self, assignee: str) -> List[Dict[str, Any]]:
+        with self._lock:
+            cursor = self._conn.execute(
+                f"SELECT {', '.join(PATENT_COLUMNS)} FROM patents WHERE assignee = ? ORDER BY expiry_date",
+                (assignee,),
+            )
+            return [dict(zip(PATENT_COLUMNS, row)) for row in cursor]
+
+    def expiring_between(self, start: date, end: date) -> List[Dict[str, Any]]:
+        with self._lock:
+            cursor = self._conn.execute(
+                f"SELECT {', '.join(PATENT_COLUMNS)} FROM patents"
+                " WHERE expiry_date BETWEEN ? AND ? ORDER BY expiry_date",
+                (start.isoformat(), end.isoformat()),
+            )
+            return [dict(zip(PATENT_COLUMNS, row)) for row in cursor]
+
+    # -- FTO --
+
+    def _refresh_fto(self, molecule: str, on: date) -> None:
+        rows = self._in_force_rows(molecule, on)
+        if not rows and not self._conn.execute("SELECT 1 FROM patents WHERE molecule = ?", (molecule,)).fetchone():
+            self._conn.execute("DELETE FROM fto WHERE molecule = ?", (molecule,))
+            return
+        score = fto_score(r["claim_type"] for r in rows)
+        compound = self._conn.execute(
+            "SELECT MAX(expiry_date) FROM patents WHERE molecule = ? AND claim_type = 'compound'", (molecule,)
+        ).fetchone()[0]
+        # The score holds through the first in-force expiry and until the day before the
+        # next filing takes effect, whichever comes first.
+        upcoming = self._conn.execute(
+            "SELECT MIN(filing_date) FROM patents WHERE molecule = ? AND filing_date > ?", (molecule, on.isoformat())
+        ).fetchone()[0]
+        candidates = [r["expiry_date"] for r in rows]
+        if upcoming:
+            candidates.append(date.fromordinal(date.fromisoformat(upcoming).toordinal() - 1).isoformat())
+        valid_until = min(candidates) if candidates else None
+        self._conn.execute(
+            "INSERT OR REPLACE INTO fto (molecule, score, risk, in_force, core_patent_expiry, as_of, valid_until)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (molecule, score, risk_label(score), len(rows), compound, on.isoformat(), valid_until),
+        )
+
+    def fto(self, molecule: str) -> Optional[Dict[str, Any]]:
+        """Precomputed FTO summary for molecule (None if it has no patents)."""
+        molecule = normalize_key_part(molecule)
+        today = self.today()
+        columns = ("score", "risk", "in_force", "core_patent_expiry", "as_of", "valid_until")
+        query = f"SELECT {', '.join(columns)} FROM fto WHERE molecule = ?"
+        with self._lock:
+            row = self._conn.execute(query, (molecule,)).fetchone()
+            if row is not None and (today.isoformat() < row[4] or (row[5] is not None and today.isoformat() > row[5])):
+                with self._conn:
+                    self._refresh_fto(molecule, today)
+                row = self._conn.execute(query, (molecule,)).fetchone()
+        return dict(zip(columns, row)) if row is not None else None
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def build_patent_store() -> Optional[PatentStore]:
+    """Store at $AGENT_DATA_DIR/patents.sqlite when AGENT_DATA_DIR is set, otherwise None."""
+    data_dir = os.environ.get("AGENT_DATA_DIR")
+    if not data_dir:
+        return None
+    os.makedirs(data_dir, exist_ok=True)
+    return PatentStore(os.path.join(data_dir, "patents.sqlite"))
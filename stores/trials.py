@@ -0,0 +1,246 @@
+# stores/trials.py
+
+"""
+Local mirror of clinical trial registry dumps with materialized per-molecule
+aggregates.
+
+Dumps are read as a stream (JSONL or CSV, one trial per line) and upserted by NCT
+id: a record replaces the stored one only if its last-updated date is newer, so
+re-running a dump or an overlapping delta is cheap and idempotent. Every molecule a
+changed trial touches is marked dirty; at the end of each batch its aggregates
+(total, active, phase counts, notable trials) are recomputed from that molecule's
+rows alone and written to the `aggregates` table. Answering a query is then one
+primary-key lookup, whatever the registry size.
+
+Both flat records (nct_id, molecule, phase, status, title, enrollment, last_updated)
+and ClinicalTrials.gov API v2 study objects are accepted.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+from typing import Any, Dict, Iterable, Optional, Set
+
+from cache import normalize_key_part
+
+PHASES = ["Phase I", "Phase II", "Phase III", "Phase IV"]
+
+_PHASE_ALIASES = {
+    "early_phase1": "Phase I",
+    "phase1": "Phase I",
+    "phase i": "Phase I",
+    "phase 1": "Phase I",
+    "phase2": "Phase II",
+    "phase ii": "Phase II",
+    "phase 2": "Phase II",
+    "phase3": "Phase III",
+    "phase iii": "Phase III",
+    "phase 3": "Phase III",
+    "phase4": "Phase IV",
+    "phase iv": "Phase IV",
+    "phase 4": "Phase IV",
+}
+
+ACTIVE_STATUSES = frozenset(
+    {"RECRUITING", "ACTIVE_NOT_RECRUITING", "ENROLLING_BY_INVITATION", "NOT_YET_RECRUITING", "ACTIVE"}
+)
+
+NOTABLE_TRIALS = 5
+
+
+def normalize_phase(value: Any) -> str:
+    """Registry phase(s) -> one of PHASES (the highest, for combined phases) or ""."""
+    parts = value if isinstance(value, (list, tuple)) else str(value or "").replace("|", "/").split("/")
+    phases = [_PHASE_ALIASES.get(" ".join(str(p).split()).lower().replace("-", "")) for p in parts]
+    known = [p for p in phases if p]
+    return max(known, key=PHASES.index) if known else ""
+
+
+def normalize_status(value: Any) -> str:
+    return "_".join(str(value or "").replace(",", " ").split()).upper()
+
+
+def parse_registry_record(obj: Dict[str, Any]) -> Dict[str, Any]:
+    """A flat trial record from either a flat row or a ClinicalTrials.gov v2 study."""
+    protocol = obj.get("protocolSection")
+    if protocol is not None:
+        ident = protocol.get("identificationModule", {})
+        status = protocol.get("statusModule", {})
+        design = protocol.get("designModule", {})
+        interventions = protocol.get("armsInterventionsModule", {}).get("interventions", [])
+        return {
+            "nct_id": ident.get("nctId", ""),
+            "molecules": [i.get("name", "") for i in interventions if i.get("type", "DRUG") == "DRUG"],
+            "phase": normalize_phase(design.get("phases", [])),
+            "status": normalize_status(status.get("overallStatus")),
+            "title": ident.get("briefTitle", ""),
+            "enrollment": int(design.get("enrollmentInfo", {}).get("count") or 0),
+            "last_updated": status.get("lastUpdatePostDateStruct", {}).get("date", ""),
+        }
+    molecules = obj.get("molecules") or str(obj.get("molecule") or "").split(";")
+    return {
+        "nct_id": str(obj.get("nct_id") or obj.get("id") or ""),
+        "molecules": list(molecules),
+        "phase": normalize_phase(obj.get("phase")),
+        "status": normalize_status(obj.get("status")),
+        "title": str(obj.get("title") or ""),
+        "enrollment": int(float(obj.get("enrollment") or 0)),
+        "last_updated": str(obj.get("last_updated") or ""),
+    }
+
+
+class TrialRegistry:
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(
+            """
+            PRAGMA journal_mode = WAL;
+            CREATE TABLE IF NOT EXISTS trials (
+                nct_id TEXT PRIMARY KEY,
+                phase TEXT NOT NULL,
+                status TEXT NOT NULL,
+                active INTEGER NOT NULL,
+                title TEXT NOT NULL,
+                enrollment INTEGER NOT NULL,
+                last_updated TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS trial_molecules (
+                molecule TEXT NOT NULL,
+                nct_id TEXT NOT NULL,
+                PRIMARY KEY (molecule, nct_id)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS trial_molecules_nct ON trial_molecules (nct_id);
+            CREATE TABLE IF NOT EXISTS aggregates (
+                molecule TEXT PRIMARY KEY,
+                total INTEGER NOT NULL,
+                active INTEGER NOT NULL,
+                phase_counts TEXT NOT NULL,
+                notable TEXT NOT NULL
+            );
+            """
+        )
+        self._conn.commit()
+
+    def _upsert(self, trial: Dict[str, Any], dirty: Set[str]) -> str:
+        old = self._conn.execute("SELECT last_updated FROM trials WHERE nct_id = ?", (trial["nct_id"],)).fetchone()
+        if old is not None and old[0] >= trial["last_updated"]:
+            return "skipped"
+        molecules = {normalize_key_part(m) for m in trial["molecules"] if str(m).strip()}
+        previous = {
+            r[0] for r in self._conn.execute("SELECT molecule FROM trial_molecules WHERE nct_id = ?", (trial["nct_id"],))
+        }
+        self._conn.execute(
+            "INSERT OR REPLACE INTO trials (nct_id, phase, status, active, title, enrollment, last_updated)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (
+                trial["nct_id"],
+                trial["phase"],
+                trial["status"],
+                int(trial["status"] in ACTIVE_STATUSES),
+                trial["title"],
+                trial["enrollment"],
+                trial["last_updated"],
+            ),
+        )
+        self._conn.executemany(
+            "DELETE FROM trial_molecules WHERE molecule = ? AND nct_id = ?",
+            [(m, trial["nct_id"]) for m in previous - molecules],
+        )
+        self._conn.executemany(
+            "INSERT OR IGNORE INTO trial_molecules (molecule, nct_id) VALUES (?, ?)",
+            [(m, trial["nct_id"]) for m in molecules - previous],
+        )
+        dirty.update(previous | molecules)
+        return "updated" if old is not None else "inserted"
+
+    def _refresh(self, molecules: Iterable[str]) -> None:
+        for molecule in molecules:
+            rows = self._conn.execute(
+                "SELECT t.nct_id, t.phase, t.status, t.active, t.title, t.enrollment"
+                " FROM trial_molecules m JOIN trials t ON t.nct_id = m.nct_id WHERE m.molecule = ?",
+                (molecule,),
+            ).fetchall()
+            if not rows:
+                self._conn.execute("DELETE FROM aggregates WHERE molecule = ?", (molecule,))
+                continue
+            phase_counts = {p: 0 for p in PHASES}
+            for _, phase, _, _, _, _ in rows:
+                if phase in phase_counts:
+                    phase_counts[phase] += 1
+            # Active first, then later phase, then larger enrollment
+            ranked = sorted(
+                rows,
+                key=lambda r: (r[3], PHASES.index(r[1]) if r[1] in PHASES else -1, r[5], r[0]),
+                reverse=True,
+            )
+            notable = [
+                {"id": nct, "phase": phase, "status": status, "title": title}
+                for nct, phase, status, _, title, _ in ranked[:NOTABLE_TRIALS]
+            ]
+            self._conn.execute(
+                "INSERT OR REPLACE INTO aggregates (molecule, total, active, phase_counts, notable)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (molecule, len(rows), sum(r[3] for r in rows), json.dumps(phase_counts), json.dumps(notable)),
+            )
+
+    def sync(self, records: Iterable[Dict[str, Any]], batch_size: int = 5000) -> Dict[str, int]:
+        """
+        Upsert a stream of registry records (flat or ClinicalTrials.gov v2). Each batch
+        commits together with the refreshed aggregates of the molecules it changed.
+        Returns counts of inserted, updated and skipped (not newer) records.
+        """
+        counts = {"inserted": 0, "updated": 0, "skipped": 0}
+        dirty: Set[str] = set()
+        pending = 0
+        with self._lock:
+            try:
+                for record in records:
+                    trial = parse_registry_record(record)
+                    if not trial["nct_id"]:
+                        continue
+                    counts[self._upsert(trial, dirty)] += 1
+                    pending += 1
+                    if pending >= batch_size:
+                        self._refresh(dirty)
+                        self._conn.commit()
+                        dirty.clear()
+                        pending = 0
+                self._refresh(dirty)
+                self._conn.commit()
+            except BaseException:
+                self._conn.rollback()
+                raise
+        return counts
+
+    def aggregates(self, molecule: str) -> Optional[Dict[str, Any]]:
+        """Materialized aggregates for molecule, or None if no trial mentions it."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT total, active, phase_counts, notable FROM aggregates WHERE molecule = ?",
+                (normalize_key_part(molecule),),
+            ).fetchone()
+        if row is None:
+            return None
+        total, active, phase_counts, notable = row
+        return {
+            "total_trials": total,
+            "active_trials": active,
+            "phase_distribution": json.loads(phase_counts),
+            "notable_trials": json.loads(notable),
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def build_trial_registry() -> Optional[TrialRegistry]:
+    """Registry at $AGENT_DATA_DIR/trials.sqlite when AGENT_DATA_DIR is set, otherwise None."""
+    data_dir = os.environ.get("AGENT_DATA_DIR")
+    if not data_dir:
+        return None
+    os.makedirs(data_dir, exist_ok=True)
+    return TrialRegistry(os.path.join(data_dir, "trials.sqlite"))
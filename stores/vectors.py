@@ -0,0 +1,358 @@
+# stores/vectors.py
+
+"""
+Local approximate nearest-neighbour index over mirrored web snippets, CPU only.
+
+Snippets are partitioned by source type (guideline, forum, news); each partition is
+
+    <root>/<kind>/vectors.f32   raw float32 rows (n x dim), appended on ingest and
+                                memory-mapped for search
+    <root>/<kind>/molecules.i32 each row's molecule id (0: untagged), memory-mapped
+                                so a molecule filter only reads the probed rows' ids
+    <root>/<kind>/ivf.npz       inverted-file layout: k-means centroids, the row ids
+                                grouped by nearest centroid and each group's offsets
+
+with the snippet texts and molecule ids in <root>/snippets.sqlite. A query scores only the rows of its
+kind's `nprobe` closest centroids (plus rows added since the last IVF build), so its
+cost is bounded by the probe size rather than the partition size.
+
+Vectors are L2-normalized, so the dot product is the cosine similarity. The default
+HashingEmbedder needs no model files; anything with `dim` and `embed(texts)` can
+replace it, as long as the same embedder is used for ingest and search.
+"""
+
+import os
+import re
+import sqlite3
+import threading
+import zlib
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from cache import normalize_key_part
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+class HashingEmbedder:
+    """
+    Signed feature hashing of word unigrams and bigrams into `dim` buckets; a cheap,
+    deterministic stand-in for a sentence embedding model.
+    """
+
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+        self._buckets: Dict[str, Tuple[int, float]] = {}
+
+    def _bucket(self, feature: str) -> Tuple[int, float]:
+        hit = self._buckets.get(feature)
+        if hit is None:
+            h = zlib.crc32(feature.encode("utf-8"))
+            hit = self._buckets[feature] = (h % self.dim, 1.0 if h & 0x80000000 else -1.0)
+        return hit
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        rows: List[int] = []
+        cols: List[int] = []
+        signs: List[float] = []
+        for i, text in enumerate(texts):
+            words = _TOKEN.findall(text.lower())
+            for feature in words + [a + " " + b for a, b in zip(words, words[1:])]:
+                col, sign = self._bucket(feature)
+                rows.append(i)
+                cols.append(col)
+                signs.append(sign)
+        flat = np.array(rows, dtype=np.intp) * self.dim + np.array(cols, dtype=np.intp)
+        out = np.bincount(flat, weights=signs, minlength=len(texts) * self.dim)
+        out = out.reshape(len(texts), self.dim).astype(np.float32)
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        return out / np.maximum(norms, 1e-12)
+
+
+def spherical_kmeans(vectors: np.ndarray, k: int, iterations: int = 10, seed: int = 0) -> np.ndarray:
+    """k unit-length centroids for unit-length vectors (cosine k-means)."""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), size=k, replace=False)].copy()
+    for _ in range(iterations):
+        labels = np.argmax(vectors @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, vectors)
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        empty = norms[:, 0] == 0
+        centroids = np.where(empty[:, None], centroids, sums / np.maximum(norms, 1e-12))
+    return centroids.astype(np.float32)
+
+
+class _Partition:
+    def __init__(self, path: str, dim: int):
+        self.path = path
+        self.dim = dim
+        self.vectors: Optional[np.ndarray] = None
+        self.molecules: Optional[np.ndarray] = None
+        self.ivf: Optional[Dict[str, np.ndarray]] = None
+        self._stamp: Tuple[int, int, float] = (-1, -1, -1.0)
+
+    @property
+    def vectors_file(self) -> str:
+        return os.path.join(self.path, "vectors.f32")
+
+    @property
+    def molecules_file(self) -> str:
+        return os.path.join(self.path, "molecules.i32")
+
+    @property
+    def ivf_file(self) -> str:
+        return os.path.join(self.path, "ivf.npz")
+
+    def refresh(self) -> None:
+        # Re-map when this or another process appended rows or rebuilt the IVF.
+        size = os.path.getsize(self.vectors_file) if os.path.exists(self.vectors_file) else 0
+        tags = os.path.getsize(self.molecules_file) if os.path.exists(self.molecules_file) else 0
+        mtime = os.path.getmtime(self.ivf_file) if os.path.exists(self.ivf_file) else 0.0
+        if (size, tags, mtime) == self._stamp:
+            return
+        rows = size // (4 * self.dim)
+        self.vectors = (
+            np.memmap(self.vectors_file, dtype=np.float32, mode="r", shape=(rows, self.dim)) if rows else None
+        )
+        self.molecules = np.memmap(self.molecules_file, dtype=np.int32, mode="r") if tags >= 4 else None
+        self.ivf = dict(np.load(self.ivf_file)) if mtime else None
+        self._stamp = (size, tags, mtime)
+
+    def write(self, start: int, vectors: np.ndarray, molecule_ids: Sequence[int]) -> None:
+        """Write rows start.. of both files, dropping anything past start (a failed append)."""
+        os.makedirs(self.path, exist_ok=True)
+        for name, data, width in (
+            (self.vectors_file, np.ascontiguousarray(vectors, dtype=np.float32), 4 * self.dim),
+            (self.molecules_file, np.asarray(molecule_ids, dtype=np.int32), 4),
+        ):
+            with open(name, "ab") as f:
+                f.truncate(start * width)
+                f.write(data.tobytes())
+
+    def truncate(self, rows: int) -> None:
+        for name, width in ((self.vectors_file, 4 * self.dim), (self.molecules_file, 4)):
+            if os.path.exists(name):
+                with open(name, "ab") as f:
+                    f.truncate(rows * width)
+
+    def __len__(self) -> int:
+        # Rows present in both files (another process may be between its two writes)
+        if self.vectors is None or self.molecules is None:
+            return 0
+        return min(len(self.vectors), len(self.molecules))
+
+
+class VectorIndex:
+    def __init__(self, root: str, embedder: Optional[Any] = None):
+        self.root = root
+        self.embedder = embedder if embedder is not None else HashingEmbedder()
+        os.makedirs(root, exist_ok=True)
+        self._partitions: Dict[str, _Partition] = {}
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(root, "snippets.sqlite"), check_same_thread=False)
+        self._conn.executescript(
+            """
+            PRAGMA journal_mode = WAL;
+            CREATE TABLE IF NOT EXISTS snippets (
+                kind TEXT NOT NULL,
+                row INTEGER NOT NULL,
+                source TEXT NOT NULL,
+                molecule TEXT NOT NULL,
+                text TEXT NOT NULL,
+                PRIMARY KEY (kind, row)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS molecules (id INTEGER PRIMARY KEY, name TEXT UNIQUE NOT NULL);
+            INSERT OR IGNORE INTO molecules VALUES (0, '');
+            """
+        )
+        self._conn.commit()
+
+    def _partition(self, kind: str) -> _Partition:
+        part = self._partitions.get(kind)
+        if part is None:
+            part = self._partitions[kind] = _Partition(os.path.join(self.root, kind), self.embedder.dim)
+            part.refresh()
+            if part.vectors is not None and (part.molecules is None or len(part.molecules) < len(part.vectors)):
+                self._backfill_molecules(kind, part)
+        part.refresh()
+        return part
+
+    def _backfill_molecules(self, kind: str, part: _Partition) -> None:
+        # Partitions written before molecules.i32 existed get it from the snippets table,
+        # under the write lock so no append is between its two file writes
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            part.refresh()
+            if part.molecules is None or len(part.molecules) < len(part.vectors):
+                names = [
+                    r[0] for r in self._conn.execute("SELECT molecule FROM snippets WHERE kind = ? ORDER BY row", (kind,))
+                ]
+                ids = self._molecule_ids(names)
+                with open(part.molecules_file, "wb") as f:
+                    f.write(np.asarray([ids[n] for n in names], dtype=np.int32).tobytes())
+            self._conn.commit()
+        except BaseException:
+            self._conn.rollback()
+            raise
+
+    def _molecule_ids(self, names: Iterable[str]) -> Dict[str, int]:
+        ids: Dict[str, int] = {}
+        for name in dict.fromkeys(names):
+            self._conn.execute("INSERT OR IGNORE INTO molecules (name) VALUES (?)", (name,))
+            ids[name] = self._conn.execute("SELECT id FROM molecules WHERE name = ?", (name,)).fetchone()[0]
+        return ids
+
+    def kinds(self) -> List[str]:
+        with self._lock:
+            return [r[0] for r in self._conn.execute("SELECT DISTINCT kind FROM snippets ORDER BY kind")]
+
+    def add_snippets(self, records: Iterable[Dict[str, Any]], batch_size: int = 4096) -> int:
+        """
+        Embed and append snippets (keys: kind, text, and optionally source, molecule) in
+        batches. New rows are searchable at once (scanned exactly until build_ivf()).
+        Molecules are stored normalized (see cache.normalize_key_part) for search().
+        """
+        count = 0
+        batch: List[Dict[str, Any]] = []
+        for record in records:
+            batch.append(record)
+            if len(batch) >= batch_size:
+                count += self._append(batch)
+                batch = []
+        if batch:
+            count += self._append(batch)
+        return count
+
+    def _append(self, batch: List[Dict[str, Any]]) -> int:
+        by_kind: Dict[str, List[Dict[str, Any]]] = {}
+        for record in batch:
+            by_kind.setdefault(str(record["kind"]).strip().lower(), []).append(record)
+        embedded = {kind: self.embedder.embed([str(r["text"]) for r in records]) for kind, records in by_kind.items()}
+        with self._lock:
+            # The write lock serializes appends across processes: row numbers come from
+            # the table, and the files are written only once the rows are in
+            parts = {kind: self._partition(kind) for kind in by_kind}
+            written: List[Tuple[_Partition, int]] = []
+            try:
+                self._conn.execute("BEGIN IMMEDIATE")
+                for kind, records in by_kind.items():
+                    part = parts[kind]
+                    start = self._conn.execute(
+                        "SELECT COALESCE(MAX(row) + 1, 0) FROM snippets WHERE kind = ?", (kind,)
+                    ).fetchone()[0]
+                    molecules = [normalize_key_part(r.get("molecule") or "") for r in records]
+                    ids = self._molecule_ids(molecules)
+                    self._conn.executemany(
+                        "INSERT INTO snippets (kind, row, source, molecule, text) VALUES (?, ?, ?, ?, ?)",
+                        [
+                            (kind, start + i, str(r.get("source") or ""), molecule, str(r["text"]))
+                            for i, (r, molecule) in enumerate(zip(records, molecules))
+                        ],
+                    )
+                    written.append((part, start))
+                    part.write(start, embedded[kind], [ids[m] for m in molecules])
+                self._conn.commit()
+            except BaseException:
+                if self._conn.in_transaction:
+                    self._conn.rollback()
+                for part, start in written:
+                    part.truncate(start)
+                raise
+            finally:
+                for part, _ in written:
+                    part.refresh()
+        return len(batch)
+
+    def build_ivf(self, kind: str, n_lists: Optional[int] = None, sample: int = 50_000, chunk: int = 65_536) -> None:
+        """(Re)cluster a partition: k-means on a sample, then assign every row to its list."""
+        with self._lock:
+            part = self._partition(kind)
+            n = len(part)
+            if not n:
+                return
+            n_lists = n_lists or max(1, min(4096, int(np.sqrt(n))))
+            n_lists = min(n_lists, n)
+            rng = np.random.default_rng(0)
+            train = part.vectors[np.sort(rng.choice(n, size=min(n, sample), replace=False))]
+            centroids = spherical_kmeans(np.asarray(train), n_lists)
+            labels = np.concatenate(
+                [np.argmax(part.vectors[i : i + chunk] @ centroids.T, axis=1) for i in range(0, n, chunk)]
+            )
+            order = np.argsort(labels, kind="stable").astype(np.int64)
+            offsets = np.searchsorted(labels[order], np.arange(n_lists + 1)).astype(np.int64)
+            tmp = part.ivf_file + ".tmp.npz"
+            np.savez(tmp, centroids=centroids, order=order, offsets=offsets, indexed=np.int64(n))
+            os.replace(tmp, part.ivf_file)
+            part.refresh()
+
+    def search(
+        self, query: str, kind: str, k: int = 5, nprobe: int = 16, molecule: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Top-k snippets of one source type by cosine similarity, best first. With molecule,
+        only snippets tagged with that molecule (or with none) are candidates: the probed
+        rows are filtered by their molecule ids, so the cost stays bounded by the probe.
+        """
+        q = self.embedder.embed([query])[0]
+        with self._lock:
+            part = self._partition(kind)
+            n = len(part)
+            if not n:
+                return []
+            vectors, tags, ivf = part.vectors, part.molecules, part.ivf
+            molecule_id = None
+            if molecule is not None:
+                row = self._conn.execute(
+                    "SELECT id FROM molecules WHERE name = ?", (normalize_key_part(molecule),)
+                ).fetchone()
+                molecule_id = row[0] if row is not None else -1  # unknown: untagged rows only
+        indexed = min(int(ivf["indexed"]), n) if ivf is not None else 0
+        if ivf is not None:
+            centroids, order, offsets = ivf["centroids"], ivf["order"], ivf["offsets"]
+            probe = np.argsort(centroids @ q)[::-1][:nprobe]
+            candidates = np.concatenate(
+                [order[offsets[c] : offsets[c + 1]] for c in probe] + [np.arange(indexed, n)]
+            )
+            candidates = candidates[candidates < n]
+        else:
+            candidates = np.arange(n)
+        candidates = np.sort(candidates)  # ascending rows read the memory maps sequentially
+        if molecule_id is not None:
+            ids = tags[candidates]
+            candidates = candidates[(ids == 0) | (ids == molecule_id)]
+        if not len(candidates):
+            return []
+        scores = vectors[candidates] @ q
+        top = np.argpartition(scores, -k)[-k:] if len(scores) > k else np.arange(len(scores))
+        top = top[np.argsort(scores[top])[::-1]]
+        rows = [int(candidates[i]) for i in top]
+        with self._lock:
+            found = {
+                r[0]: r[1:]
+                for r in self._conn.execute(
+                    "SELECT row, source, molecule, text FROM snippets"
+                    f" WHERE kind = ? AND row IN ({','.join('?' * len(rows))})",
+                    [kind] + rows,
+                )
+            }
+        hits = []
+        for row, i in zip(rows, top):
+            if row in found:
+                source, molecule, text = found[row]
+                hits.append(
+                    {"kind": kind, "source": source, "molecule": molecule, "text": text, "score": round(float(scores[i]), 4)}
+                )
+        return hits
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+            self._partitions.clear()
+
+
+def build_vector_index() -> Optional[VectorIndex]:
+    """Index under $AGENT_DATA_DIR/web when AGENT_DATA_DIR is set, otherwise None."""
+    data_dir = os.environ.get("AGENT_DATA_DIR")
+    return VectorIndex(os.path.join(data_dir, "web")) if data_dir else None
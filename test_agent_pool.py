@@ -0,0 +1,45 @@
+from agent_pool import AgentPool
+from graph import build_master_agent
+
+
+class Lifecycle:
+    instances = 0
+
+    def __init__(self):
+        Lifecycle.instances += 1
+        self.warmed = self.closed = False
+        self.healthy = True
+
+    def warm_up(self):
+        self.warmed = True
+
+    def health_check(self):
+        return self.healthy
+
+    def close(self):
+        self.closed = True
+
+
+def test_pool_builds_each_agent_once_and_rebuilds_unhealthy_ones():
+    pool = AgentPool()
+    first = pool.get("svc", Lifecycle)
+    assert pool.get("svc", Lifecycle) is first
+    assert first.warmed
+
+    first.healthy = False
+    assert pool.ensure_healthy() == {"svc": False}
+    assert first.closed
+    replacement = pool.get("svc", Lifecycle)
+    assert replacement is not first and replacement.warmed
+
+    pool.close()
+    assert replacement.closed and len(pool) == 0
+
+
+def test_master_agents_share_pooled_workers():
+    pool = AgentPool()
+    a = build_master_agent(pool=pool)
+    b = build_master_agent(pool=pool, parallel=True)
+    assert a.iqvia_agent is b.iqvia_agent
+    assert a.web_agent is b.web_agent
+    assert len(pool) == 6
@@ -1,11 +1,45 @@
+import os
+import tempfile
+
 import streamlit
 from streamlit.testing.v1 import AppTest
 
+# Keep the app's job database out of the working tree
+os.environ.setdefault("JOB_DIR", tempfile.mkdtemp(prefix="jobs-"))
+
 def test_app_starts():
     at = AppTest.from_file("app.py")
     at.run()
     assert not at.exception
     print("App loaded successfully without exceptions.")
 
+def test_innovation_search_runs():
+    at = AppTest.from_file("app.py", default_timeout=30)
+    at.run()
+    at.sidebar.button[0].click().run()
+    assert not at.exception
+    assert at.success[0].value == "Analysis complete"
+    assert at.tabs[1].dataframe
+
+def test_diagnostics_panel_shows_trace():
+    at = AppTest.from_file("app.py", default_timeout=30)
+    at.run()
+    at.sidebar.checkbox[0].check().run()
+    at.sidebar.button[0].click().run()
+    assert not at.exception
+    assert [e.label for e in at.expander] == ["Diagnostics"]
+
+def test_result_survives_reruns_and_tab_interaction():
+    at = AppTest.from_file("app.py", default_timeout=30)
+    at.run()
+    at.sidebar.button[0].click().run()
+    # The button is no longer pressed: the result comes back from session state
+    at.toggle(key="raw_market").set_value(False).run()
+    assert not at.exception
+    assert at.success[0].value == "Analysis complete"
+    assert not at.tabs[1].dataframe
+    assert at.tabs[2].dataframe
+    assert len(at.session_state["results"]) == 1
+
 if __name__ == "__main__":
     test_app_starts()
@@ -0,0 +1,70 @@
+import json
+
+import batch
+from agents.tables import to_jsonable
+from graph import build_master_agent
+from test_cache import CountingAgent
+
+
+def test_run_batch_shares_agent_calls_across_queries():
+    master = build_master_agent()
+    master.patent_agent = CountingAgent(master.patent_agent)
+    master.exim_agent = CountingAgent(master.exim_agent)
+    queries = [
+        ("pregabalin", "neuropathic pain", "US"),
+        ("pregabalin", "fibromyalgia", "US"),
+        {"molecule": "pregabalin", "indication": "neuropathic pain", "geography": "IN"},
+    ]
+
+    records = list(master.run_batch(queries, max_workers=3))
+
+    assert len(records) == 3
+    assert all("result" in r for r in records)
+    assert master.patent_agent.calls == 1
+    assert master.exim_agent.calls == 2
+
+
+def test_cli_resumes_from_output_file(tmp_path):
+    queries = tmp_path / "portfolio.csv"
+    queries.write_text(
+        "molecule,indication,geography\n"
+        "pregabalin,neuropathic pain,US\n"
+        "duloxetine,fibromyalgia,IN\n"
+        "Pregabalin , neuropathic pain,us\n"
+    )
+    output = tmp_path / "results.jsonl"
+    result = to_jsonable(build_master_agent().run("pregabalin", "neuropathic pain", "US"))
+    first = {"query": {"molecule": "pregabalin", "indication": "neuropathic pain", "geography": "US"}, "result": result}
+    output.write_text(json.dumps(first) + "\n" + '{"query": {"molecule": "dulox')
+
+    assert batch.main([str(queries), "-o", str(output), "--resume"]) == 0
+
+    lines = output.read_text().splitlines()
+    results = [json.loads(line) for line in lines[1:]]
+    assert [r["query"]["molecule"] for r in results] == ["duloxetine"]
+    assert results[0]["result"]["target_geography"] == "IN"
+
+
+def test_resume_reruns_degraded_results_and_reports_bad_rows(tmp_path, capsys):
+    queries = tmp_path / "portfolio.csv"
+    queries.write_text(
+        "molecule,indication,geography\n"
+        "pregabalin,neuropathic pain,US\n"
+        "duloxetine\n"
+        ",fibromyalgia,IN\n"
+    )
+    output = tmp_path / "results.jsonl"
+    result = to_jsonable(build_master_agent().run("pregabalin", "neuropathic pain", "US"))
+    result["patent_landscape"] = {"error": "timed out after 2s"}
+    degraded = {"query": {"molecule": "pregabalin", "indication": "neuropathic pain", "geography": "US"}, "result": result}
+    output.write_text(json.dumps(degraded) + "\n")
+
+    # The bad rows fail the run (exit code 1) but do not stop it
+    assert batch.main([str(queries), "-o", str(output), "--resume"]) == 1
+
+    rerun = [json.loads(line) for line in output.read_text().splitlines()[1:]]
+    assert [r["query"]["molecule"] for r in rerun] == ["pregabalin"]
+    assert batch.is_complete(rerun[0]["result"])
+    err = capsys.readouterr().err
+    assert "portfolio.csv:3: missing or non-text indication" in err
+    assert "portfolio.csv:4: empty molecule" in err
@@ -0,0 +1,107 @@
+import sqlite3
+import time
+
+from cache import DiskCacheBackend, MemoryCacheBackend, ResultCache
+from graph import build_master_agent
+
+
+class CountingAgent:
+    def __init__(self, agent):
+        self.agent = agent
+        self.calls = 0
+
+    def run(self, *args):
+        self.calls += 1
+        return self.agent.run(*args)
+
+
+def test_repeat_query_is_served_from_cache():
+    cache = ResultCache()
+    master = build_master_agent(cache=cache)
+    master.iqvia_agent = CountingAgent(master.iqvia_agent)
+
+    first = master.run("pregabalin", "neuropathic pain", "US")
+    second = master.run("  Pregabalin ", "Neuropathic  pain", "us")
+
+    assert master.iqvia_agent.calls == 1
+    assert second["market_overview"] == first["market_overview"]
+    assert second["molecule"] == "  Pregabalin "
+    assert cache.stats()["hits"] == 6
+
+
+def test_sections_expire_on_their_own_ttl():
+    now = [1000.0]
+    cache = ResultCache(ttls={"market_overview": 10, "patent_landscape": 100}, clock=lambda: now[0])
+    master = build_master_agent(cache=cache)
+    master.iqvia_agent = CountingAgent(master.iqvia_agent)
+    master.patent_agent = CountingAgent(master.patent_agent)
+
+    master.run("pregabalin", "neuropathic pain", "US")
+    now[0] += 50
+    master.run("pregabalin", "neuropathic pain", "US")
+
+    assert master.iqvia_agent.calls == 2
+    assert master.patent_agent.calls == 1
+
+
+def test_memory_backend_evicts_least_recently_used():
+    backend = MemoryCacheBackend(max_entries=2)
+    backend.set("a", 1, 0)
+    backend.set("b", 2, 0)
+    backend.get("a")
+    backend.set("c", 3, 0)
+    assert backend.get("b") is None
+    assert backend.get("a") == (1, 0)
+
+
+def test_disk_backend_survives_reopen(tmp_path):
+    path = str(tmp_path / "results.sqlite")
+    backend = DiskCacheBackend(path, max_entries=2)
+    for i, key in enumerate("abc"):
+        backend.set(key, {"value": i}, float(i))
+    backend.close()
+
+    reopened = DiskCacheBackend(path)
+    assert len(reopened) == 2
+    assert reopened.get("c") == ({"value": 2}, 2.0)
+
+
+def test_new_geography_only_reruns_geography_agents():
+    master = build_master_agent(cache=ResultCache())
+    counters = {}
+    for attr in ("iqvia_agent", "exim_agent", "patent_agent", "clinical_agent", "internal_agent", "web_agent"):
+        counters[attr] = CountingAgent(getattr(master, attr))
+        setattr(master, attr, counters[attr])
+
+    master.run("pregabalin", "neuropathic pain", "US")
+    master.run("pregabalin", "neuropathic pain", "IN")
+    master.run("pregabalin", "fibromyalgia", "IN")
+
+    assert {attr: c.calls for attr, c in counters.items()} == {
+        "iqvia_agent": 3,
+        "exim_agent": 2,
+        "patent_agent": 1,
+        "clinical_agent": 1,
+        "internal_agent": 1,
+        "web_agent": 1,
+    }
+
+
+def test_disk_cache_reads_do_not_write(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    backend = DiskCacheBackend(path, max_entries=2)
+    backend.set("a", 1, 0.0)
+    backend.set("b", 2, 0.0)
+
+    # Another process holding the write lock does not block reads
+    other = sqlite3.connect(path)
+    other.execute("BEGIN IMMEDIATE")
+    started = time.monotonic()
+    assert backend.get("a") == (1, 0.0)
+    assert time.monotonic() - started < 1.0
+    other.rollback()
+    other.close()
+
+    # The read still counts for eviction: "b" is now the least recently used
+    backend.set("c", 3, 0.0)
+    assert backend.get("b") is None and backend.get("a") == (1, 0.0)
@@ -0,0 +1,196 @@
+import json
+import time
+
+from agents.tables import to_jsonable
+from agents.worker_agents import ReportGeneratorAgent, WorkerAgent
+from cache import MemoryCacheBackend, ResultCache
+from graph import HYPOTHESIS_STREAM_KEY, Node, QueryGraph, build_master_agent
+from llm_client import HTTPLLMClient
+from llm_stub_server import StubLLMServer
+from rules import CompiledRuleSet
+from tracing import Tracer
+
+
+class SlowAgent:
+    def run(self, *args):
+        time.sleep(2)
+        return {"comments": "too late"}
+
+
+class BrokenAgent:
+    def run(self, *args):
+        raise RuntimeError("backend down")
+
+
+def test_parallel_matches_sequential():
+    sequential = build_master_agent().run("pregabalin", "neuropathic pain", "US")
+    parallel = build_master_agent(parallel=True).run("pregabalin", "neuropathic pain", "US")
+    assert to_jsonable(parallel) == to_jsonable(sequential)
+
+
+def test_parallel_returns_partial_results():
+    master = build_master_agent(parallel=True, agent_timeout_s=0.2)
+    master.exim_agent = SlowAgent()
+    master.patent_agent = BrokenAgent()
+
+    started = time.monotonic()
+    result = master.run("pregabalin", "neuropathic pain", "US")
+
+    assert time.monotonic() - started < 1.5
+    assert "timed out" in result["exim_overview"]["error"]
+    assert "backend down" in result["patent_landscape"]["error"]
+    assert result["market_overview"]["market_size_usd_mn"] == 172
+    assert result["unmet_needs"]
+
+
+class SyncOnlyAgent:
+    def run(self, molecule):
+        return {"comments": f"sync {molecule}"}
+
+
+def test_async_mode_adapts_sync_agents():
+    master = build_master_agent(use_async=True)
+    master.patent_agent = SyncOnlyAgent()
+    result = master.run("pregabalin", "neuropathic pain", "US")
+    assert result["patent_landscape"] == {"comments": "sync pregabalin"}
+    expected = build_master_agent().run("pregabalin", "neuropathic pain")["market_overview"]
+    assert to_jsonable(result["market_overview"]) == to_jsonable(expected)
+
+
+class SleepingAgent(WorkerAgent):
+    def run(self, *args):
+        time.sleep(1.0)
+        return {"comments": "late"}
+
+
+def test_async_mode_runs_blocking_agents_concurrently_within_timeout():
+    master = build_master_agent(use_async=True, agent_timeout_s=0.2)
+    master.patent_agent = SleepingAgent()
+    master.exim_agent = SleepingAgent()
+
+    started = time.monotonic()
+    result = master.run("pregabalin", "neuropathic pain", "US")
+    assert time.monotonic() - started < 0.8
+    assert "timed out" in result["patent_landscape"]["error"]
+    assert "timed out" in result["exim_overview"]["error"]
+
+
+def test_arun_from_running_loop():
+    import asyncio
+
+    async def main():
+        master = build_master_agent(use_async=True)
+        return master.run("pregabalin", "neuropathic pain", "US"), await master.arun("pregabalin", "neuropathic pain", "US")
+
+    from_sync, from_async = asyncio.run(main())
+    assert to_jsonable(from_sync) == to_jsonable(from_async)
+
+
+def test_iter_run_streams_sections_and_matches_run():
+    master = build_master_agent(agent_timeout_s=0.5)
+    master.exim_agent = SlowAgent()
+
+    keys = []
+    collected = {}
+    for key, value in master.iter_run("pregabalin", "neuropathic pain", "US"):
+        keys.append(key)
+        collected[key] = value
+
+    assert keys.index("unmet_needs") < keys.index("exim_overview")
+    assert "timed out" in collected["exim_overview"]["error"]
+
+    expected = build_master_agent().run("pregabalin", "neuropathic pain", "US")
+    del expected["exim_overview"], collected["exim_overview"]
+    assert to_jsonable(collected) == to_jsonable(expected)
+
+
+def test_iter_run_streams_llm_hypothesis():
+    with StubLLMServer() as server:
+        master = build_master_agent(llm=HTTPLLMClient(server.base_url))
+        streamed = []
+        collected = {}
+        for key, value in master.iter_run("pregabalin", "neuropathic pain", "US", stream_tokens=True):
+            if key == HYPOTHESIS_STREAM_KEY:
+                streamed.extend(value)
+            else:
+                collected[key] = value
+
+        assert len(streamed) > 1
+        assert collected["innovation_hypothesis"] == "".join(streamed)
+        assert to_jsonable(collected) == to_jsonable(master.run("pregabalin", "neuropathic pain", "US"))
+
+
+def test_tracer_records_agent_spans_cache_counters_and_exports():
+    tracer = Tracer()
+    master = build_master_agent(parallel=True, cache=ResultCache(), tracer=tracer)
+    result = master.run("pregabalin", "neuropathic pain", "US")
+    master.run("pregabalin", "neuropathic pain", "US")
+    report = ReportGeneratorAgent()
+    report.report_artifact(result, "txt", tracer)
+    report.report_artifact(result, "txt", tracer)
+
+    summary = tracer.summary()
+    assert summary["master.run"]["calls"] == 2
+    assert summary["agent.market_overview"]["calls"] == 1  # second run is served from the cache
+    assert {"synthesis.unmet_needs", "synthesis.hypothesis", "report.txt"} <= summary.keys()
+    assert tracer.counters["cache.miss.patent_landscape"] == tracer.counters["cache.hit.patent_landscape"] == 1
+    assert tracer.counters["report.cache.hit"] == 1
+    assert all(s.attrs["bytes"] > 0 for s in tracer.spans if s.name.startswith("agent."))
+
+    events = json.loads(tracer.chrome_trace_json())["traceEvents"]
+    assert len([e for e in events if e["ph"] == "X"]) == len(tracer.spans)
+    assert {e["args"]["name"] for e in events if e["ph"] == "M"} >= {"master", "market_overview", "report"}
+
+
+def test_query_graph_runs_independent_nodes_in_parallel():
+    def slow(value):
+        time.sleep(0.3)
+        return value
+
+    graph = QueryGraph(
+        [Node("c", ("a", "b"), lambda a, b: a + b), Node("a", ("x",), slow), Node("b", ("y",), slow)], ("x", "y")
+    )
+    assert graph.order[-1] == "c" and graph.downstream(["x"]) == ["a", "c"]
+    started = time.monotonic()
+    assert dict(graph.iter_execute({"x": 1, "y": 2}, max_workers=2))["c"] == 3
+    assert time.monotonic() - started < 0.55
+
+
+def test_changed_geography_only_recomputes_affected_nodes():
+    tracer = Tracer()
+    master = build_master_agent(parallel=True, cache=ResultCache(), node_memo=MemoryCacheBackend(), tracer=tracer)
+    assert master.query_graph().downstream(["geography"]) == ["market_overview", "exim_overview"]
+
+    master.run("pregabalin", "neuropathic pain", "US")
+    result = master.run("pregabalin", "neuropathic pain", "IN")
+
+    summary = tracer.summary()
+    assert summary["agent.market_overview"]["calls"] == 2
+    assert summary["agent.patent_landscape"]["calls"] == 1
+    assert summary["synthesis.unmet_needs"]["calls"] == summary["synthesis.hypothesis"]["calls"] == 1
+    assert tracer.counters["graph.reused.synthesis"] == tracer.counters["graph.reused.innovation_hypothesis"] == 1
+    expected = build_master_agent().run("pregabalin", "neuropathic pain", "IN")
+    assert to_jsonable(result) == to_jsonable(expected)
+
+
+def test_memo_salts_follow_rule_table_and_llm_configuration():
+    master = build_master_agent()
+    rules = master.unmet_need_rules
+
+    def salts():
+        return {name: node.salt for name, node in master.query_graph().nodes.items() if node.memoize}
+
+    # Equal tables and clients built separately share memoized nodes; any change does not
+    master.llm = HTTPLLMClient("http://localhost:8000/v1", model="a")
+    before = salts()
+    master.unmet_need_rules = CompiledRuleSet(list(rules.rules))
+    master.llm = HTTPLLMClient("http://localhost:8000/v1", model="a")
+    assert salts() == before
+
+    master.unmet_need_rules = CompiledRuleSet(rules.rules[:-1])
+    master.llm = HTTPLLMClient("http://localhost:8000/v1", model="b")
+    changed = salts()
+    assert changed["synthesis"] != before["synthesis"]
+    assert changed["innovation_hypothesis"] != before["innovation_hypothesis"]
+    master.llm = HTTPLLMClient("http://localhost:9000/v1", model="b")
+    assert salts()["innovation_hypothesis"] != changed["innovation_hypothesis"]
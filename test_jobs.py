@@ -0,0 +1,128 @@
+import os
+import threading
+import time
+
+import pytest
+
+from jobs import DIAGNOSTICS_KEY, JobQueue, JobStore, StoreFlights
+from resilience import DeadlineExceeded
+
+
+def test_job_runs_in_worker_and_repeat_query_reuses_it(tmp_path):
+    queue = JobQueue(str(tmp_path / "jobs.sqlite"), max_workers=1)
+    try:
+        job_id = queue.submit({"molecule": "pregabalin", "indication": "neuropathic pain", "geography": "US"})
+        # Same query in another spelling: the queued/running/done job is returned
+        assert queue.submit({"molecule": " Pregabalin ", "indication": "Neuropathic Pain", "geography": "us"}) == job_id
+
+        job = queue.wait(job_id, timeout_s=60)
+        assert job.status == "done" and job.started_at and job.finished_at and not job.degraded
+        result = queue.result(job_id)
+        assert result["molecule"] == "pregabalin"
+        assert result["innovation_hypothesis"]
+        assert "market_overview" in result
+
+        # Parts come back in the order they were produced; reattaching replays them
+        replayed = dict(queue.follow(job_id))
+        assert replayed.keys() >= result.keys()
+        assert queue.submit({"molecule": "pregabalin", "indication": "neuropathic pain", "geography": "US"}) == job_id
+        assert queue.submit({"molecule": "pregabalin", "indication": "neuropathic pain", "geography": "US"}, force=True) != job_id
+
+        traced = queue.submit({"molecule": "pregabalin", "indication": "neuropathic pain", "geography": "US"}, trace=True)
+        assert traced != job_id
+        assert queue.wait(traced, timeout_s=60).status == "done"
+        diagnostics = dict((k, v) for _, k, v in queue.parts(traced))[DIAGNOSTICS_KEY]
+        assert "master.run" in diagnostics["trace"]["summary"]
+        # Workers share a disk section cache beside the job database
+        assert os.path.exists(tmp_path / "sections.sqlite")
+        assert diagnostics["cache"]["entries"] > 0
+    finally:
+        queue.close()
+
+
+def test_unfinished_jobs_are_requeued_on_start(tmp_path):
+    path = str(tmp_path / "jobs.sqlite")
+    store = JobStore(path)
+    # A job left running by a server that went away, with a partial result
+    job_id = store.create("metformin|t2d|in", {"molecule": "metformin", "indication": "t2d", "geography": "IN"}, {})
+    store.mark(job_id, "running")
+    store.put_part(job_id, "molecule", "stale")
+    store.close()
+
+    queue = JobQueue(path, max_workers=1)
+    try:
+        job = queue.wait(job_id, timeout_s=60)
+        assert job.status == "done"
+        assert queue.result(job_id)["molecule"] == "metformin"
+        assert os.path.exists(path)
+    finally:
+        queue.close()
+
+
+def test_degraded_jobs_are_not_reused(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.sqlite"))
+    query = {"molecule": "metformin", "indication": "t2d", "geography": "IN"}
+    degraded = store.create("metformin|t2d|in", query, {})
+    store.mark(degraded, "done", degraded=True)
+    assert store.get(degraded).degraded
+    assert store.find_reusable("metformin|t2d|in", max_age_s=3600) is None
+
+    complete = store.create("metformin|t2d|in", query, {})
+    store.mark(complete, "done")
+    assert store.find_reusable("metformin|t2d|in", max_age_s=3600).id == complete
+    store.close()
+
+
+def test_store_flights_coalesce_across_workers(tmp_path):
+    path = str(tmp_path / "jobs.sqlite")
+    # One StoreFlights (and connection) per worker process
+    first, second = StoreFlights(JobStore(path)), StoreFlights(JobStore(path))
+    calls = []
+    started = threading.Event()
+
+    def slow():
+        calls.append(1)
+        started.set()
+        time.sleep(0.3)
+        return {"rows": [1, 2]}
+
+    outcomes = {}
+    leader = threading.Thread(target=lambda: outcomes.update(first=first.do("market|pregabalin", slow)))
+    leader.start()
+    started.wait(5)
+    outcomes["second"] = second.do("market|pregabalin", slow)
+    leader.join()
+
+    assert calls == [1]
+    assert outcomes["first"] == ({"rows": [1, 2]}, False)
+    assert outcomes["second"] == ({"rows": [1, 2]}, True)
+    assert second.stats()["coalesced_across_workers"] == 1
+
+    # Errors reach the waiters; a finished flight is not reused by later calls
+    def failing():
+        started.set()
+        time.sleep(0.2)
+        raise ConnectionError("backend down")
+
+    started.clear()
+    failed = threading.Thread(target=lambda: pytest.raises(ConnectionError, first.do, "patents|x", failing))
+    failed.start()
+    started.wait(5)
+    with pytest.raises(ConnectionError, match="backend down"):
+        second.do("patents|x", failing)
+    failed.join()
+    assert second.do("market|pregabalin", lambda: {"rows": []}) == ({"rows": []}, False)
+
+
+def test_store_flight_waiter_gives_up_at_its_deadline(tmp_path):
+    path = str(tmp_path / "jobs.sqlite")
+    # A leader in a worker process that died without landing its flight
+    dead = JobStore(path)
+    dead.join_flight("market|pregabalin", lease_s=60)
+    waiter = StoreFlights(JobStore(path))
+    calls = []
+
+    started = time.monotonic()
+    with pytest.raises(DeadlineExceeded, match="another worker"):
+        waiter.do("market|pregabalin", lambda: calls.append(1), timeout_s=0.2)
+    assert time.monotonic() - started < 1.0 and calls == []
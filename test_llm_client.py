@@ -0,0 +1,83 @@
+import time
+
+import pytest
+
+from cache import DiskCacheBackend, MemoryCacheBackend
+from llm_client import HTTPLLMClient, LLMError, get_llm_client, DummyLLM
+from llm_stub_server import StubLLMServer, stub_reply
+
+
+def test_batch_runs_concurrently_over_pooled_connections():
+    with StubLLMServer(latency_s=0.2) as server:
+        client = HTTPLLMClient(server.base_url, max_concurrency=8)
+        prompts = [f"hypothesis for molecule {i}" for i in range(8)] + ["hypothesis for molecule 0"]
+
+        started = time.monotonic()
+        answers = client.batch(prompts)
+        elapsed = time.monotonic() - started
+
+        assert answers == [stub_reply(p) for p in prompts]
+        assert elapsed < 1.0
+        assert server.requests == 8
+        assert client.pool.opened <= 8
+        usage = client.usage.snapshot()
+        assert usage["requests"] == 8 and usage["completion_tokens"] > 0
+        client.close()
+
+
+def test_disk_cache_answers_repeat_prompts_offline(tmp_path):
+    cache_path = str(tmp_path / "llm.sqlite")
+    with StubLLMServer() as server:
+        client = HTTPLLMClient(server.base_url, cache=DiskCacheBackend(cache_path))
+        first = client.invoke("rationale for pregabalin")
+        base_url = server.base_url
+
+    # Server is gone; a fresh client on the same cache file still answers.
+    client = HTTPLLMClient(base_url, cache=DiskCacheBackend(cache_path))
+    assert client.invoke("rationale for pregabalin") == first
+    assert client.usage.cache_hits == 1 and client.usage.requests == 0
+
+
+def test_get_llm_client_defaults_to_dummy(monkeypatch):
+    monkeypatch.delenv("LLM_BASE_URL", raising=False)
+    assert isinstance(get_llm_client(), DummyLLM)
+
+
+def test_stream_yields_chunks_and_caches_full_reply():
+    with StubLLMServer() as server:
+        client = HTTPLLMClient(server.base_url, cache=MemoryCacheBackend())
+        chunks = list(client.stream("hypothesis for pregabalin in fibromyalgia"))
+        assert len(chunks) > 1
+        assert "".join(chunks) == stub_reply("hypothesis for pregabalin in fibromyalgia")
+        assert client.usage.streams == 1 and client.usage.completion_tokens == len(chunks)
+
+        # Replayed from the cache, and the pooled connection still serves plain calls.
+        assert "".join(client.stream("hypothesis for pregabalin in fibromyalgia")) == "".join(chunks)
+        assert client.invoke("other prompt") == stub_reply("other prompt")
+        assert server.requests == 2
+        client.close()
+
+    assert "".join(DummyLLM().stream("x")) == DummyLLM().invoke("x")
+
+
+def test_stream_cut_off_is_not_cached():
+    prompt = "hypothesis for pregabalin in fibromyalgia"
+    cache = MemoryCacheBackend()
+    with StubLLMServer(drop_stream_after=2) as server:
+        client = HTTPLLMClient(server.base_url, cache=cache)
+        received = []
+        with pytest.raises(LLMError, match="before completion"):
+            for chunk in client.stream(prompt):
+                received.append(chunk)
+        assert len(received) == 2 and len(cache) == 0
+
+        server.drop_stream_after = 0
+        with pytest.raises(LLMError):
+            list(client.stream(prompt))
+        assert len(cache) == 0 and client.usage.errors == 2
+
+        # A later complete stream is cached and answers invoke()
+        server.drop_stream_after = None
+        assert "".join(client.stream(prompt)) == stub_reply(prompt)
+        assert client.invoke(prompt) == stub_reply(prompt) and server.requests == 3
+        client.close()
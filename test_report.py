@@ -0,0 +1,66 @@
+import re
+import zlib
+
+from agents.worker_agents import ReportGeneratorAgent
+from graph import build_master_agent
+
+
+def pdf_text(pdf: bytes) -> bytes:
+    streams = re.findall(rb"/FlateDecode >>\nstream\n(.*?)\nendstream", pdf, re.S)
+    return b"\n".join(zlib.decompress(s) for s in streams)
+
+
+def test_vector_pdf_paginates_without_dropping_rows():
+    payload = build_master_agent().run("pregabalin", "neuropathic pain", "US")
+    payload["clinical_trials_landscape"]["notable_trials"] = [
+        {"id": f"NCT{i:08d}", "phase": "Phase II", "status": "Active"} for i in range(300)
+    ]
+
+    pdf = ReportGeneratorAgent().generate_pdf_report(payload)
+    text = pdf_text(pdf)
+
+    assert pdf.startswith(b"%PDF-1.4")
+    assert pdf.rstrip().endswith(b"%%EOF")
+    assert pdf.count(b"/Type /Page ") > 1
+    assert b"(NCT00000000)" in text and b"(NCT00000299)" in text
+    assert b"(Innovation Hypothesis:)" in text
+
+
+class CountingReportAgent(ReportGeneratorAgent):
+    pdf_renders = 0
+
+    def generate_pdf_report(self, payload):
+        self.pdf_renders += 1
+        return super().generate_pdf_report(payload)
+
+
+def test_report_artifacts_are_cached_by_payload_content():
+    agent = CountingReportAgent()
+    payload = build_master_agent().run("pregabalin", "neuropathic pain", "US")
+    same_content = build_master_agent().run("pregabalin", "neuropathic pain", "US")
+
+    first = agent.report_artifact(payload, "pdf")
+    assert agent.report_artifact(same_content, "pdf") is first
+    assert agent.pdf_renders == 1
+
+    same_content["unmet_needs"].append("Once-daily dosing.")
+    agent.report_artifact(same_content, "pdf")
+    assert agent.pdf_renders == 2
+
+
+def test_text_wrapper_measures_each_word_once():
+    from agents.text_wrap import TextWrapper
+
+    measured = []
+
+    def measure(s):
+        measured.append(s)
+        return 10.0 * len(s)
+
+    wrapper = TextWrapper(measure)
+    text = "alpha beta gamma alpha beta gamma alpha"
+    lines = wrapper.wrap(text, 170)
+
+    assert lines == ["alpha beta gamma", "alpha beta gamma", "alpha"]
+    assert sorted(measured) == sorted([" ", "alpha", "beta", "gamma"])
+    assert wrapper.wrap("x" * 25, 100) == ["x" * 10, "x" * 10, "x" * 5]
@@ -0,0 +1,173 @@
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from cache import ResultCache
+from graph import CIRCUIT_OPEN, DEADLINE_PASSED, build_master_agent
+from singleflight import SingleFlight
+from resilience import CircuitBreaker, CircuitBreakers, DeadlineExceeded, bounded_call, deadline_budgets
+
+
+def test_breaker_opens_then_probes_once():
+    now = [0.0]
+    breaker = CircuitBreaker(failure_threshold=2, reset_after_s=10, clock=lambda: now[0])
+    breaker.record_failure("boom")
+    assert breaker.allow()
+    breaker.record_failure("boom")
+    assert breaker.state == "open" and not breaker.allow()
+
+    now[0] = 10.0
+    assert breaker.allow() and not breaker.allow()  # one trial call at a time
+    breaker.record_failure("still down")
+    assert breaker.state == "open"
+    now[0] = 20.0
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed" and breaker.failures == 0
+
+
+def test_bounded_call_hedges_slow_attempts_and_enforces_deadline():
+    attempts = []
+    lock = threading.Lock()
+
+    def first_one_slow():
+        with lock:
+            attempts.append(1)
+            n = len(attempts)
+        time.sleep(1.0 if n == 1 else 0.0)
+        return n
+
+    hedges = []
+    started = time.monotonic()
+    assert bounded_call(first_one_slow, timeout_s=2.0, hedge_after_s=0.1, on_hedge=lambda: hedges.append(1)) == 2
+    assert time.monotonic() - started < 0.5 and hedges == [1]
+
+    with pytest.raises(DeadlineExceeded, match="timed out after 0.1s"):
+        bounded_call(lambda: time.sleep(1.0), timeout_s=0.1)
+    assert deadline_budgets(10.0, ["a", "b"], shares={"b": 0.5}) == {"a": 8.0, "b": 4.0}
+
+
+class FirstCallSlowAgent:
+    idempotent = True
+
+    def __init__(self, agent):
+        self.agent = agent
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def run(self, *args):
+        with self._lock:
+            self.calls += 1
+            n = self.calls
+        if n == 1:
+            time.sleep(2.0)
+        return self.agent.run(*args)
+
+
+def test_hedge_starts_a_new_call_when_lookups_are_coalesced():
+    master = build_master_agent(flights=SingleFlight(), hedge_after_s=0.1)
+    master.iqvia_agent = FirstCallSlowAgent(master.iqvia_agent)
+
+    started = time.monotonic()
+    section = master.run("pregabalin", "neuropathic pain", "US")["market_overview"]
+    assert time.monotonic() - started < 1.0
+    assert master.iqvia_agent.calls == 2 and "error" not in section
+
+
+class FlakyAgent:
+    def __init__(self, agent):
+        self.agent = agent
+        self.calls = 0
+        self.down = False
+
+    def run(self, *args):
+        self.calls += 1
+        if self.down:
+            raise ConnectionError("backend down")
+        return self.agent.run(*args)
+
+
+def test_failing_agent_serves_stale_section_then_short_circuits():
+    now = [1000.0]
+    cache = ResultCache(ttls={"market_overview": 10}, clock=lambda: now[0])
+    breakers = CircuitBreakers(failure_threshold=2, reset_after_s=60)
+    master = build_master_agent(cache=cache, breakers=breakers)
+    master.iqvia_agent = FlakyAgent(master.iqvia_agent)
+
+    fresh = master.run("pregabalin", "neuropathic pain", "US")["market_overview"]
+    master.iqvia_agent.down = True
+    now[0] += 3600
+
+    for _ in range(3):
+        section = master.run("pregabalin", "neuropathic pain", "US")["market_overview"]
+        assert section["stale"] and section["stale_age_s"] == 3600
+        assert section["market_size_usd_mn"] == fresh["market_size_usd_mn"]
+
+    # Two failures opened the circuit; the third run did not call the backend
+    assert master.iqvia_agent.calls == 3
+    assert section["degraded_reason"] == CIRCUIT_OPEN
+    assert breakers.snapshot()["market_overview"]["state"] == "open"
+    # Without a cached copy the section is reported missing
+    missing = master.run("pregabalin", "neuropathic pain", "IN")["market_overview"]
+    assert missing["error"] == CIRCUIT_OPEN
+
+
+class SleepyAgent:
+    def __init__(self, agent, delay_s):
+        self.agent = agent
+        self.delay_s = delay_s
+
+    def run(self, *args):
+        time.sleep(self.delay_s)
+        return self.agent.run(*args)
+
+
+def test_sequential_run_keeps_to_the_query_sla():
+    master = build_master_agent(sla_s=0.5)
+    for attr in ("iqvia_agent", "exim_agent", "patent_agent", "clinical_agent", "internal_agent", "web_agent"):
+        setattr(master, attr, SleepyAgent(getattr(master, attr), 0.15))
+
+    started = time.monotonic()
+    result = master.run("pregabalin", "neuropathic pain", "US")
+    # Six 0.15s agents in a row; the agent phase of the 0.5s SLA ends after 0.4s
+    assert time.monotonic() - started < 0.55
+    assert "error" not in result["market_overview"] and "error" not in result["exim_overview"]
+    assert "timed out" in result["patent_landscape"]["error"]
+    assert result["web_insights"]["error"] == DEADLINE_PASSED
+
+class BrokenCache(ResultCache):
+    def get(self, *args, **kwargs):
+        raise sqlite3.OperationalError("database is locked")
+
+    set = get_stale = get
+
+
+def test_cache_errors_count_as_misses():
+    master = build_master_agent(cache=BrokenCache())
+    result = master.run("pregabalin", "neuropathic pain", "US")
+    assert "error" not in result["market_overview"] and "error" not in result["patent_landscape"]
+
+
+def test_coalesced_failure_counts_once_against_the_breaker():
+    breakers = CircuitBreakers(failure_threshold=2, reset_after_s=60)
+    master = build_master_agent(parallel=True, flights=SingleFlight(), breakers=breakers)
+    master.patent_agent = SleepyAgent(FlakyAgent(master.patent_agent), 0.3)
+    master.patent_agent.agent.down = True
+
+    # The patent landscape depends on the molecule only, so both queries share one lookup
+    results = {}
+    threads = [
+        threading.Thread(target=lambda g=g: results.update({g: master.run("pregabalin", "neuropathic pain", g)}))
+        for g in ("US", "IN")
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert master.patent_agent.agent.calls == 1
+    assert all("backend down" in r["patent_landscape"]["error"] for r in results.values())
+    assert breakers.snapshot()["patent_landscape"]["state"] == "closed"
+    assert breakers.get("patent_landscape").failures == 1
@@ -0,0 +1,52 @@
+from rules import DEFAULT_RULESET, CompiledRuleSet, UnmetNeedRule
+
+
+def test_default_rules_match_legacy_keyword_checks():
+    texts = {
+        "field_feedback": [
+            "Adherence in Elderly patients is challenging.",
+            "Some report DIZZINESS; diabetic subgroup differs.",
+            "sedation noted",  # forum-only rule must not fire on field feedback
+        ],
+        "patient_forum_highlights": ["Too sleepy in the morning.", "Elderly users mention adherence."],
+    }
+    assert DEFAULT_RULESET.derive(texts) == [
+        "Improve adherence in elderly / complex regimens.",
+        "Design regimen better suited to elderly patients.",
+        "Reduce dizziness / CNS side effects.",
+        "Target neuropathic pain in diabetic patients more specifically.",
+        "Minimize daytime sedation while maintaining pain relief.",
+    ]
+
+
+def test_overlapping_keywords_and_regex_rules():
+    rules = CompiledRuleSet(
+        [
+            UnmetNeedRule("A", ("notes",), keywords=("diabetic neuropathy",)),
+            UnmetNeedRule("B", ("notes",), keywords=("diabet",)),
+            UnmetNeedRule("C", ("notes",), keywords=("neuro",)),
+            UnmetNeedRule("D", ("notes",), regex=r"\bonce[- ]daily\b"),
+        ]
+    )
+    assert rules.match("notes", "Painful Diabetic Neuropathy, prefers once-daily dosing") == ["A", "B", "C", "D"]
+    assert rules.match("notes", "diabetes only") == ["B"]
+    assert rules.match("other", "diabetes only") == []
+
+
+def test_single_pass_matchers_agree_with_per_rule_checks():
+    rules = list(DEFAULT_RULESET.rules) + [
+        UnmetNeedRule("Once daily", ("field_feedback",), regex=r"\bonce[- ]daily\b"),
+        UnmetNeedRule("Renal", ("field_feedback",), regex=r"renal(ly)? impair"),
+        UnmetNeedRule("Repeat", ("field_feedback",), regex=r"(\w+) \1"),  # cannot be combined
+    ]
+    texts = [
+        "Elderly patients prefer ONCE-DAILY dosing.",
+        "Dose in renally impaired diabetic patients.",
+        "dizziness dizziness reported",
+        "nothing relevant here",
+    ]
+    substring, trie = CompiledRuleSet(rules[:-1]), CompiledRuleSet(rules[:-1], small_table_keywords=0)
+    for text in texts:
+        assert substring.match("field_feedback", text) == trie.match("field_feedback", text)
+    assert trie.match("field_feedback", texts[1])[-1] == "Renal"
+    assert CompiledRuleSet(rules).match("field_feedback", texts[2])[-1] == "Repeat"
@@ -0,0 +1,70 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from graph import build_master_agent
+from singleflight import SingleFlight
+from test_cache import CountingAgent
+
+
+def test_concurrent_identical_calls_share_one_execution():
+    flights = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        release.wait(5)
+        return "value"
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        futures = [executor.submit(flights.do, "agent|pregabalin", slow) for _ in range(4)]
+        while flights.stats()["calls"] < 4:
+            time.sleep(0.01)
+        release.set()
+        results = [f.result() for f in futures]
+
+    assert len(calls) == 1
+    assert sorted(shared for _, shared in results) == [False, True, True, True]
+    assert flights.stats()["by_namespace"]["agent"] == {"calls": 4, "executed": 1, "coalesced": 3}
+    # Completed flights are not remembered
+    assert flights.do("agent|pregabalin", lambda: "again") == ("again", False)
+
+
+def test_errors_are_shared_and_async_callers_coalesce():
+    flights = SingleFlight()
+
+    async def failing():
+        await asyncio.sleep(0.05)
+        raise RuntimeError("backend down")
+
+    async def main():
+        return await asyncio.gather(*(flights.ado("k", failing) for _ in range(3)), return_exceptions=True)
+
+    errors = asyncio.run(main())
+    assert all(isinstance(e, RuntimeError) for e in errors)
+    assert flights.stats()["coalesced"] == 2 and flights.stats()["in_flight"] == 0
+
+
+class SlowCountingAgent(CountingAgent):
+    def run(self, *args):
+        time.sleep(0.3)
+        return super().run(*args)
+
+
+def test_sessions_share_in_flight_master_runs():
+    flights = SingleFlight()
+    iqvia = SlowCountingAgent(build_master_agent().iqvia_agent)
+
+    def session(molecule):
+        master = build_master_agent(flights=flights)
+        master.iqvia_agent = iqvia
+        return master.run(molecule, "neuropathic pain", "US")
+
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        results = list(executor.map(session, ["pregabalin", "Pregabalin", "pregabalin "]))
+
+    assert iqvia.calls == 1
+    assert [r["molecule"] for r in results] == ["pregabalin", "Pregabalin", "pregabalin "]
+    assert flights.stats()["by_namespace"]["query"]["coalesced"] == 2
@@ -0,0 +1,314 @@
+import json
+import os
+import random
+import threading
+from datetime import date
+
+import pytest
+
+from agents.worker_agents import (
+    ClinicalTrialsAgent,
+    EXIMTrendsAgent,
+    InternalKnowledgeAgent,
+    IQVIAInsightsAgent,
+    PatentLandscapeAgent,
+    WebIntelligenceAgent,
+)
+from ingest import main as ingest_main
+from stores.documents import DocumentIndex, build_document_index
+from stores.market import MarketDataStore
+from stores.patents import IntervalTree, PatentStore, build_patent_store
+from stores.trials import TrialRegistry, build_trial_registry
+from stores.vectors import VectorIndex, _Partition, build_vector_index
+
+
+def write_csv(path, header, rows):
+    path.write_text("\n".join([header] + rows) + "\n")
+    return str(path)
+
+
+def test_market_store_prunes_partitions_and_feeds_agents(tmp_path):
+    iqvia = write_csv(
+        tmp_path / "iqvia.csv",
+        "molecule,geography,indication,year,sales_usd_mn,channel",
+        [
+            "Pregabalin ,US,Neuropathic pain,2021,100,retail",
+            "pregabalin,US,Neuropathic pain,2021,35,hospital",
+            "pregabalin,US,Neuropathic pain,2024,172,retail",
+            "pregabalin,US,Fibromyalgia,2024,50,retail",
+            "pregabalin,EU,Neuropathic pain,2024,90,retail",
+            "duloxetine,US,Neuropathic pain,2024,300,retail",
+        ],
+    )
+    exim = write_csv(
+        tmp_path / "exim.csv",
+        "molecule,geography,country,price_usd_per_kg,volume_kg",
+        ["pregabalin,US,IN,90,1000", "pregabalin,US,IN,100,1000", "pregabalin,US,CN,80,2000"],
+    )
+    data_dir = str(tmp_path / "data")
+    assert ingest_main(["--data-dir", data_dir, "iqvia", iqvia]) == 0
+    assert ingest_main(["--data-dir", data_dir, "exim", exim]) == 0
+
+    store = MarketDataStore(str(tmp_path / "data" / "market"))
+    files = store.files("iqvia", "PREGABALIN", "us")
+    assert len(files) == 1 and "molecule=pregabalin/geography=us" in files[0]
+
+    market = IQVIAInsightsAgent(store=store).run("Pregabalin", "neuropathic pain", "US")
+    assert market["raw_rows"].to_dict("list") == {"year": [2021, 2024], "sales_usd_mn": [135.0, 172.0]}
+    assert market["market_size_usd_mn"] == 172.0 and market["top_year"] == 2024
+
+    trade = EXIMTrendsAgent(store=store).run("pregabalin", "US")
+    assert trade["raw_rows"].to_dict("list") == {
+        "country": ["IN", "CN"], "price_usd_per_kg": [95.0, 80.0], "volume_kg": [2000.0, 2000.0]
+    }
+    assert trade["weighted_avg_import_price_per_kg_usd"] == 87.5
+
+    assert IQVIAInsightsAgent(store=store).run("gabapentin", "neuropathic pain", "US")["market_size_usd_mn"] is None
+
+    # A restated drop replaces its partitions instead of appending to them.
+    assert ingest_main(["--data-dir", data_dir, "iqvia", "--replace", iqvia]) == 0
+    store = MarketDataStore(str(tmp_path / "data" / "market"))
+    assert len(store.query("iqvia", "pregabalin", "us")) == 4
+
+
+def test_market_store_sees_ingests_from_other_store_instances(tmp_path):
+    header = "molecule,geography,indication,year,sales_usd_mn"
+    first = write_csv(tmp_path / "a.csv", header, ["pregabalin,US,Neuropathic pain,2023,100"])
+    second = write_csv(tmp_path / "b.csv", header, ["pregabalin,US,Neuropathic pain,2024,150"])
+    root = str(tmp_path / "market")
+    serving, ingesting = MarketDataStore(root), MarketDataStore(root)
+    assert serving.dataset("iqvia") is None
+
+    ingesting.ingest_csv("iqvia", first)
+    assert serving.query("iqvia", "pregabalin", "US")["year"].tolist() == [2023]
+    # An appended drop is picked up, and a restated one no longer reads deleted files
+    ingesting.ingest_csv("iqvia", second)
+    assert sorted(serving.query("iqvia", "pregabalin", "US")["year"]) == [2023, 2024]
+    ingesting.ingest_csv("iqvia", second, replace=True)
+    assert serving.query("iqvia", "pregabalin", "US")["year"].tolist() == [2024]
+    assert len(serving.files("iqvia", "pregabalin", "US")) == 1
+
+
+def test_market_query_normalizes_filter_columns_like_keys(tmp_path):
+    header = "molecule,geography,indication,year,sales_usd_mn"
+    rows = ["pregabalin,US, Neuropathic  Pain ,2023,100", "pregabalin,US,Fibromyalgia,2023,50"]
+    drop = write_csv(tmp_path / "a.csv", header, rows)
+    store = MarketDataStore(str(tmp_path / "market"))
+    store.ingest_csv("iqvia", drop)
+    assert store.query("iqvia", "pregabalin", "US", indication="neuropathic pain")["sales_usd_mn"].tolist() == [100]
+
+
+def test_document_index_ranks_scopes_and_replaces(tmp_path):
+    index = DocumentIndex(str(tmp_path / "documents.sqlite"))
+    index.add_documents(
+        [
+            {"name": "FN-1", "molecule": "Pregabalin", "kind": "field_note",
+             "text": "Good pain control. Elderly patients struggle with adherence to twice daily dosing."},
+            {"name": "FN-2", "molecule": "pregabalin", "kind": "field_note", "text": "Sales call notes on pricing."},
+            {"name": "FN-3", "molecule": "duloxetine", "kind": "field_note", "text": "Adherence adherence adherence."},
+            {"name": "SB-1", "molecule": "", "kind": "strategic_brief", "text": "Portfolio strategy: focus on adherence."},
+        ]
+    )
+
+    hits = index.search("adherence elderly", "PREGABALIN ")
+    assert [h["doc"] for h in hits] == ["FN-1", "SB-1"]
+    assert hits[0]["snippet"] == "Elderly patients struggle with adherence to twice daily dosing."
+    assert [h["doc"] for h in index.search("adherence", "pregabalin", kinds=("field_note",))] == ["FN-1"]
+
+    # Re-adding a document by name replaces it, postings and statistics included.
+    index.add_documents([{"name": "FN-1", "molecule": "pregabalin", "kind": "field_note", "text": "Pricing only."}])
+    assert len(index) == 4
+    assert [h["doc"] for h in index.search("adherence elderly", "pregabalin")] == ["SB-1"]
+
+    section = InternalKnowledgeAgent(index=index).run("pregabalin")
+    assert section["field_feedback"] == []
+    assert list(section["raw_rows"]["doc"]) == ["SB-1"]
+    assert section["strategic_priorities_match"] == "Low"
+
+
+def test_document_search_survives_concurrent_replaces(tmp_path):
+    path = str(tmp_path / "documents.sqlite")
+    reader, writer = DocumentIndex(path), DocumentIndex(path)
+    docs = [{"name": f"FN-{i}", "molecule": "pregabalin", "text": f"Adherence note {i} for elderly."} for i in range(20)]
+    writer.add_documents(docs)
+    stop = threading.Event()
+
+    def replace_forever():
+        while not stop.is_set():
+            writer.add_documents(docs)
+
+    thread = threading.Thread(target=replace_forever)
+    thread.start()
+    try:
+        for _ in range(300):
+            hits = reader.search("adherence elderly", "pregabalin", k=5)
+            assert len(hits) == 5
+    finally:
+        stop.set()
+        thread.join()
+
+
+def test_vector_index_filters_by_kind_and_persists(tmp_path):
+    snippets = [
+        {"kind": "forum", "source": "ForumA", "text": "Pregabalin made me sleepy until I moved the dose to bedtime."},
+        {"kind": "forum", "source": "ForumB", "text": "Insurance paperwork for my new glasses took weeks."},
+        {"kind": "guideline", "source": "GuidelineX", "text": "Reduce the pregabalin dose in renally impaired patients."},
+        {"kind": "news", "source": "NewsY", "text": "Extended-release pregabalin formulation study reports outcomes."},
+    ] + [{"kind": "forum", "source": "Noise", "text": f"weather report number {i} sunny skies"} for i in range(200)]
+    path = tmp_path / "web.jsonl"
+    path.write_text("\n".join(json.dumps(s) for s in snippets) + "\n")
+    assert ingest_main(["--data-dir", str(tmp_path), "snippets", str(path)]) == 0
+
+    index = VectorIndex(str(tmp_path / "web"))  # reopened from disk (memory-mapped vectors + IVF)
+    hits = index.search("pregabalin sleepy dose", "forum", k=2, nprobe=64)
+    assert hits[0]["source"] == "ForumA" and hits[0]["score"] > hits[1]["score"]
+    assert [h["source"] for h in index.search("pregabalin sleepy dose", "guideline")] == ["GuidelineX"]
+
+    # Rows added after the IVF build are searchable straight away.
+    index.add_snippets([{"kind": "news", "source": "NewsZ", "text": "Pregabalin sleepy dose news flash."}])
+    assert index.search("pregabalin sleepy dose", "news", k=1)[0]["source"] == "NewsZ"
+
+    section = WebIntelligenceAgent(index=index).run("pregabalin")
+    assert section["guideline_extracts"] == ["Reduce the pregabalin dose in renally impaired patients."]
+    assert section["patient_forum_highlights"][0].startswith("Pregabalin made me sleepy")
+    assert set(section["raw_rows"]["kind"]) == {"guideline", "forum", "news"}
+
+
+def test_vector_search_filters_by_molecule(tmp_path):
+    index = VectorIndex(str(tmp_path / "web"))
+    index.add_snippets(
+        [
+            {"kind": "forum", "source": "ForumA", "molecule": "Pregabalin", "text": "Dose timing helped my sleepiness."},
+            {"kind": "forum", "source": "ForumB", "molecule": "duloxetine", "text": "Dose timing helped my sleepiness a lot."},
+            {"kind": "forum", "source": "ForumC", "text": "Dose timing tips for any medication."},
+        ]
+        + [{"kind": "forum", "source": "Noise", "molecule": "duloxetine", "text": f"weather {i}"} for i in range(100)]
+    )
+    index.build_ivf("forum", n_lists=8)
+
+    assert {h["source"] for h in index.search("dose timing sleepiness", "forum", k=3)} >= {"ForumA", "ForumB"}
+    hits = index.search("dose timing sleepiness", "forum", k=3, molecule=" PREGABALIN")
+    assert [h["source"] for h in hits] == ["ForumA", "ForumC"]
+    assert {h["source"] for h in index.search("dose timing", "forum", k=2, molecule="duloxetine")} == {"ForumB", "ForumC"}
+    assert [h["source"] for h in index.search("dose timing", "forum", molecule="gabapentin")] == ["ForumC"]
+    section = WebIntelligenceAgent(index=index).run("pregabalin")
+    assert "Dose timing helped my sleepiness a lot." not in section["patient_forum_highlights"]
+
+
+def test_failed_vector_append_leaves_rows_aligned(tmp_path, monkeypatch):
+    index = VectorIndex(str(tmp_path / "web"))
+    index.add_snippets([{"kind": "forum", "source": "ForumA", "molecule": "pregabalin", "text": "Bedtime dose helped."}])
+
+    write = _Partition.write
+
+    def failing_write(part, start, vectors, molecule_ids):
+        write(part, start, vectors, molecule_ids)
+        if part.path.endswith("news"):
+            raise OSError("disk full")
+
+    monkeypatch.setattr(_Partition, "write", failing_write)
+    with pytest.raises(OSError):
+        index.add_snippets(
+            [
+                {"kind": "forum", "source": "Lost", "text": "Bedtime dose helped a lot."},
+                {"kind": "news", "source": "LostNews", "text": "Dose news."},
+            ]
+        )
+    monkeypatch.undo()
+    assert os.path.getsize(tmp_path / "web" / "forum" / "vectors.f32") == 4 * index.embedder.dim
+
+    index.add_snippets([{"kind": "forum", "source": "ForumB", "text": "Insurance forms took weeks."}])
+    assert index.search("insurance forms", "forum", k=1)[0]["source"] == "ForumB"
+    assert [h["source"] for h in index.search("bedtime dose", "forum", k=2)] == ["ForumA", "ForumB"]
+
+    # A partition written before molecule ids were kept gets them on open
+    index.close()
+    os.remove(tmp_path / "web" / "forum" / "molecules.i32")
+    reopened = VectorIndex(str(tmp_path / "web"))
+    assert [h["source"] for h in reopened.search("bedtime dose", "forum", molecule="duloxetine")] == ["ForumB"]
+
+
+def test_store_builders_create_a_missing_data_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("AGENT_DATA_DIR", str(tmp_path / "missing" / "data"))
+    for build in (build_document_index, build_patent_store, build_trial_registry, build_vector_index):
+        assert build() is not None
+    assert os.path.isdir(tmp_path / "missing" / "data")
+
+
+def test_interval_tree_matches_brute_force():
+    rng = random.Random(7)
+    intervals = []
+    for i in range(500):
+        start = rng.randrange(0, 1000)
+        intervals.append((start, start + rng.randrange(0, 200), i))
+    tree = IntervalTree(intervals)
+    for x in range(-5, 1250, 7):
+        assert sorted(tree.stab(x)) == [i for s, e, i in intervals if s <= x <= e]
+
+
+def test_patent_store_precomputes_and_refreshes_fto(tmp_path):
+    today = [date(2025, 6, 1)]
+    store = PatentStore(str(tmp_path / "patents.sqlite"), today=lambda: today[0])
+    patent = {"molecule": "Pregabalin", "assignee": "PharmaCorp", "filing_date": "2005-01-01"}
+    store.add_patents(
+        [
+            {**patent, "publication": "US1", "claim_type": "compound", "title": "Compound", "expiry_date": "2025-12-31"},
+            {**patent, "publication": "US2", "claim_type": "formulation", "title": "ER tablet", "expiry_date": "2031-06-30"},
+            {**patent, "publication": "US3", "claim_type": "use", "title": "Old use", "expiry_date": "2019-01-01"},
+        ]
+    )
+
+    assert [p["publication"] for p in store.in_force("pregabalin")] == ["US2", "US1"]
+    assert [p["publication"] for p in store.in_force("pregabalin", on=date(2018, 1, 1))] == ["US2", "US1", "US3"]
+    fto = store.fto("pregabalin")
+    assert (fto["risk"], fto["in_force"], fto["core_patent_expiry"], fto["valid_until"]) == (
+        "High", 2, "2025-12-31", "2025-12-31"
+    )
+
+    # Past the compound expiry the stored score is stale and recomputed on lookup.
+    today[0] = date(2026, 1, 1)
+    fto = store.fto("pregabalin")
+    assert (fto["score"], fto["risk"], fto["in_force"]) == (0.4, "Moderate", 1)
+
+    # A new filing refreshes only the molecule it touches.
+    store.add_patents([{**patent, "publication": "US4", "claim_type": "use", "title": "New use", "expiry_date": "2040-01-01"}])
+    assert store.fto("pregabalin")["score"] == 0.76
+    section = PatentLandscapeAgent(store=store).run("pregabalin")
+    assert section["fto_risk"] == "Moderate" and list(section["patents"]["publication"]) == ["US4", "US2"]
+    assert PatentLandscapeAgent(store=store).run("gabapentin")["fto_risk"] == "Low"
+
+
+def test_trial_registry_syncs_incrementally(tmp_path):
+    study = {
+        "protocolSection": {
+            "identificationModule": {"nctId": "NCT01", "briefTitle": "Pregabalin in fibromyalgia"},
+            "statusModule": {"overallStatus": "RECRUITING", "lastUpdatePostDateStruct": {"date": "2025-03-01"}},
+            "designModule": {"phases": ["PHASE2", "PHASE3"], "enrollmentInfo": {"count": 300}},
+            "armsInterventionsModule": {"interventions": [{"type": "DRUG", "name": "Pregabalin"}]},
+        }
+    }
+    flat = [
+        {"nct_id": "NCT02", "molecule": "pregabalin", "phase": "Phase 1", "status": "Completed",
+         "title": "PK study", "enrollment": "40", "last_updated": "2024-01-01"},
+        {"nct_id": "NCT03", "molecule": "pregabalin;gabapentin", "phase": "PHASE4", "status": "Active, not recruiting",
+         "title": "Head to head", "enrollment": "500", "last_updated": "2024-06-01"},
+    ]
+    path = tmp_path / "trials.jsonl"
+    path.write_text("\n".join(json.dumps(r) for r in [study] + flat) + "\n")
+    assert ingest_main(["--data-dir", str(tmp_path), "trials", str(path)]) == 0
+
+    registry = TrialRegistry(str(tmp_path / "trials.sqlite"))
+    agg = registry.aggregates("Pregabalin")
+    assert (agg["total_trials"], agg["active_trials"]) == (3, 2)
+    assert agg["phase_distribution"] == {"Phase I": 1, "Phase II": 0, "Phase III": 1, "Phase IV": 1}
+    assert [t["id"] for t in agg["notable_trials"]] == ["NCT03", "NCT01", "NCT02"]
+
+    # Re-syncing an old record is a no-op; a newer one moves the trial to another molecule.
+    moved = {**flat[0], "molecule": "gabapentin", "status": "Recruiting", "last_updated": "2025-01-01"}
+    assert registry.sync([flat[0], moved]) == {"inserted": 0, "updated": 1, "skipped": 1}
+    assert registry.aggregates("pregabalin")["total_trials"] == 2
+    assert registry.aggregates("gabapentin")["active_trials"] == 2
+
+    section = ClinicalTrialsAgent(registry=registry).run("gabapentin")
+    assert section["total_trials"] == 2 and list(section["notable_trials"]["id"]) == ["NCT03", "NCT02"]
+    assert ClinicalTrialsAgent(registry=registry).run("metformin")["total_trials"] == 0
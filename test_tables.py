@@ -0,0 +1,28 @@
+import pandas as pd
+
+from agents.tables import cagr_pct, has_rows, phase_counts, to_jsonable, weighted_mean
+from agents.worker_agents import payload_fingerprint
+
+
+def test_vectorized_aggregates():
+    sales = pd.DataFrame({"year": [2021, 2021, 2022, 2023, 2024], "sales_usd_mn": [100, 35, 150, 160, 172]})
+    assert cagr_pct(sales, "sales_usd_mn") == 8.41
+    assert cagr_pct(sales[sales["year"] > 2021], "sales_usd_mn") is None
+
+    trade = pd.DataFrame({"price_usd_per_kg": [95, 88, 110], "volume_kg": [12000, 9000, 3500]})
+    assert weighted_mean(trade, "price_usd_per_kg", "volume_kg") == 94.57
+
+    trials = pd.DataFrame({"phase": ["Phase II", "Phase III", "Phase II"]})
+    assert phase_counts(trials, ["Phase I", "Phase II", "Phase III"]) == {"Phase I": 0, "Phase II": 2, "Phase III": 1}
+
+    assert not has_rows(pd.DataFrame()) and has_rows([{"a": 1}])
+    assert to_jsonable({"rows": trade.head(1)}) == {"rows": [{"price_usd_per_kg": 95, "volume_kg": 12000}]}
+
+
+def test_fingerprint_sees_every_row_of_large_tables():
+    rows = pd.DataFrame({"id": range(10_000), "value": 1.0})
+    changed = rows.copy()
+    changed.loc[5_000, "value"] = 2.0  # elided from str(rows)
+
+    assert payload_fingerprint({"t": rows}) == payload_fingerprint({"t": rows.copy()})
+    assert payload_fingerprint({"t": rows}) != payload_fingerprint({"t": changed})
@@ -0,0 +1,164 @@
+# tracing.py
+
+"""
+In-process tracing for MasterAgent queries.
+
+A Tracer collects timed spans (worker agent calls, synthesis steps, report renders)
+with attributes such as payload sizes, plus named counters (cache hits and misses).
+A finished trace exports as plain JSON or in the Chrome trace event format, which
+chrome://tracing and https://ui.perfetto.dev open directly.
+
+Instrumented components take an optional tracer and fall back to NULL_TRACER, whose
+spans and counters do nothing, so untraced runs pay almost nothing.
+"""
+
+import json
+import pickle
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Any, Callable, ContextManager, Dict, Iterator, List, Optional
+
+
+def payload_size(obj: Any) -> int:
+    """Approximate size in bytes of a result payload (its pickled length)."""
+    try:
+        return len(pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL))
+    except Exception:
+        return 0
+
+
+class Span:
+    __slots__ = ("name", "track", "start_s", "duration_s", "attrs")
+
+    def __init__(self, name: str, track: str, start_s: float, attrs: Dict[str, Any]):
+        self.name = name
+        self.track = track
+        self.start_s = start_s
+        self.duration_s = 0.0
+        self.attrs = attrs
+
+    def set(self, **attrs: Any) -> None:
+        self.attrs.update(attrs)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "track": self.track,
+            "start_ms": round(self.start_s * 1000, 3),
+            "duration_ms": round(self.duration_s * 1000, 3),
+            "attrs": dict(self.attrs),
+        }
+
+
+class Tracer:
+    """
+    Spans and counters of one traced run. Thread-safe: agents running on worker
+    threads record into the same tracer. Span times are relative to the tracer's
+    creation; each span lands on a named track (default: the current thread's name).
+    """
+
+    enabled = True
+
+    def __init__(self, clock: Callable[[], float] = time.perf_counter):
+        self.clock = clock
+        self.started = clock()
+        self.spans: List[Span] = []
+        self.counters: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def span(self, name: str, track: Optional[str] = None, **attrs: Any) -> Iterator[Span]:
+        span = Span(name, track or threading.current_thread().name, self.clock() - self.started, attrs)
+        try:
+            yield span
+        except GeneratorExit:
+            raise  # a traced generator closed early by its consumer
+        except BaseException as exc:
+            span.set(error=type(exc).__name__)
+            raise
+        finally:
+            span.duration_s = self.clock() - self.started - span.start_s
+            with self._lock:
+                self.spans.append(span)
+
+    def count(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        """Per span name: number of calls, total and slowest duration in ms."""
+        with self._lock:
+            spans = list(self.spans)
+        out: Dict[str, Dict[str, Any]] = {}
+        for span in spans:
+            entry = out.setdefault(span.name, {"calls": 0, "total_ms": 0.0, "max_ms": 0.0})
+            entry["calls"] += 1
+            entry["total_ms"] += span.duration_s * 1000
+            entry["max_ms"] = max(entry["max_ms"], span.duration_s * 1000)
+        for entry in out.values():
+            entry["total_ms"] = round(entry["total_ms"], 3)
+            entry["max_ms"] = round(entry["max_ms"], 3)
+        return dict(sorted(out.items(), key=lambda item: item[1]["total_ms"], reverse=True))
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s.start_s)
+            counters = dict(sorted(self.counters.items()))
+        return {"spans": [s.to_dict() for s in spans], "counters": counters, "summary": self.summary()}
+
+    def to_json(self, indent: Optional[int] = 2) -> str:
+        return json.dumps(self.to_dict(), indent=indent, default=str)
+
+    def to_chrome_trace(self) -> Dict[str, Any]:
+        """The trace as Chrome trace events: one complete ("X") event per span, one thread per track."""
+        with self._lock:
+            spans = sorted(self.spans, key=lambda s: s.start_s)
+            counters = dict(self.counters)
+        tids: Dict[str, int] = {}
+        events: List[Dict[str, Any]] = []
+        for span in spans:
+            tid = tids.get(span.track)
+            if tid is None:
+                tid = tids[span.track] = len(tids) + 1
+                events.append({"name": "thread_name", "ph": "M", "pid": 1, "tid": tid, "args": {"name": span.track}})
+            events.append(
+                {
+                    "name": span.name,
+                    "cat": span.name.split(".", 1)[0],
+                    "ph": "X",
+                    "ts": round(span.start_s * 1e6, 1),
+                    "dur": round(span.duration_s * 1e6, 1),
+                    "pid": 1,
+                    "tid": tid,
+                    "args": span.attrs,
+                }
+            )
+        if counters:
+            end_us = max((s.start_s + s.duration_s for s in spans), default=0.0) * 1e6
+            events.append({"name": "counters", "ph": "C", "ts": round(end_us, 1), "pid": 1, "args": counters})
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def chrome_trace_json(self) -> str:
+        return json.dumps(self.to_chrome_trace(), default=str)
+
+
+class NullTracer:
+    """Tracer stand-in that records nothing."""
+
+    enabled = False
+
+    def span(self, name: str, track: Optional[str] = None, **attrs: Any) -> ContextManager[Any]:
+        return nullcontext(_NULL_SPAN)
+
+    def count(self, name: str, n: int = 1) -> None:
+        pass
+
+
+class _NullSpan:
+    def set(self, **attrs: Any) -> None:
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+NULL_TRACER = NullTracer()